@@ -177,6 +177,57 @@ TRANSMISSION_CURVES_ROOT = os.environ.get(
 
 CUTOUT_OVERWRITE = os.environ.get("CUTOUT_OVERWRITE", "False")
 
+# worker processes used to measure the filters of a transient, 1 is serial
+PHOTOMETRY_PROCESSES = int(os.environ.get("PHOTOMETRY_PROCESSES", "1"))
+
+# directory to persist cutout background models to, memory only if empty
+BACKGROUND_CACHE_ROOT = os.environ.get("BACKGROUND_CACHE_ROOT", "")
+
+# binning of the first host detection pass in aperture construction, 1 is off
+APERTURE_DETECTION_BINNING = int(os.environ.get("APERTURE_DETECTION_BINNING", "1"))
+
+# candidate cutouts tried at the same time in aperture construction, 1 is serial
+APERTURE_CONSTRUCTION_THREADS = int(
+    os.environ.get("APERTURE_CONSTRUCTION_THREADS", "1")
+)
+
+# seconds between checks for filter changes made by other processes
+FILTER_REGISTRY_CHECK_SECONDS = int(
+    os.environ.get("FILTER_REGISTRY_CHECK_SECONDS", "60")
+)
+
+# days NED and SDSS redshift query results are reused for
+REDSHIFT_CACHE_TTL_DAYS = int(os.environ.get("REDSHIFT_CACHE_TTL_DAYS", "90"))
+# days a query that found no redshift is reused for
+REDSHIFT_CACHE_NEGATIVE_TTL_DAYS = int(
+    os.environ.get("REDSHIFT_CACHE_NEGATIVE_TTL_DAYS", "14")
+)
+
+# query NED and SDSS for host redshifts the local redshift catalog does not have
+REDSHIFT_LIVE_FALLBACK = (
+    os.environ.get("REDSHIFT_LIVE_FALLBACK", "true").lower() == "true"
+)
+
+# copy host-level products from other transients of the same host when possible
+HOST_PRODUCT_REUSE = os.environ.get("HOST_PRODUCT_REUSE", "true").lower() == "true"
+
+# "local" for a shared filesystem, "s3" for an S3-compatible object store
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "local")
+STORAGE_CACHE_ROOT = os.environ.get(
+    "STORAGE_CACHE_ROOT", "/tmp/blast_storage_cache"
+)  # noqa
+S3_BUCKET_NAME = os.environ.get("S3_BUCKET_NAME", "blast")
+S3_ENDPOINT_URL = os.environ.get("S3_ENDPOINT_URL", "")
+S3_ACCESS_KEY_ID = os.environ.get("S3_ACCESS_KEY_ID", "")
+S3_SECRET_ACCESS_KEY = os.environ.get("S3_SECRET_ACCESS_KEY", "")
+S3_REGION_NAME = os.environ.get("S3_REGION_NAME", "")
+# storage class of demoted objects, bucket default if empty
+S3_COLD_STORAGE_CLASS = os.environ.get("S3_COLD_STORAGE_CLASS", "")
+# days after processing finishes before rarely read files are demoted
+STORAGE_DEMOTE_AFTER_DAYS = int(os.environ.get("STORAGE_DEMOTE_AFTER_DAYS", "30"))
+# days a worker keeps cached copies of stored files it has not used
+STORAGE_CACHE_MAX_AGE_DAYS = int(os.environ.get("STORAGE_CACHE_MAX_AGE_DAYS", "7"))
+
 CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
 CELERY_TIMEZONE = "UTC"
 
@@ -1,7 +1,8 @@
+from django.core.exceptions import ValidationError
 from django_celery_beat.models import IntervalSchedule
 from django_celery_beat.models import PeriodicTask
 from host.tasks import periodic_tasks
-from django.core.exceptions import ValidationError
+from host.tasks import retired_periodic_tasks
 
 for taskrunner in periodic_tasks:
     task = taskrunner.task_name
@@ -20,3 +21,5 @@ for taskrunner in periodic_tasks:
             task=taskrunner.task_function_name,
             enabled=taskrunner.task_initially_enabled,
         )
+
+PeriodicTask.objects.filter(name__in=retired_periodic_tasks).delete()
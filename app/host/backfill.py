@@ -0,0 +1,524 @@
+"""
+This module contains the code to backfill the data products of transients
+that were processed before a filter was added to blast, to match the hosts
+of waiting transients in batches, and to refresh the photometry of the whole
+catalog after the photometry code changes.
+"""
+import json
+import os
+import time
+from collections import defaultdict
+
+from django.db.models import Q
+
+from .base_tasks import get_processing_status
+from .base_tasks import get_progress
+from .base_tasks import update_status
+from .cutouts import download_and_save_cutouts_batch
+from .filter_registry import filter_registry
+from .ghost import ghost_context
+from .host_utils import map_image_photometry
+from .host_utils import measure_image_photometry
+from .models import Aperture
+from .models import AperturePhotometry
+from .models import Cutout
+from .models import Filter
+from .models import Status
+from .models import TaskRegister
+from .models import Transient
+from .storage import get_storage
+from .transient_tasks import Ghost
+from .transient_tasks import global_host_sed_fitting
+from .transient_tasks import GlobalAperturePhotometry
+from .transient_tasks import local_host_sed_fitting
+from .transient_tasks import LocalAperturePhotometry
+from .transient_tasks import ValidateGlobalPhotometry
+from .transient_tasks import ValidateLocalPhotometry
+
+SED_TASKS = {
+    "local": "Local host SED inference",
+    "global": "Global host SED inference",
+}
+SED_CELERY_TASKS = {
+    "local": local_host_sed_fitting,
+    "global": global_host_sed_fitting,
+}
+
+
+def task_is_processed(transient, task_name):
+    """
+    Checks whether a task has been processed for a transient.
+    """
+    return TaskRegister.objects.filter(
+        transient=transient, task__name=task_name, status__message="processed"
+    ).exists()
+
+
+def transients_missing_filters(filters):
+    """
+    Finds the transients whose cutouts have been downloaded but which have
+    never been searched for imaging in at least one of the filters.
+
+    Parameters:
+        filters (list[models.Filter]): filters to check for.
+    Returns:
+        (QuerySet): transients missing at least one of the filters.
+    """
+    downloaded = Transient.objects.filter(
+        taskregister__task__name="Cutout download",
+        taskregister__status__message="processed",
+    )
+    missing = Q()
+    for filter in filters:
+        missing |= ~Q(pk__in=Cutout.objects.filter(filter=filter).values("transient"))
+    return downloaded.filter(missing).distinct().order_by("pk")
+
+
+def invalidate_sed_fits(transient, aperture_types):
+    """
+    Sets the SED fitting tasks that depend on new photometry back to not
+    processed, leaving the rest of the transient's tasks untouched.
+
+    Returns:
+        (list[str]): names of the tasks that were invalidated.
+    """
+    not_processed = Status.objects.get(message__exact="not processed")
+    invalidated = []
+    for aperture_type in aperture_types:
+        register = TaskRegister.objects.filter(
+            transient=transient, task__name=SED_TASKS[aperture_type]
+        ).exclude(status=not_processed)
+        for register_item in register:
+            update_status(register_item, not_processed)
+            invalidated.append(register_item.task.name)
+    return invalidated
+
+
+def backfill_transient_filters(transient, filters):
+    """
+    Measures and validates the photometry of a transient in new filters only,
+    reusing its existing apertures.
+
+    Parameters:
+        transient (models.Transient): transient to backfill.
+        filters (list[models.Filter]): new filters to measure.
+    Returns:
+        (list[str]): aperture types that gained new photometry.
+    """
+    new_cutouts = Cutout.objects.filter(transient=transient, filter__in=filters).filter(
+        ~Q(fits="")
+    )
+    if not new_cutouts.exists():
+        return []
+
+    measured = []
+    if task_is_processed(transient, "Local aperture photometry"):
+        LocalAperturePhotometry(transient.name)._run_process(transient, filters=filters)
+        if task_is_processed(transient, "Validate local photometry"):
+            ValidateLocalPhotometry(transient.name)._run_process(transient)
+        measured.append("local")
+
+    if task_is_processed(transient, "Global aperture photometry"):
+        GlobalAperturePhotometry(transient.name)._run_process(
+            transient, filters=filters
+        )
+        if task_is_processed(transient, "Validate global photometry"):
+            ValidateGlobalPhotometry(transient.name)._run_process(
+                transient, filters=filters
+            )
+        measured.append("global")
+
+    return [
+        aperture_type
+        for aperture_type in measured
+        if AperturePhotometry.objects.filter(
+            transient=transient,
+            aperture__type=aperture_type,
+            filter__in=filters,
+            flux__isnull=False,
+        ).exists()
+    ]
+
+
+def backfill_filters(
+    filter_names,
+    batch_size=50,
+    max_transients=None,
+    sleep_seconds=0,
+    requeue_sed=False,
+    verbose=True,
+):
+    """
+    Downloads and measures the missing (transient, filter) pairs for new
+    filters and invalidates only the SED fits that depend on them.
+
+    Parameters:
+        filter_names (list[str]): names of the filters to backfill.
+        batch_size (int): number of transients downloaded together, so that
+            survey tiles shared within a batch are fetched once.
+        max_transients (int): stop after this many transients, if given.
+        sleep_seconds (float): pause between batches to throttle the load on
+            the survey services.
+        requeue_sed (bool): send the invalidated SED fits to celery.
+    Returns:
+        (dict): number of transients processed and SED fits invalidated.
+    """
+    filters = list(Filter.objects.filter(name__in=filter_names).select_related())
+    if len(filters) != len(set(filter_names)):
+        found = {filter.name for filter in filters}
+        raise ValueError(f"Unknown filters: {sorted(set(filter_names) - found)}")
+
+    transients = list(transients_missing_filters(filters))
+    if max_transients is not None:
+        transients = transients[:max_transients]
+
+    summary = {"transients": 0, "invalidated_sed_fits": 0}
+    start_time = time.time()
+    for start in range(0, len(transients), batch_size):
+        batch = transients[start : start + batch_size]
+        filter_registry.check()
+        download_and_save_cutouts_batch(batch, filters=filters)
+
+        for transient in batch:
+            new_photometry = backfill_transient_filters(transient, filters)
+            summary["invalidated_sed_fits"] += len(
+                invalidate_sed_fits(transient, new_photometry)
+            )
+            if requeue_sed:
+                for aperture_type in new_photometry:
+                    SED_CELERY_TASKS[aperture_type].delay(transient.name)
+        summary["transients"] += len(batch)
+
+        if verbose:
+            elapsed = time.time() - start_time
+            print(
+                f"Backfilled {summary['transients']}/{len(transients)} transients "
+                f"({summary['transients'] / max(elapsed, 1e-6):.2f} per second)"
+            )
+        if sleep_seconds and start + batch_size < len(transients):
+            time.sleep(sleep_seconds)
+
+    return summary
+
+
+def transients_waiting_for_host(transient_names=None):
+    """
+    Transients whose host match has not been processed, in primary key
+    order.
+
+    Parameters:
+        transient_names (list[str]): only these transients, if given.
+    Returns:
+        (QuerySet): transients waiting for a host match.
+    """
+    transients = Transient.objects.filter(
+        taskregister__task__name="Host match",
+        taskregister__status__message="not processed",
+    )
+    if transient_names is not None:
+        transients = transients.filter(name__in=transient_names)
+    return transients.order_by("pk")
+
+
+def match_hosts(batch_size=50, max_transients=None, transient_names=None, verbose=True):
+    """
+    Matches the hosts of the transients waiting for one in batches, with one
+    GHOST association and photo-z prediction per batch rather than per
+    transient. The host match task of each transient is claimed first, so
+    transients whose prerequisites are not processed, or that a worker is
+    already matching, are left alone.
+
+    Parameters:
+        batch_size (int): number of transients associated together.
+        max_transients (int): stop after this many transients, if given.
+        transient_names (list[str]): only match these transients, if given.
+    Returns:
+        (dict): number of transients matched and of those that got a host.
+    """
+    transients = list(transients_waiting_for_host(transient_names))
+    if max_transients is not None:
+        transients = transients[:max_transients]
+
+    summary = {"transients": 0, "hosts": 0}
+    start_time = time.time()
+    for start in range(0, len(transients), batch_size):
+        claimed = []
+        for transient in transients[start : start + batch_size]:
+            runner = Ghost(transient.name)
+            register_item = runner.claim_register_item(transient)
+            if register_item is not None:
+                claimed.append((transient, runner, register_item))
+        if not claimed:
+            continue
+
+        try:
+            hosts = ghost_context.associate_hosts(
+                [transient for transient, _, _ in claimed]
+            )
+        except Exception:
+            failed = Status.objects.get(message__exact="no GHOST match")
+            for _, _, register_item in claimed:
+                update_status(register_item, failed)
+            raise
+
+        for transient, runner, register_item in claimed:
+            status_message = runner._save_host(transient, hosts[transient.name])
+            update_status(
+                register_item, Status.objects.get(message__exact=status_message)
+            )
+            transient.progress = get_progress(transient.name)
+            transient.processing_status = get_processing_status(transient)
+            transient.save()
+            summary["hosts"] += status_message == "processed"
+        summary["transients"] += len(claimed)
+
+        if verbose:
+            elapsed = time.time() - start_time
+            print(
+                f"Matched {summary['transients']}/{len(transients)} transients, "
+                f"{summary['hosts']} with a host "
+                f"({summary['transients'] / max(elapsed, 1e-6):.2f} per second)"
+            )
+
+    return summary
+
+
+def transients_with_photometry(after_pk=None, transient_names=None):
+    """
+    Transients that have aperture photometry, in primary key order.
+
+    Parameters:
+        after_pk (int): only transients with a larger primary key, if given.
+        transient_names (list[str]): only these transients, if given.
+    Returns:
+        (QuerySet): transients with photometry.
+    """
+    transients = Transient.objects.filter(
+        pk__in=AperturePhotometry.objects.values("transient")
+    )
+    if after_pk is not None:
+        transients = transients.filter(pk__gt=after_pk)
+    if transient_names is not None:
+        transients = transients.filter(name__in=transient_names)
+    return transients.order_by("pk")
+
+
+def _refresh_image_job(job):
+    """
+    Measures the photometry of one stored image, fetching a local copy of
+    it first. Errors are returned as a message rather than raised, so one
+    unreadable image does not stop the rest of the chunk.
+    """
+    name, sky_apertures, filter = job
+    try:
+        return measure_image_photometry(
+            get_storage().local_path(name), sky_apertures, filter
+        )
+    except Exception as err:
+        return f"{type(err).__name__}: {err}"
+
+
+def refresh_photometry_chunk(transients, processes=1):
+    """
+    Re-measures the photometry of transients from their existing cutouts and
+    apertures and writes it with one bulk upsert per transient. Validation
+    flags are kept, as they depend on the images and apertures only. Each
+    image is fetched from storage only when it is measured, and images that
+    cannot be fetched or measured are logged and skipped.
+
+    Parameters:
+        transients (list[models.Transient]): transients to refresh.
+        processes (int): worker processes to measure the images with.
+    Returns:
+        (dict[models.Transient, list[str]]): aperture types with refreshed
+            photometry of each transient.
+        (int): number of images measured.
+        (int): number of images skipped because of an error.
+    """
+    cutouts = defaultdict(list)
+    for cutout in (
+        Cutout.objects.filter(transient__in=transients)
+        .filter(~Q(fits=""))
+        .select_related("filter")
+        .order_by("pk")
+    ):
+        cutouts[cutout.transient_id].append(cutout)
+    apertures = {
+        aperture.name: aperture
+        for aperture in Aperture.objects.filter(transient__in=transients)
+    }
+    is_validated = {
+        (aperture_id, filter_id): validated
+        for aperture_id, filter_id, validated in AperturePhotometry.objects.filter(
+            transient__in=transients
+        ).values_list("aperture_id", "filter_id", "is_validated")
+    }
+
+    measurements, jobs = [], []
+    for transient in transients:
+        stages = {
+            "local": LocalAperturePhotometry(transient.name),
+            "global": GlobalAperturePhotometry(transient.name),
+        }
+        local_aperture = apertures.get(f"{transient.name}_local")
+        for cutout in cutouts[transient.pk]:
+            cutout_apertures = [
+                (stages[aperture.type], aperture)
+                for aperture in [local_aperture, apertures.get(f"{cutout.name}_global")]
+                if aperture is not None
+                and cutout.contains_aperture(aperture.sky_aperture)
+            ]
+            if cutout_apertures:
+                measurements.append((transient, cutout, cutout_apertures))
+                jobs.append(
+                    (
+                        cutout.fits.name,
+                        [aperture.sky_aperture for _, aperture in cutout_apertures],
+                        cutout.filter,
+                    )
+                )
+
+    photometry_data = defaultdict(list)
+    refreshed = defaultdict(set)
+    failed = 0
+    for (transient, cutout, cutout_apertures), photometry in zip(
+        measurements,
+        map_image_photometry(jobs, processes=processes, measure=_refresh_image_job),
+    ):
+        if isinstance(photometry, str):
+            print(f"Skipping {cutout.name}: {photometry}")
+            failed += 1
+            continue
+        for (stage, aperture), aperture_photometry in zip(cutout_apertures, photometry):
+            data = stage._photometry_data(
+                transient, cutout, aperture, aperture_photometry
+            )
+            if data is None:
+                continue
+            data["is_validated"] = is_validated.get((aperture.pk, cutout.filter.pk))
+            photometry_data[transient].append((stage, data))
+            refreshed[transient].add(aperture.type)
+
+    for transient, rows in photometry_data.items():
+        stage = rows[0][0]
+        stage._bulk_upsert(
+            AperturePhotometry,
+            ["aperture", "transient", "filter"],
+            [data for _, data in rows],
+        )
+
+    return (
+        {
+            transient: sorted(aperture_types)
+            for transient, aperture_types in refreshed.items()
+        },
+        len(jobs) - failed,
+        failed,
+    )
+
+
+def read_checkpoint(checkpoint_path):
+    """
+    Reads the progress of an interrupted photometry refresh, None if there
+    is no checkpoint.
+    """
+    if checkpoint_path is None or not os.path.exists(checkpoint_path):
+        return None
+    with open(checkpoint_path) as f:
+        return json.load(f)
+
+
+def write_checkpoint(checkpoint_path, checkpoint):
+    """Writes the progress of a photometry refresh so it can be resumed."""
+    tmp_path = f"{checkpoint_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, checkpoint_path)
+
+
+def refresh_photometry(
+    chunk_size=50,
+    processes=1,
+    checkpoint_path=None,
+    restart=False,
+    max_transients=None,
+    transient_names=None,
+    invalidate_sed=False,
+    verbose=True,
+):
+    """
+    Re-measures the aperture photometry of every transient that has some,
+    streaming the transients in chunks in primary key order. Each chunk's
+    images are measured together in a process pool and its photometry is
+    written in bulk, without going through celery. Images that cannot be
+    measured are skipped and counted as failed.
+
+    Parameters:
+        chunk_size (int): number of transients measured together.
+        processes (int): worker processes to measure the images with.
+        checkpoint_path (str): file to record progress in after each chunk,
+            and to resume from if it exists.
+        restart (bool): ignore an existing checkpoint.
+        max_transients (int): stop after this many transients, if given.
+        transient_names (list[str]): only refresh these transients, if given.
+        invalidate_sed (bool): set the SED fits that depend on the
+            refreshed photometry back to not processed.
+    Returns:
+        (dict): progress, with the number of transients, images measured,
+            images failed, SED fits invalidated and the last transient
+            primary key.
+    """
+    checkpoint = None if restart else read_checkpoint(checkpoint_path)
+    if checkpoint is None:
+        checkpoint = {
+            "last_pk": None,
+            "transients": 0,
+            "images": 0,
+            "failed_images": 0,
+            "invalidated_sed_fits": 0,
+        }
+    # checkpoints written before failed images were counted
+    checkpoint.setdefault("failed_images", 0)
+
+    refreshed_transients, refreshed_images = 0, 0
+    start_time = time.time()
+    while max_transients is None or refreshed_transients < max_transients:
+        limit = chunk_size
+        if max_transients is not None:
+            limit = min(chunk_size, max_transients - refreshed_transients)
+        chunk = list(
+            transients_with_photometry(
+                after_pk=checkpoint["last_pk"], transient_names=transient_names
+            )[:limit]
+        )
+        if not chunk:
+            break
+
+        filter_registry.check()
+        refreshed, images, failed = refresh_photometry_chunk(chunk, processes=processes)
+        refreshed_images += images
+        checkpoint["images"] += images
+        checkpoint["failed_images"] += failed
+        if invalidate_sed:
+            for transient, aperture_types in refreshed.items():
+                checkpoint["invalidated_sed_fits"] += len(
+                    invalidate_sed_fits(transient, aperture_types)
+                )
+
+        refreshed_transients += len(chunk)
+        checkpoint["transients"] += len(chunk)
+        checkpoint["last_pk"] = chunk[-1].pk
+        if checkpoint_path is not None:
+            write_checkpoint(checkpoint_path, checkpoint)
+
+        if verbose:
+            elapsed = max(time.time() - start_time, 1e-6)
+            print(
+                f"Refreshed {checkpoint['transients']} transients, "
+                f"{checkpoint['images']} images, "
+                f"{checkpoint['failed_images']} failed "
+                f"({refreshed_transients / elapsed:.2f} transients, "
+                f"{refreshed_images / elapsed:.2f} images per second)"
+            )
+
+    return checkpoint
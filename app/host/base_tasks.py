@@ -1,12 +1,18 @@
 import os
 from abc import ABC
 from abc import abstractmethod
+from datetime import timedelta
+from functools import reduce
+from operator import or_
 from time import process_time
 
 from billiard.exceptions import SoftTimeLimitExceeded
+from django.db import transaction
+from django.db.models import Model
 from django.db.models import Q
 from django.utils import timezone
 
+from .filter_registry import filter_registry
 from .models import Status
 from .models import Task
 from .models import TaskRegister
@@ -137,6 +143,89 @@ class TaskRunner(ABC):
         except model.DoesNotExist:
             model.objects.create(**object_data)
 
+    def _bulk_upsert(self, model, unique_fields, objects_data):
+        """
+        Overwrites or creates many objects in the blast database in a few
+        statements inside one transaction. Unlike _overwrite_or_create_object
+        existing objects are updated in place, so they keep their primary key
+        and the objects that refer to them are not deleted.
+
+        Parameters
+            model (dango.model): blast model of the objects that need to be updated
+            unique_fields (list): names of the fields that together uniquely
+                identify an object, e.g. ["aperture", "transient", "filter"].
+            objects_data (list): data to be saved or overwritten for each
+                object (dict), including the unique fields. Fields that are
+                not given are reset to their defaults, as if the object had
+                been recreated.
+
+        Returns:
+            objects (list): the saved objects, in the order of objects_data.
+        """
+        if not objects_data:
+            return []
+
+        unique_attnames = [
+            model._meta.get_field(name).attname for name in unique_fields
+        ]
+        fields = [
+            field for field in model._meta.concrete_fields if not field.primary_key
+        ]
+
+        def data_key(data):
+            return tuple(
+                data[name].pk if isinstance(data[name], Model) else data[name]
+                for name in unique_fields
+            )
+
+        def object_key(object):
+            return tuple(getattr(object, attname) for attname in unique_attnames)
+
+        # a later entry for the same object wins, as it would one at a time
+        data_by_key = {data_key(data): data for data in objects_data}
+        query = reduce(
+            or_,
+            [
+                Q(**{name: data[name] for name in unique_fields})
+                for data in data_by_key.values()
+            ],
+        )
+
+        with transaction.atomic():
+            existing, duplicates = {}, []
+            for object in model.objects.filter(query).order_by("pk"):
+                key = object_key(object)
+                if key in data_by_key and key not in existing:
+                    existing[key] = object
+                elif key in data_by_key:
+                    duplicates.append(object.pk)
+
+            to_update, to_create = [], []
+            for key, data in data_by_key.items():
+                if key in existing:
+                    object = existing[key]
+                    for field in fields:
+                        if field.name in data:
+                            setattr(object, field.name, data[field.name])
+                        else:
+                            setattr(object, field.name, field.get_default())
+                    to_update.append(object)
+                else:
+                    to_create.append(model(**data))
+
+            if duplicates:
+                model.objects.filter(pk__in=duplicates).delete()
+            if to_update:
+                model.objects.bulk_update(to_update, [field.name for field in fields])
+            if to_create:
+                model.objects.bulk_create(to_create)
+
+            # MySQL does not return the primary keys of bulk created rows
+            saved = {
+                object_key(object): object for object in model.objects.filter(query)
+            }
+        return [saved[data_key(data)] for data in objects_data]
+
     @property
     def task_frequency_seconds(self) -> int:
         """
@@ -276,6 +365,53 @@ class TransientTaskRunner(TaskRunner):
         register = self.find_register_items_meeting_prerequisites()
         return self._select_highest_priority(register) if register.exists() else None
 
+    def claim_register_item(self, transient, stale_after_seconds=task_time_limit):
+        """
+        Atomically claims the task of a transient for processing.
+
+        Unlike select_register_item followed by an update, the claim is a
+        single conditional update, so when several workers race for the same
+        task only one of them gets it. A task that has been processing for
+        longer than stale_after_seconds, or since an unknown time, is taken over,
+        as by default that is longer than any task may run, so the worker
+        holding it has died.
+
+        Args:
+            transient (models.Transient): transient to claim the task of.
+            stale_after_seconds (float): age of a processing claim that can
+                be taken over, never taken over if None.
+        Returns:
+            register item (models.TaskRegister): claimed item, None if the
+                prerequisites are not met or the task was already claimed.
+        """
+        for task_name, status_message in self.prerequisites.items():
+            if task_name == self.task_name:
+                continue
+            if not TaskRegister.objects.filter(
+                transient=transient,
+                task__name=task_name,
+                status__message=status_message,
+            ).exists():
+                return None
+
+        claimable = Q(
+            status__message=self.prerequisites.get(self.task_name, "not processed")
+        )
+        if stale_after_seconds is not None:
+            stale_before = timezone.now() - timedelta(seconds=stale_after_seconds)
+            claimable |= Q(status__message="processing") & (
+                Q(last_modified__lt=stale_before) | Q(last_modified__isnull=True)
+            )
+        claimed = TaskRegister.objects.filter(
+            claimable, transient=transient, task__name=self.task_name
+        ).update(
+            status=Status.objects.get(message__exact="processing"),
+            last_modified=timezone.now(),
+        )
+        if not claimed:
+            return None
+        return TaskRegister.objects.get(transient=transient, task__name=self.task_name)
+
     def run_process(self, task_register_item=None):
         """
         Runs task runner process.
@@ -289,6 +425,8 @@ class TransientTaskRunner(TaskRunner):
             print(f'''task_register_item: {task_register_item}''')
             self._update_status(task_register_item, processing_status)
             transient = task_register_item.transient
+            # pick up filter changes made by other processes, once per task
+            filter_registry.check()
 
             start_time = process_time()
             try:
@@ -0,0 +1,102 @@
+"""
+Interpolation tables of the cosmological distances and ages blast uses.
+
+Astropy integrates the Friedmann equation on every call, which adds up when
+distances and ages are computed per transient, per filter or per posterior
+sample. The tables integrate it once per process on a redshift grid and
+interpolate with cubic splines in log(1 + z). Within the tabulated range the
+interpolated values agree with astropy to better than
+:data:`TABLE_RELATIVE_TOLERANCE`; outside it astropy is called directly.
+Values are returned as plain floats or arrays in Gyr and Mpc.
+"""
+import threading
+
+import numpy as np
+from astropy.cosmology import FlatLambdaCDM
+from astropy.cosmology import WMAP9
+from scipy.interpolate import CubicSpline
+
+# redshift range tabulated, which covers every redshift blast fits
+TABLE_Z_MAX = 20.0
+TABLE_SIZE = 2000
+
+# largest relative error of the interpolated quantities in the table range
+TABLE_RELATIVE_TOLERANCE = 1e-6
+
+
+class CosmologyTable:
+    """
+    Ages and distances of a cosmology interpolated from a table, built the
+    first time it is used.
+    Parameters
+    ----------
+    :cosmology : :class:`~astropy.cosmology.FLRW`
+    :z_max : float
+        Largest redshift in the table.
+    :size : int
+        Number of redshifts in the table.
+    """
+
+    def __init__(self, cosmology, z_max=TABLE_Z_MAX, size=TABLE_SIZE):
+        self.cosmology = cosmology
+        self.z_max = z_max
+        self.size = size
+        self._splines = None
+        self._lock = threading.Lock()
+
+    def _build(self):
+        with self._lock:
+            if self._splines is None:
+                x = np.linspace(0.0, np.log1p(self.z_max), self.size)
+                z = np.expm1(x)
+                self._splines = {
+                    "age": CubicSpline(x, self.cosmology.age(z).value),
+                    "transverse_distance": CubicSpline(
+                        x, self.cosmology.comoving_transverse_distance(z).value
+                    ),
+                }
+        return self._splines
+
+    def _interpolate(self, quantity, z, exact):
+        z = np.asarray(z, dtype=float)
+        if np.any(z < 0) or np.any(z > self.z_max):
+            return exact(z)
+        splines = self._splines or self._build()
+        value = splines[quantity](np.log1p(z))
+        return float(value) if value.ndim == 0 else value
+
+    def age(self, z):
+        """Age of the universe at redshift z in Gyr"""
+        return self._interpolate("age", z, lambda z: self.cosmology.age(z).value)
+
+    def lookback_time(self, z):
+        """Lookback time to redshift z in Gyr"""
+        return self.age(0.0) - self.age(z)
+
+    def comoving_transverse_distance(self, z):
+        """Comoving transverse distance to redshift z in Mpc"""
+        return self._interpolate(
+            "transverse_distance",
+            z,
+            lambda z: self.cosmology.comoving_transverse_distance(z).value,
+        )
+
+    def angular_diameter_distance(self, z):
+        """Angular diameter distance to redshift z in Mpc"""
+        return self.comoving_transverse_distance(z) / (1 + np.asarray(z))
+
+    def luminosity_distance(self, z):
+        """Luminosity distance to redshift z in Mpc"""
+        return self.comoving_transverse_distance(z) * (1 + np.asarray(z))
+
+    def distmod(self, z):
+        """Distance modulus to redshift z in mag"""
+        with np.errstate(divide="ignore"):
+            return 5 * np.log10(self.luminosity_distance(z)) + 25
+
+
+# cosmology of the aperture sizes
+flat_lcdm = CosmologyTable(FlatLambdaCDM(H0=70, Om0=0.315))
+
+# cosmology of the SED fits
+wmap9 = CosmologyTable(WMAP9)
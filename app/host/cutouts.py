@@ -1,6 +1,7 @@
 import os
 import re
 import time
+from collections import OrderedDict
 from io import BytesIO
 
 import astropy.table as at
@@ -19,16 +20,29 @@ from astroquery.mast import Observations
 from astroquery.sdss import SDSS
 from astroquery.skyview import SkyView
 from django.conf import settings
+from django.db.models import Q
 from dl import authClient as ac
 from dl import queryClient as qc
 from dl import storeClient as sc
 from pyvo.dal import sia
 
+from .host_utils import index_cutout_metadata
+from .host_utils import segmentation_path
 from .models import Cutout
 from .models import Filter
+from .storage import get_storage
 
 DOWNLOAD_SLEEP_TIME = int(os.environ.get("DOWNLOAD_SLEEP_TIME", "0"))
 DOWNLOAD_MAX_TRIES = int(os.environ.get("DOWNLOAD_MAX_TRIES", "1"))
+CUTOUT_FRAME_CACHE_SIZE = int(os.environ.get("CUTOUT_FRAME_CACHE_SIZE", "8"))
+
+# approximate side length of the frames each survey is downloaded in
+SURVEY_TILE_SIZE_DEG = {
+    "PanSTARRS": 0.4,
+    "WISE": 1.56,
+    "2MASS": 0.14,
+    "GALEX": 1.2,
+}
 
 # from host import SkyServer
 
@@ -97,51 +111,309 @@ def download_and_save_cutouts(
     """
 
     for filter in Filter.objects.all():
-        save_dir = f"{media_root}/{transient.name}/{filter.survey.name}/"
-        path_to_fits = save_dir + f"{filter.name}.fits"
-        file_exists = os.path.exists(path_to_fits)
-
-        cutout_name = f"{transient.name}_{filter.name}"
-        cutout_object = Cutout.objects.filter(
-            name=cutout_name, filter=filter, transient=transient
+        download_and_save_cutout(
+            transient, filter, fov=fov, media_root=media_root, overwrite=overwrite
         )
 
-        if not cutout_object.exists():
-            cutout_object = Cutout(name=cutout_name, filter=filter, transient=transient)
-            cutout_exists = False
+    return "processed"
+
+
+def download_and_save_cutout(
+    transient,
+    filter,
+    fov=Quantity(0.1, unit="deg"),
+    media_root=settings.CUTOUT_ROOT,
+    overwrite=settings.CUTOUT_OVERWRITE,
+    frame_cache=None,
+):
+    """
+    Download and save the cutout of a single transient in a single filter,
+    recording the outcome on the transient's Cutout object.
+
+    Parameters
+    ----------
+    :transient : :class:`~host.models.Transient`
+        Transient the cutout is centred on.
+    :filter : :class:`~host.models.Filter`
+        Filter to download imaging in.
+    :frame_cache : :class:`FrameCache` or None
+        If given, full survey frames are fetched through the cache so frames
+        shared between transients are only downloaded once.
+    Returns
+    -------
+    :cutout_object : :class:`~host.models.Cutout`
+    """
+    save_dir = f"{media_root}/{transient.name}/{filter.survey.name}/"
+    path_to_fits = save_dir + f"{filter.name}.fits"
+    storage = get_storage()
+    file_exists = storage.exists(path_to_fits)
+
+    cutout_name = f"{transient.name}_{filter.name}"
+    cutout_object = Cutout.objects.filter(
+        name=cutout_name, filter=filter, transient=transient
+    )
+
+    if not cutout_object.exists():
+        cutout_object = Cutout(name=cutout_name, filter=filter, transient=transient)
+        cutout_exists = False
+    else:
+        cutout_object = cutout_object[0]
+        cutout_exists = True
+
+    fits = None
+    if (
+        (not file_exists or not cutout_exists)
+        and cutout_object.message != "No image found"
+    ) or not overwrite == "False":
+        if not file_exists and cutout_object.message != "No image found":
+            fits, status, err = cutout(
+                transient.sky_coord, filter, fov=fov, frame_cache=frame_cache
+            )
+
+            if fits:
+                buffer = BytesIO()
+                fits.writeto(buffer)
+                storage.save(path_to_fits, buffer.getvalue())
+                # the segmentation of a replaced image is stale
+                storage.delete(segmentation_path(path_to_fits))
+
+        # if there is data, save path to the file
+        # otherwise record that we searched and couldn't find anything
+        if file_exists or fits:
+            cutout_object.fits.name = path_to_fits
+            if fits or not cutout_object.has_metadata:
+                try:
+                    index_cutout_metadata(cutout_object, image=fits)
+                except Exception as e:
+                    print(f"could not index metadata of {cutout_name}: {e}")
+            cutout_object.save()
+
+        elif status == 1:
+            cutout_object.message = "Download error"
+            cutout_object.save()
+
         else:
-            cutout_object = cutout_object[0]
-            cutout_exists = True
-
-        fits = None
-        if (
-            (not file_exists or not cutout_exists)
-            and cutout_object.message != "No image found"
-        ) or not overwrite == "False":
-            if not file_exists and cutout_object.message != "No image found":
-                fits, status, err = cutout(transient.sky_coord, filter, fov=fov)
-
-                if fits:
-                    save_dir = f"{media_root}/{transient.name}/{filter.survey.name}/"
-                    os.makedirs(save_dir, exist_ok=True)
-                    path_to_fits = save_dir + f"{filter.name}.fits"
-                    fits.writeto(path_to_fits, overwrite=True)
-
-            # if there is data, save path to the file
-            # otherwise record that we searched and couldn't find anything
-            if file_exists or fits:
-                cutout_object.fits.name = path_to_fits
-                cutout_object.save()
-
-            elif status == 1:
-                cutout_object.message = "Download error"
-                cutout_object.save()
-
-            else:
-                cutout_object.message = "No image found"
-                cutout_object.save()
+            cutout_object.message = "No image found"
+            cutout_object.save()
 
-    return "processed"
+    return cutout_object
+
+
+def cutout_is_pending(
+    transient,
+    filter,
+    media_root=settings.CUTOUT_ROOT,
+    overwrite=settings.CUTOUT_OVERWRITE,
+):
+    """
+    Checks whether a transient still needs a cutout downloaded in a filter.
+    Every cutout is pending if existing cutouts are overwritten.
+    """
+    if not overwrite == "False":
+        return True
+    save_dir = f"{media_root}/{transient.name}/{filter.survey.name}/"
+    if get_storage().exists(save_dir + f"{filter.name}.fits"):
+        return False
+    return (
+        not Cutout.objects.filter(
+            name=f"{transient.name}_{filter.name}", filter=filter, transient=transient
+        )
+        .filter(Q(message="No image found") | ~Q(fits=""))
+        .exists()
+    )
+
+
+def survey_tile_key(position, filter):
+    """
+    Approximate survey tile a position falls in.
+
+    Survey frames (PanSTARRS skycells, AllWISE atlas tiles, 2MASS atlas
+    images, GALEX tiles) are laid out on grids that are not cheap to compute
+    locally, so positions are binned on a grid with the survey's tile size.
+    Transients sharing a key are very likely to share a frame; the exact frame
+    identity is its URL, which the :class:`FrameCache` is keyed on.
+
+    Parameters
+    ----------
+    :position : :class:`~astropy.coordinates.SkyCoord`
+    :filter : :class:`~host.models.Filter`
+    Returns
+    -------
+    :key : tuple or None
+        None if the survey is not downloaded as full frames.
+    """
+    tile_size_deg = SURVEY_TILE_SIZE_DEG.get(filter.survey.name)
+    if tile_size_deg is None:
+        return None
+
+    dec_index = int(np.floor((position.dec.deg + 90.0) / tile_size_deg))
+    dec_centre = (dec_index + 0.5) * tile_size_deg - 90.0
+    ra_tile_size_deg = tile_size_deg / max(np.cos(np.radians(dec_centre)), 1e-3)
+    ra_index = int(np.floor(position.ra.deg / ra_tile_size_deg))
+    return (filter.name, dec_index, ra_index)
+
+
+def group_cutouts_by_tile(
+    transients,
+    filters,
+    media_root=settings.CUTOUT_ROOT,
+    overwrite=settings.CUTOUT_OVERWRITE,
+):
+    """
+    Groups the pending cutout downloads of many transients by survey tile.
+
+    Returns
+    -------
+    :groups : dict[tuple: list[tuple(Transient, Filter)]]
+        Pending (transient, filter) pairs keyed by tile. Surveys that are not
+        downloaded as full frames are keyed per transient.
+    """
+    groups = {}
+    for filter in filters:
+        for transient in transients:
+            if not cutout_is_pending(
+                transient, filter, media_root=media_root, overwrite=overwrite
+            ):
+                continue
+            key = survey_tile_key(transient.sky_coord, filter)
+            if key is None:
+                key = (filter.name, transient.name)
+            groups.setdefault(key, []).append((transient, filter))
+    return groups
+
+
+def download_and_save_cutouts_batch(
+    transients,
+    filters=None,
+    fov=Quantity(0.1, unit="deg"),
+    media_root=settings.CUTOUT_ROOT,
+    overwrite=settings.CUTOUT_OVERWRITE,
+    max_cached_frames=CUTOUT_FRAME_CACHE_SIZE,
+):
+    """
+    Download the cutouts of many transients, fetching each survey frame once.
+
+    Pending work is grouped by survey tile and each group is cut out of the
+    same in-memory frames, so a burst of transients in the same field costs
+    one frame download per filter rather than one per transient.
+
+    Parameters
+    ----------
+    :transients : list[:class:`~host.models.Transient`]
+    :filters : list[:class:`~host.models.Filter`] or None
+        Filters to download, defaults to all filters.
+    :max_cached_frames : int
+        Maximum number of full frames kept in memory at once.
+    Returns
+    -------
+    :frame_cache : :class:`FrameCache`
+        The cache used, which records frame hits and misses.
+    :failed : set[str]
+        Names of the transients a download raised an error for. The other
+        transients and filters are still downloaded.
+    """
+    if filters is None:
+        filters = Filter.objects.all().select_related("survey")
+
+    frame_cache = FrameCache(max_frames=max_cached_frames)
+    failed = set()
+    groups = group_cutouts_by_tile(
+        transients, filters, media_root=media_root, overwrite=overwrite
+    )
+    for group in groups.values():
+        for transient, filter in group:
+            try:
+                download_and_save_cutout(
+                    transient,
+                    filter,
+                    fov=fov,
+                    media_root=media_root,
+                    overwrite=overwrite,
+                    frame_cache=frame_cache,
+                )
+            except Exception as err:
+                print(f"could not download {transient.name} {filter.name}: {err}")
+                failed.add(transient.name)
+    frame_cache.clear()
+    print(
+        f"Downloaded {len(groups)} tile groups: "
+        f"{frame_cache.misses} frames fetched, {frame_cache.hits} reused"
+    )
+
+    return frame_cache, failed
+
+
+class FrameCache:
+    """
+    Least recently used cache of full survey frames keyed by URL.
+
+    Attributes:
+        max_frames (int): Maximum number of frames kept open.
+        hits (int): Number of frame requests served from the cache.
+        misses (int): Number of frames downloaded.
+    """
+
+    def __init__(self, max_frames=CUTOUT_FRAME_CACHE_SIZE):
+        self.max_frames = max_frames
+        self.hits = 0
+        self.misses = 0
+        self._frames = OrderedDict()
+
+    def open(self, url, loader=None):
+        """
+        Returns the frame at url, downloading it only if it is not cached.
+        """
+        if url in self._frames:
+            self._frames.move_to_end(url)
+            self.hits += 1
+            return self._frames[url]
+
+        frame = fits.open(url, cache=None) if loader is None else loader(url)
+        self.misses += 1
+        self._frames[url] = frame
+        while len(self._frames) > self.max_frames:
+            _, evicted = self._frames.popitem(last=False)
+            evicted.close()
+        return frame
+
+    def clear(self):
+        """
+        Closes and forgets all cached frames.
+        """
+        for frame in self._frames.values():
+            frame.close()
+        self._frames.clear()
+
+
+def open_frame(url, frame_cache=None):
+    """
+    Opens a full survey frame, through the frame cache if one is given.
+    """
+    if frame_cache is None:
+        return fits.open(url, cache=None)
+    return frame_cache.open(url)
+
+
+def cutout_from_frame(frame, position, image_size, hdu_index=0):
+    """
+    Cuts a square image out of a full survey frame without modifying the
+    frame, so that it can be reused for other positions.
+
+    Parameters
+    ----------
+    :frame : :class:`~astropy.io.fits.HDUList`
+    :position : :class:`~astropy.coordinates.SkyCoord`
+    :image_size: int: size of cutout image in pixels
+    Returns
+    -------
+    :cutout : :class:`~astropy.io.fits.HDUList`
+    """
+    header = frame[hdu_index].header
+    wcs = WCS(header)
+    cutout = Cutout2D(frame[hdu_index].data, position, image_size, wcs=wcs, copy=True)
+    hdu = fits.PrimaryHDU(data=cutout.data, header=header.copy())
+    hdu.header.update(cutout.wcs.to_header())
+    return fits.HDUList([hdu])
 
 
 def panstarrs_image_filename(position, image_size=None, filter=None):
@@ -204,7 +476,7 @@ def hips_cutout(position, survey, image_size=None):
     return fits_image
 
 
-def panstarrs_cutout(position, image_size=None, filter=None):
+def panstarrs_cutout(position, image_size=None, filter=None, frame_cache=None):
     """
     Download Panstarrs cutout from their own service
 
@@ -214,13 +486,21 @@ def panstarrs_cutout(position, image_size=None, filter=None):
         Target centre position of the cutout image to be downloaded.
     :image_size: int: size of cutout image in pixels
     :filter: str: Panstarrs filter (g r i z y)
+    :frame_cache: :class:`FrameCache` or None: if given, the whole skycell
+        is downloaded once and cut locally instead of using fitscut.
     Returns
     -------
     :cutout : :class:`~astropy.io.fits.HDUList` or None
     """
 
     filename = panstarrs_image_filename(position, image_size=image_size, filter=filter)
-    if filename is not None:
+    if filename is not None and frame_cache is not None:
+        skycell = frame_cache.open(
+            f"https://ps1images.stsci.edu{filename}", loader=panstarrs_skycell
+        )
+        fits_image = unscale_panstarrs(cutout_from_frame(skycell, position, image_size))
+
+    elif filename is not None:
         service = "https://ps1images.stsci.edu/cgi-bin/fitscut.cgi?"
         fits_url = (
             f"{service}ra={position.ra.degree}&dec={position.dec.degree}"
@@ -239,7 +519,53 @@ def panstarrs_cutout(position, image_size=None, filter=None):
     return fits_image
 
 
-def galex_cutout(position, image_size=None, filter=None):
+def panstarrs_skycell(url):
+    """
+    Download a whole Panstarrs stack skycell. The pixel values keep their
+    native type and asinh scaling, which :func:`unscale_panstarrs` undoes on
+    each cutout.
+
+    Parameters
+    ----------
+    :url: str: url of the skycell stack image
+    Returns
+    -------
+    :skycell : :class:`~astropy.io.fits.HDUList`
+    """
+    with fits.open(url, cache=None) as skycell_file:
+        hdu = skycell_file[1] if len(skycell_file) > 1 else skycell_file[0]
+        header = hdu.header.copy()
+        data = np.asarray(hdu.data)
+    for keyword in ["BLANK", "ZIMAGE"]:
+        header.remove(keyword, ignore_missing=True)
+
+    return fits.HDUList([fits.PrimaryHDU(data=data, header=header)])
+
+
+def unscale_panstarrs(image):
+    """
+    Undo the asinh scaling of the pixel values of a Panstarrs image cut out
+    of a skycell, as fitscut does for cutouts.
+
+    Parameters
+    ----------
+    :image : :class:`~astropy.io.fits.HDUList`
+    Returns
+    -------
+    :image : :class:`~astropy.io.fits.HDUList`
+    """
+    header = image[0].header
+    data = image[0].data.astype(np.float64)
+    if "BSOFTEN" in header and "BOFFSET" in header:
+        a = 2.5 / np.log(10)
+        data = header["BOFFSET"] + header["BSOFTEN"] * 2.0 * np.sinh(data / a)
+    for keyword in ["BSOFTEN", "BOFFSET"]:
+        header.remove(keyword, ignore_missing=True)
+    image[0].data = data
+    return image
+
+
+def galex_cutout(position, image_size=None, filter=None, frame_cache=None):
     """
     Download GALEX cutout from MAST
 
@@ -272,7 +598,7 @@ def galex_cutout(position, image_size=None, filter=None):
     if len(obs):
         ### stupid MAST thinks we want the exposure time map
 
-        fits_image = fits.open(
+        frame = open_frame(
             obs["dataURL"][0]
             .replace("-exp.fits.gz", "-int.fits.gz")
             .replace("-gsp.fits.gz", "-int.fits.gz")
@@ -280,13 +606,10 @@ def galex_cutout(position, image_size=None, filter=None):
             .replace("-cnt.fits.gz", "-int.fits.gz")
             .replace("-fcat.ds9reg", "-int.fits.gz")
             .replace("-xd-mcat.fits.gz", f"-{filter[0].lower()}d-int.fits.gz"),
-            cache=None,
+            frame_cache=frame_cache,
         )
 
-        wcs = WCS(fits_image[0].header)
-        cutout = Cutout2D(fits_image[0].data, position, image_size, wcs=wcs)
-        fits_image[0].data = cutout.data
-        fits_image[0].header.update(cutout.wcs.to_header())
+        fits_image = cutout_from_frame(frame, position, image_size)
         if not np.any(fits_image[0].data):
             fits_image = None
     else:
@@ -295,7 +618,7 @@ def galex_cutout(position, image_size=None, filter=None):
     return fits_image
 
 
-def WISE_cutout(position, image_size=None, filter=None):
+def WISE_cutout(position, image_size=None, filter=None, frame_cache=None):
     """
     Download WISE image cutout from IRSA
 
@@ -341,12 +664,9 @@ def WISE_cutout(position, image_size=None, filter=None):
     exptime = data["t_exptime"][0]
 
     if url is not None:
-        fits_image = fits.open(url, cache=None)
+        frame = open_frame(url, frame_cache=frame_cache)
 
-        wcs = WCS(fits_image[0].header)
-        cutout = Cutout2D(fits_image[0].data, position, image_size, wcs=wcs)
-        fits_image[0].data = cutout.data
-        fits_image[0].header.update(cutout.wcs.to_header())
+        fits_image = cutout_from_frame(frame, position, image_size)
         fits_image[0].header["EXPTIME"] = exptime
 
     else:
@@ -427,7 +747,7 @@ def DES_cutout(position, image_size=None, filter=None):
     return fits_image
 
 
-def TWOMASS_cutout(position, image_size=None, filter=None):
+def TWOMASS_cutout(position, image_size=None, filter=None, frame_cache=None):
     """
     Download 2MASS image cutout from IRSA
 
@@ -450,16 +770,14 @@ def TWOMASS_cutout(position, image_size=None, filter=None):
         if re.match(f"https://irsa.*{filter.lower()}i.*fits", line.split("]]>")[0]):
             fitsurl = line.split("]]")[0]
 
-            fits_image = fits.open(fitsurl, cache=None)
+            fits_image = open_frame(fitsurl, frame_cache=frame_cache)
             wcs = WCS(fits_image[0].header)
 
             if position.contained_by(wcs):
                 break
 
     if fits_image is not None:
-        cutout = Cutout2D(fits_image[0].data, position, image_size, wcs=wcs)
-        fits_image[0].data = cutout.data
-        fits_image[0].header.update(cutout.wcs.to_header())
+        fits_image = cutout_from_frame(fits_image, position, image_size)
 
     else:
         fits_image = None
@@ -551,7 +869,7 @@ download_function_dict = {
 }
 
 
-def cutout(transient, survey, fov=Quantity(0.1, unit="deg")):
+def cutout(transient, survey, fov=Quantity(0.1, unit="deg"), frame_cache=None):
     """
     Download image cutout data from a survey.
     Parameters
@@ -566,6 +884,9 @@ def cutout(transient, survey, fov=Quantity(0.1, unit="deg")):
         Field of view of the cutout image, angular length of one of the sides
         of the square cutout. Angular astropy quantity. Default is angular
         length of 0.2 degrees.
+    :frame_cache : :class:`FrameCache` or None
+        Cache of full survey frames shared between cutouts, used by the
+        surveys that are downloaded as whole frames.
     Returns
     -------
     :cutout : :class:`~astropy.io.fits.HDUList` or None
@@ -591,10 +912,11 @@ def cutout(transient, survey, fov=Quantity(0.1, unit="deg")):
                 err = e
         else:
             survey_name, filter = survey.name.split("_")
+            download_kwargs = {"filter": filter, "image_size": num_pixels}
+            if survey_name in SURVEY_TILE_SIZE_DEG and frame_cache is not None:
+                download_kwargs["frame_cache"] = frame_cache
             try:
-                fits = download_function_dict[survey_name](
-                    transient, filter=filter, image_size=num_pixels
-                )
+                fits = download_function_dict[survey_name](transient, **download_kwargs)
                 status = 0
                 err = None
             except Exception as e:
@@ -0,0 +1,170 @@
+"""
+Process-wide registry of filter metadata.
+
+Filter rows, transmission curves and correlated error models are needed for
+every SED fit and photometry measurement, but only change when the filter
+fixtures do. The registry loads them once per process and hands out the
+cached objects. Saving or deleting a Filter invalidates it, bumping its
+version, and anything else that changes the filter data can call
+:meth:`FilterRegistry.invalidate`. Changes made by other processes, to the
+Filter table or to the transmission curve files, are found by
+:meth:`FilterRegistry.check`, which compares a fingerprint of both at most
+every FILTER_REGISTRY_CHECK_SECONDS. Task runners call it once before each
+task, in the worker process, so lookups never query the database themselves
+and can be made in forked photometry workers. Cached arrays are read-only and
+cached objects must not be modified.
+"""
+import hashlib
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+
+from .models import Filter
+
+
+def filter_fingerprint():
+    """
+    Hash of the Filter table and of the names, sizes and modification times
+    of the transmission curve files, which changes whenever either does.
+    """
+    digest = hashlib.sha1()
+    fields = [field.attname for field in Filter._meta.concrete_fields]
+    for row in Filter.objects.order_by("pk").values_list(*fields):
+        digest.update(repr(row).encode())
+    if os.path.isdir(settings.TRANSMISSION_CURVES_ROOT):
+        entries = os.scandir(settings.TRANSMISSION_CURVES_ROOT)
+        for entry in sorted(entries, key=lambda entry: entry.name):
+            stat = entry.stat()
+            digest.update(f"{entry.name}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+
+class FilterRegistry:
+    """
+    In-memory cache of the Filter table and of the data derived from it,
+    keyed by filter name.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = 0
+        self._filters = None
+        self._transmission_curves = {}
+        self._correlation_models = {}
+        self._fingerprint = None
+        self._checked_at = None
+
+    def invalidate(self, **kwargs):
+        """Drops everything cached, so it is reloaded on next use."""
+        with self._lock:
+            self.version += 1
+            self._filters = None
+            self._transmission_curves = {}
+            self._correlation_models = {}
+
+    def check(self):
+        """
+        Invalidates the registry if the filter data has changed since the
+        last check, unless that was less than FILTER_REGISTRY_CHECK_SECONDS
+        ago. This queries the database, so it must not be called from forked
+        workers.
+        """
+        now = time.monotonic()
+        if (
+            self._checked_at is not None
+            and now - self._checked_at < settings.FILTER_REGISTRY_CHECK_SECONDS
+        ):
+            return
+        fingerprint = filter_fingerprint()
+        if self._fingerprint is not None and fingerprint != self._fingerprint:
+            self.invalidate()
+        self._fingerprint = fingerprint
+        self._checked_at = now
+
+    def _filter_map(self):
+        filters = self._filters
+        if filters is None:
+            with self._lock:
+                if self._filters is None:
+                    self._filters = {
+                        filter.name: filter
+                        for filter in Filter.objects.all()
+                        .select_related("survey")
+                        .order_by("pk")
+                    }
+                filters = self._filters
+        return filters
+
+    def filters(self):
+        """All filters, in primary key order."""
+        return list(self._filter_map().values())
+
+    def get(self, name):
+        """
+        The filter called name.
+        Raises
+        ------
+        :Filter.DoesNotExist:
+            If there is no such filter.
+        """
+        try:
+            return self._filter_map()[name]
+        except KeyError:
+            raise Filter.DoesNotExist(f"No filter called {name}")
+
+    def transmission_curve(self, filter):
+        """
+        The transmission curve of a filter as an :class:`sedpy.observate.Filter`.
+        Parameters
+        ----------
+        :filter : :class:`~host.models.Filter` or str
+            The filter or its name.
+        """
+        if isinstance(filter, str):
+            filter = self.get(filter)
+        curves = self._transmission_curves
+        if filter.name not in curves:
+            curves[filter.name] = filter.transmission_curve()
+        return curves[filter.name]
+
+    def correlation_model(self, filter):
+        """
+        The model for correlated errors of a filter, (None, None) if it has
+        none.
+        Parameters
+        ----------
+        :filter : :class:`~host.models.Filter` or str
+            The filter or its name.
+        """
+        if isinstance(filter, str):
+            filter = self.get(filter)
+        models = self._correlation_models
+        if filter.name not in models:
+            model = filter.correlation_model()
+            for array in model:
+                if array is not None:
+                    array.flags.writeable = False
+            models[filter.name] = model
+        return models[filter.name]
+
+    def wave_effective(self, filter):
+        """Effective wavelength of a filter in angstrom."""
+        return self.transmission_curve(filter).wave_effective
+
+
+filter_registry = FilterRegistry()
+
+post_save.connect(
+    filter_registry.invalidate,
+    sender=Filter,
+    dispatch_uid="filter_registry_post_save",
+)
+post_delete.connect(
+    filter_registry.invalidate,
+    sender=Filter,
+    dispatch_uid="filter_registry_post_delete",
+)
@@ -0,0 +1,54 @@
+"""
+Read-only access to FITS images for the photometry stages.
+
+Images are memory-mapped rather than read into memory, and the file handle
+and memory map are released as soon as the ``with`` block exits, so long
+lived workers do not accumulate open files or resident memory. The objects
+yielded behave like :class:`~astropy.io.fits.HDUList`, so code written
+against ``image[0].data`` and ``image[0].header`` works unchanged. Data
+arrays are views onto the memory map and must not be used after the block;
+copy anything that needs to outlive it.
+"""
+from contextlib import contextmanager
+
+from astropy.io import fits
+
+from .storage import get_storage
+
+
+@contextmanager
+def open_fits(path):
+    """
+    Opens a FITS file read-only and memory-mapped, closing it on exit.
+    Parameters
+    ----------
+    :path : str
+        Local path of the FITS file.
+    Returns
+    -------
+    :image : :class:`~astropy.io.fits.HDUList`
+    """
+    image = fits.open(path, mode="readonly", memmap=True)
+    try:
+        yield image
+    finally:
+        # drop the data views so that closing also unmaps the file
+        for hdu in image:
+            if "data" in hdu.__dict__:
+                del hdu.data
+        image.close()
+
+
+@contextmanager
+def open_cutout(cutout):
+    """
+    Opens the image of a cutout, fetching it from storage if needed.
+    Parameters
+    ----------
+    :cutout : :class:`~host.models.Cutout`
+    Returns
+    -------
+    :image : :class:`~astropy.io.fits.HDUList`
+    """
+    with open_fits(get_storage().local_path(cutout.fits.name)) as image:
+        yield image
@@ -1,87 +1,185 @@
-import glob
 import os
+import tempfile
+import threading
+from contextlib import contextmanager
 
 from astro_ghost.ghostHelperFunctions import getGHOST
 from astro_ghost.ghostHelperFunctions import getTransientHosts
-from astro_ghost.photoz_helper import calc_photoz
 from astropy.coordinates import SkyCoord
-from django.conf import settings
 
 from .models import Host
+from .photoz import photoz_model
+from .photoz import PhotozHelperMismatch
 
 
-def run_ghost(transient, output_dir=settings.GHOST_OUTPUT_ROOT):
-    """
-    Finds the information about the host galaxy given the position of the supernova.
-    Parameters
-    ----------
-    :position : :class:`~astropy.coordinates.SkyCoord`
-        On Sky position of the source to be matched.
-    :name : str, default='No name'
-        Name of the the object.
-    Returns
-    -------
-    :host_information : ~astropy.coordinates.SkyCoord`
-        Host position
-    """
-    getGHOST(real=False, verbose=1)
-    transient_position = SkyCoord(
-        ra=transient.ra_deg, dec=transient.dec_deg, unit="deg"
-    )
-
+def ghost_transient_name(transient):
+    """The name GHOST knows a transient by."""
     # dumb hack for ghost
     try:
         float(transient.name)
         transient_name = "sn" + str(transient.name)
-    except Exception as e:
+    except Exception:
         transient_name = transient.name
+    return transient_name.replace(" ", "")
 
-    ### some issues with Pan-STARRS downloads
-    host_data = getTransientHosts(
-        transientCoord=[transient_position],
-        transientName=[transient_name],
-        verbose=1,
-        savepath=output_dir,
-        starcut="gentle",
-        ascentMatch=False,
-    )
 
-    # photo-z only implemented for dec > -30
-    if transient_position.dec.deg > -30:
+class GhostContext:
+    """
+    GHOST host association kept warm for the lifetime of a worker process.
+    The GHOST database is set up the first time the context is used instead
+    of on every association, and transients are associated in batches, so
+    the setup and the photo-z prediction are paid once per batch rather than
+    once per transient. Each association runs in its own temporary workspace,
+    which is removed as soon as it finishes.
+    """
+
+    def __init__(self):
+        self._ready = False
+        self._lock = threading.Lock()
+        self._workspace_lock = threading.Lock()
+
+    def _setup(self):
+        with self._lock:
+            if not self._ready:
+                getGHOST(real=False, verbose=1)
+                self._ready = True
+
+    @contextmanager
+    def _in_workspace(self, workspace):
+        """
+        Runs GHOST from inside workspace, so the scratch it writes to the
+        working directory, such as quiverMaps/, is removed with it. The
+        working directory is shared by the whole process, so associations
+        wait for each other.
+        """
+        with self._workspace_lock:
+            cwd = os.getcwd()
+            os.chdir(workspace)
+            try:
+                yield
+            finally:
+                os.chdir(cwd)
+
+    def associate_hosts(self, transients):
+        """
+        Finds the host galaxies of transients.
+        Parameters
+        ----------
+        :transients : list[Transient]
+            Transients to associate.
+        Returns
+        -------
+        :hosts : dict[str, Host]
+            Unsaved host of each transient by transient name, None if GHOST
+            found none.
+        """
+        self._setup()
+        hosts = {transient.name: None for transient in transients}
+        if not transients:
+            return hosts
+
+        names = {
+            ghost_transient_name(transient): transient.name for transient in transients
+        }
+        positions = [
+            SkyCoord(ra=transient.ra_deg, dec=transient.dec_deg, unit="deg")
+            for transient in transients
+        ]
+
+        # GHOST writes its intermediate tables to savepath, which it expects to
+        # end with a separator, and other scratch to the working directory
+        with tempfile.TemporaryDirectory(prefix="ghost_") as workspace:
+            with self._in_workspace(workspace):
+                ### some issues with Pan-STARRS downloads
+                host_data = getTransientHosts(
+                    transientCoord=positions,
+                    transientName=list(names),
+                    verbose=1,
+                    savepath=workspace + os.sep,
+                    starcut="gentle",
+                    ascentMatch=False,
+                )
+        if len(host_data) == 0:
+            return hosts
+
+        decs = {
+            ghost_transient_name(transient): transient.dec_deg
+            for transient in transients
+        }
+        host_data = self._photoz(host_data, decs)
+
+        for _, row in host_data.iterrows():
+            name = names.get(row["TransientName"])
+            if name is not None and hosts[name] is None:
+                hosts[name] = host_from_ghost(row)
+        return hosts
+
+    def _photoz(self, host_data, decs):
+        """
+        Adds photo-z estimates to the hosts in one batch, decs being the
+        declination of each transient by its GHOST name.
+        """
+        # photo-z only implemented for transients at dec > -30
+        north = host_data["TransientName"].map(decs) > -30
+        if not north.any():
+            return host_data
+
         # still getting random photo-z bugs
         # but this shouldn't be a show-stopper
         try:
-            host_data = calc_photoz(
-                host_data,
-                dust_path=settings.GHOST_DUST_PATH,
-                model_path=settings.GHOST_PHOTOZ_PATH,
-            )
+            photoz_data = photoz_model.photoz(host_data[north].copy())
+        except PhotozHelperMismatch:
+            raise
         except Exception as err:
             print(f"warning : photo-z step failed: {err}")
+            return host_data
 
-    # clean up after GHOST...
-    # dir_list = glob.glob('transients_*/*/*')
-    # for dir in dir_list: os.remove(dir)
-
-    # for level in ['*/*/', '*/']:
-    #    dir_list = glob.glob('transients_' + level)
-    #    for dir in dir_list: os.rmdir(dir)
-    if len(host_data) == 0:
-        host = None
-    else:
-        host = Host(
-            ra_deg=host_data["raMean"][0],
-            dec_deg=host_data["decMean"][0],
-            name=host_data["TransientName"][0],
-        )
-
-        if host_data["NED_redshift"][0] == host_data["NED_redshift"][0]:
-            host.redshift = host_data["NED_redshift"][0]
-
-        if (
-            "photo_z" in host_data.keys()
-            and host_data["photo_z"][0] == host_data["photo_z"][0]
-        ):
-            host.photometric_redshift = host_data["photo_z"][0]
+        for column in ["photo_z", "photo_z_err"]:
+            if column in photoz_data.keys():
+                host_data.loc[north, column] = photoz_data[column]
+        return host_data
+
+
+def host_from_ghost(row):
+    """
+    Host of a row of GHOST output.
+    Parameters
+    ----------
+    :row : :class:`~pandas.Series`
+        Row of the host data GHOST returns.
+    Returns
+    -------
+    :host : Host
+        Unsaved host.
+    """
+    host = Host(
+        ra_deg=row["raMean"],
+        dec_deg=row["decMean"],
+        name=row["TransientName"],
+    )
+
+    if row["NED_redshift"] == row["NED_redshift"]:
+        host.redshift = row["NED_redshift"]
+
+    if "photo_z" in row.keys() and row["photo_z"] == row["photo_z"]:
+        host.photometric_redshift = row["photo_z"]
 
     return host
+
+
+ghost_context = GhostContext()
+
+
+def run_ghost(transient):
+    """
+    Finds the information about the host galaxy given the position of the supernova.
+    Parameters
+    ----------
+    :transient : Transient
+        Transient to match.
+    Returns
+    -------
+    :host : Host
+        Unsaved host, None if GHOST found none.
+    """
+    return ghost_context.associate_hosts([transient])[transient.name]
@@ -0,0 +1,235 @@
+"""
+Reuse of host galaxy products across transients that share a host.
+
+GHOST matches are resolved to a canonical Host, so transients in the same
+galaxy point at the same row. A host-level stage (global aperture, global
+photometry, host dust, global SED fit) of such a transient can then copy the
+outputs of a donor: another transient of the same host whose stage has been
+processed, provided the inputs of the stage are the same for both. Reuse can
+be switched off with the HOST_PRODUCT_REUSE setting.
+"""
+import math
+import os
+from contextlib import contextmanager
+
+from astropy.coordinates import SkyCoord
+from django.conf import settings
+from django.db import connection
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Aperture
+from .models import AperturePhotometry
+from .models import Cutout
+from .models import Host
+from .models import Transient
+from .storage import get_storage
+
+# GHOST hosts closer than this to an existing host are the same galaxy
+HOST_MATCH_RADIUS_ARCSEC = 1.0
+# named database lock host matches are serialized on
+HOST_MATCH_LOCK = "blast_host_match"
+HOST_MATCH_LOCK_TIMEOUT_SECONDS = 60
+
+
+@contextmanager
+def host_match_lock(timeout_seconds=HOST_MATCH_LOCK_TIMEOUT_SECONDS):
+    """
+    Holds the named MySQL lock host matches are serialized on. Locking the
+    rows of nearby hosts is not enough, as a galaxy matched for the first
+    time has no row to lock.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT GET_LOCK(%s, %s)", [HOST_MATCH_LOCK, timeout_seconds])
+        (acquired,) = cursor.fetchone()
+    if not acquired:
+        raise RuntimeError("timed out waiting for the host match lock")
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", [HOST_MATCH_LOCK])
+
+
+def canonical_host(host, radius_arcsec=HOST_MATCH_RADIUS_ARCSEC):
+    """
+    The existing host nearest to a newly matched host, if there is one within
+    radius_arcsec, otherwise the new host, saved. Redshifts the existing host
+    is missing are filled in from the new one. Matches hold the host match
+    lock until the new host is committed, so concurrent matches of the same
+    galaxy resolve to one row.
+    Parameters
+    ----------
+    :host : :class:`~host.models.Host`
+        Unsaved host from GHOST.
+    :radius_arcsec : float
+    Returns
+    -------
+    :host : :class:`~host.models.Host`
+    """
+    radius_deg = radius_arcsec / 3600
+    with host_match_lock(), transaction.atomic():
+        candidates = list(
+            Host.objects.filter(
+                dec_deg__range=(host.dec_deg - radius_deg, host.dec_deg + radius_deg)
+            )
+        )
+        if candidates:
+            separation = host.sky_coord.separation(
+                SkyCoord(
+                    [candidate.ra_deg for candidate in candidates],
+                    [candidate.dec_deg for candidate in candidates],
+                    unit="deg",
+                )
+            ).arcsec
+            nearest = min(range(len(candidates)), key=lambda i: separation[i])
+            if separation[nearest] <= radius_arcsec:
+                existing = candidates[nearest]
+                updated_fields = []
+                for field in ["redshift", "photometric_redshift"]:
+                    value = getattr(host, field)
+                    if getattr(existing, field) is None and value is not None:
+                        setattr(existing, field, value)
+                        updated_fields.append(field)
+                if updated_fields:
+                    existing.save(update_fields=updated_fields)
+                return existing
+
+        host.save()
+    return host
+
+
+def host_donor(transient, task_name):
+    """
+    The most recently added other transient of the same host whose task_name
+    stage has been processed, None if there is none or reuse is switched off.
+    """
+    if not settings.HOST_PRODUCT_REUSE or transient.host_id is None:
+        return None
+    return (
+        Transient.objects.filter(
+            host_id=transient.host_id,
+            taskregister__task__name=task_name,
+            taskregister__status__message="processed",
+        )
+        .exclude(pk=transient.pk)
+        .order_by("-pk")
+        .first()
+    )
+
+
+def cutout_filters(transient):
+    """Names of the filters a transient has cutout images in."""
+    return set(
+        Cutout.objects.filter(transient=transient)
+        .filter(~Q(fits=""))
+        .values_list("filter__name", flat=True)
+    )
+
+
+def adjusted_global_aperture_data(aperture, cutout, transient):
+    """
+    Data of the global aperture on a cutout that corresponds to a global
+    aperture on another cutout, with the axes adjusted for the seeing of the
+    image.
+    """
+    fwhm_offset = (
+        cutout.filter.image_fwhm_arcsec - aperture.cutout.filter.image_fwhm_arcsec
+    )
+    return {
+        "name": f"{cutout.name}_global",
+        "cutout": cutout,
+        "orientation_deg": aperture.orientation_deg,
+        "ra_deg": aperture.ra_deg,
+        "dec_deg": aperture.dec_deg,
+        "semi_major_axis_arcsec": aperture.semi_major_axis_arcsec + fwhm_offset,
+        "semi_minor_axis_arcsec": aperture.semi_minor_axis_arcsec + fwhm_offset,
+        "transient": transient,
+        "type": "global",
+    }
+
+
+def global_apertures(transient):
+    """Global apertures of a transient by the filter of their cutout."""
+    return {
+        aperture.cutout.filter.name: aperture
+        for aperture in Aperture.objects.filter(
+            transient=transient, type="global", cutout__isnull=False
+        ).select_related("cutout__filter")
+    }
+
+
+def same_aperture(aperture, other):
+    """Whether two apertures have the same position, shape and orientation."""
+    return all(
+        math.isclose(getattr(aperture, field), getattr(other, field), abs_tol=1e-9)
+        for field in [
+            "ra_deg",
+            "dec_deg",
+            "orientation_deg",
+            "semi_major_axis_arcsec",
+            "semi_minor_axis_arcsec",
+        ]
+    )
+
+
+def same_global_apertures(transient, donor):
+    """
+    Whether every global aperture of a transient has the same geometry as the
+    donor's global aperture in the same filter.
+    """
+    donor_apertures = global_apertures(donor)
+    apertures = global_apertures(transient)
+    return bool(apertures) and all(
+        filter_name in donor_apertures
+        and same_aperture(aperture, donor_apertures[filter_name])
+        for filter_name, aperture in apertures.items()
+    )
+
+
+def global_photometry(transient):
+    """Global photometry of a transient by filter name."""
+    return {
+        photometry.filter.name: (
+            photometry.flux,
+            photometry.flux_error,
+            photometry.magnitude,
+            photometry.magnitude_error,
+            photometry.is_validated,
+        )
+        for photometry in AperturePhotometry.objects.filter(
+            transient=transient, aperture__type="global"
+        ).select_related("filter")
+    }
+
+
+def same_sed_inputs(transient, donor):
+    """
+    Whether the global SED fit of a transient would be fit to the same data
+    as the donor's: the same redshift and global photometry. Both share the
+    host and so its dust reddening.
+    """
+    return transient.best_redshift == donor.best_redshift and global_photometry(
+        transient
+    ) == global_photometry(donor)
+
+
+def copy_result_file(path, donor, transient):
+    """
+    Copies a result file the donor's stage wrote under its own name, e.g.
+    ``{root}/{donor}/{donor}_global.h5``, to the same place under the name of
+    a transient.
+    Returns
+    -------
+    :path : str
+        Path of the copy.
+    """
+    root = os.path.dirname(os.path.dirname(path))
+    filename = os.path.basename(path)
+    if filename.startswith(donor.name):
+        filename = transient.name + filename[len(donor.name) :]
+    new_path = os.path.join(root, transient.name, filename)
+    storage = get_storage()
+    with storage.open(path) as f:
+        storage.save(new_path, f.read())
+    return new_path
@@ -1,49 +1,56 @@
-from datetime import datetime, timezone, timedelta
+import hashlib
 import math
+import os
+import threading
 import time
 import warnings
 from collections import namedtuple
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+from io import BytesIO
 from xml.parsers.expat import ExpatError
 
 import astropy.units as u
+import healpy as hp
 import numpy as np
 import yaml
 from astropy.coordinates import SkyCoord
-from astropy.cosmology import FlatLambdaCDM
-from astropy.io import fits
+from astropy.stats import SigmaClip
 from astropy.wcs import WCS
+from astropy.wcs.utils import proj_plane_pixel_scales
 from astroquery.ipac.ned import Ned
 from astroquery.sdss import SDSS
-
-cosmo = FlatLambdaCDM(H0=70, Om0=0.315)
-
+from billiard.pool import Pool
 from django.conf import settings
+from django.db import connections
 from django.db.models import Q
-from dustmaps.sfd import SFDQuery
-
-# Use correct dustmap data directory
-from dustmaps.config import config
-
-config.reset()
-config["data_dir"] = settings.DUSTMAPS_DATA_ROOT
 from photutils.aperture import aperture_photometry
 from photutils.aperture import EllipticalAperture
 from photutils.background import Background2D
+from photutils.background import LocalBackground
+from photutils.background import MeanBackground
+from photutils.background import SExtractorBackground
 from photutils.segmentation import detect_sources
 from photutils.segmentation import SourceCatalog
 from photutils.utils import calc_total_error
-from photutils.background import LocalBackground
-from photutils.background import MeanBackground, SExtractorBackground
-from astropy.stats import SigmaClip
 
+from .cosmology import flat_lcdm
+from .dust import dust_map
+from .filter_registry import filter_registry
+from .fits_access import open_cutout
+from .fits_access import open_fits
+from .models import Aperture
+from .models import Cutout
+from .models import ExternalRequest
+from .models import RedshiftQueryCache
 from .photometric_calibration import flux_to_mag
 from .photometric_calibration import flux_to_mJy_flux
 from .photometric_calibration import fluxerr_to_magerr
 from .photometric_calibration import fluxerr_to_mJy_fluxerr
-
-from .models import Cutout
-from .models import Aperture
-from .models import ExternalRequest
+from .storage import get_storage
 
 
 def survey_list(survey_metadata_path):
@@ -85,7 +92,7 @@ def build_source_catalog(image, background, threshhold_sigma=3.0, npixels=10):
     ----------
     :image :  :class:`~astropy.io.fits.HDUList`
         Fits image to construct source catalog from.
-    :background : :class:`~photutils.background.Background2D`
+    :background : :class:`BackgroundModel`
         Estimate of the background in the image.
     :threshold_sigma : float default=2.0
         Threshold sigma above the baseline that a source has to be to be
@@ -98,21 +105,96 @@ def build_source_catalog(image, background, threshhold_sigma=3.0, npixels=10):
     :source_catalog : :class:`photutils.segmentation.SourceCatalog`
         Catalog of sources constructed from the image.
     """
+    return SegmentationCache(image, background).catalog(
+        threshhold_sigma=threshhold_sigma, npixels=npixels
+    )
 
-    image_data = image[0].data
-    background_subtracted_data = image_data - background.background
-    threshold = threshhold_sigma * background.background_rms
 
-    segmentation = detect_sources(
-        background_subtracted_data, threshold, npixels=npixels
+class SegmentationCache:
+    """
+    Source detection on one image at several thresholds. The background
+    subtracted data and rms are computed once and shared by every
+    threshold, and the segmentation and source catalog at each threshold
+    are memoized for when a threshold is asked for again. Detection still
+    runs once per distinct threshold.
+
+    Detections at a threshold are a subset of the detections at any lower
+    threshold, so once a threshold finds no sources the higher thresholds
+    are known to find none without running detection.
+    Parameters
+    ----------
+    :image :  :class:`~astropy.io.fits.HDUList`
+        Fits image to detect sources in.
+    :background : :class:`BackgroundModel`
+        Estimate of the background in the image.
+    :region : tuple of slice or None
+        Part of the image to detect sources in, the whole image if None.
+    :binning : int default=1
+        Detect sources on the image binned by this factor in each axis. The
+        background rms is scaled down to that of the mean of the binned
+        pixels, and image rows and columns that do not fill a bin are
+        dropped.
+    """
+
+    def __init__(self, image, background, region=None, binning=1):
+        if region is None:
+            region = (slice(None), slice(None))
+        data = image[0].data[region] - background.background[region]
+        background_rms = background.background_rms[region]
+        if binning > 1:
+            data = _bin_array(data, binning)
+            background_rms = _bin_array(background_rms, binning) / binning
+        self.background_subtracted_data = data
+        self.background_rms = background_rms
+        self.segmentations = {}
+        self.catalogs = {}
+
+    def segmentation(self, threshhold_sigma=3.0, npixels=10):
+        """Segmentation image at a threshold, None if nothing is detected"""
+        key = (threshhold_sigma, npixels)
+        if key not in self.segmentations:
+            if self._none_detected_below(threshhold_sigma, npixels):
+                self.segmentations[key] = None
+            else:
+                threshold = threshhold_sigma * self.background_rms
+                self.segmentations[key] = detect_sources(
+                    self.background_subtracted_data, threshold, npixels=npixels
+                )
+        return self.segmentations[key]
+
+    def catalog(self, threshhold_sigma=3.0, npixels=10):
+        """Source catalog at a threshold, None if nothing is detected"""
+        key = (threshhold_sigma, npixels)
+        if key not in self.catalogs:
+            segmentation = self.segmentation(threshhold_sigma, npixels)
+            if segmentation is None:
+                self.catalogs[key] = None
+            else:
+                # deblended_segmentation = deblend_sources(
+                #     background_subtracted_data, segmentation, npixels=npixels
+                # )
+                print(segmentation)
+                self.catalogs[key] = SourceCatalog(
+                    self.background_subtracted_data, segmentation
+                )
+        return self.catalogs[key]
+
+    def _none_detected_below(self, threshhold_sigma, npixels):
+        return any(
+            segmentation is None
+            for (lower_sigma, lower_npixels), segmentation in self.segmentations.items()
+            if lower_sigma <= threshhold_sigma and lower_npixels <= npixels
+        )
+
+
+def _bin_array(data, binning):
+    """Mean of each binning x binning block of a 2D array"""
+    ny, nx = data.shape[0] // binning, data.shape[1] // binning
+    return (
+        data[: ny * binning, : nx * binning]
+        .reshape(ny, binning, nx, binning)
+        .mean(axis=(1, 3))
     )
-    if segmentation is None:
-        return None
-    # deblended_segmentation = deblend_sources(
-    #     background_subtracted_data, segmentation, npixels=npixels
-    # )
-    print(segmentation)
-    return SourceCatalog(background_subtracted_data, segmentation)
 
 
 def match_source(position, source_catalog, wcs):
@@ -176,6 +258,25 @@ def do_aperture_photometry(image, sky_aperture, filter):
     """
     Performs Aperture photometry
     """
+    return do_multi_aperture_photometry(image, [sky_aperture], filter)[0]
+
+
+def do_multi_aperture_photometry(image, sky_apertures, filter):
+    """
+    Performs aperture photometry of several apertures on one image. The
+    background is computed once and shared between the apertures, and only
+    the pixels around each aperture are background subtracted and measured.
+    Parameters
+    ----------
+    :image : :class:`~astropy.io.fits.HDUList`
+    :sky_apertures : list of :class:`~photutils.aperture.SkyEllipticalAperture`
+    :filter : :class:`~host.models.Filter`
+        Filter the image was taken in.
+    Returns
+    -------
+    :photometry : list of dict
+        Photometry of each aperture, in the same order as sky_apertures.
+    """
     image_data = image[0].data
     wcs = WCS(image[0].header)
 
@@ -184,45 +285,165 @@ def do_aperture_photometry(image, sky_aperture, filter):
         background = estimate_background(image, filter.name)
     except ValueError:
         # indicates poor image data
-        return {
-            "flux": None,
-            "flux_error": None,
-            "magnitude": None,
-            "magnitude_error": None,
-        }
-
-    # is the aperture inside the image?
-    bbox = sky_aperture.to_pixel(wcs).bbox
-    if (
-        bbox.ixmin < 0
-        or bbox.iymin < 0
-        or bbox.ixmax > image_data.shape[1]
-        or bbox.iymax > image_data.shape[0]
-    ):
-        return {
-            "flux": None,
-            "flux_error": None,
-            "magnitude": None,
-            "magnitude_error": None,
-        }
-
-    # if the image pixels are all zero, let's assume this is masked
-    # even GALEX FUV should have *something*
-    phot_table_maskcheck = aperture_photometry(image_data, sky_aperture, wcs=wcs)
-    if phot_table_maskcheck["aperture_sum"].value[0] == 0:
-        return {
-            "flux": None,
-            "flux_error": None,
-            "magnitude": None,
-            "magnitude_error": None,
-        }
-
-    background_subtracted_data = image_data - background.background
-
-    # I think we need a local background subtraction for WISE
-    # the others haven't given major problems
-    if "WISE" in filter.name:
-        aper_pix = sky_aperture.to_pixel(wcs)
+        return [_no_photometry() for _ in sky_apertures]
+
+    photometry = []
+    for sky_aperture in sky_apertures:
+        # is the aperture inside the image?
+        pixel_aperture = sky_aperture.to_pixel(wcs)
+        bbox = pixel_aperture.bbox
+        if (
+            bbox.ixmin < 0
+            or bbox.iymin < 0
+            or bbox.ixmax > image_data.shape[1]
+            or bbox.iymax > image_data.shape[0]
+        ):
+            photometry.append(_no_photometry())
+            continue
+
+        # I think we need a local background subtraction for WISE
+        # the others haven't given major problems
+        local_background = "WISE" in filter.name
+
+        # the local background annulus reaches out to twice the semi-major axis
+        margin = int(np.ceil(2 * pixel_aperture.a)) + 1 if local_background else 0
+        region, region_aperture = region_of_interest(
+            pixel_aperture, image_data.shape, margin=margin
+        )
+
+        # if the image pixels are all zero, let's assume this is masked
+        # even GALEX FUV should have *something*
+        phot_table_maskcheck = aperture_photometry(image_data[region], region_aperture)
+        if phot_table_maskcheck["aperture_sum"].value[0] == 0:
+            photometry.append(_no_photometry())
+            continue
+
+        background_subtracted_data, error = _photometry_arrays(
+            image,
+            background,
+            filter,
+            region,
+            local_background_aperture=region_aperture if local_background else None,
+        )
+
+        photometry.append(
+            _measure_aperture(
+                image,
+                background_subtracted_data,
+                error,
+                background,
+                sky_aperture,
+                region_aperture,
+                filter,
+            )
+        )
+
+    return photometry
+
+
+def region_of_interest(pixel_aperture, shape, margin=0):
+    """
+    The part of an image around a pixel aperture, and the aperture in the
+    pixel coordinates of that part. Photometry of the shifted aperture on
+    the part of the image is identical to photometry on the whole image.
+    Parameters
+    ----------
+    :pixel_aperture : :class:`~photutils.aperture.PixelAperture`
+    :shape : tuple
+        Shape of the image data.
+    :margin : int
+        Number of pixels to add around the bounding box of the aperture.
+    Returns
+    -------
+    :region : tuple of slice
+        Slices of the image data, clipped to the image.
+    :region_aperture : :class:`~photutils.aperture.PixelAperture`
+    """
+    bbox = pixel_aperture.bbox
+    iymin = max(bbox.iymin - margin, 0)
+    ixmin = max(bbox.ixmin - margin, 0)
+    region = (
+        slice(iymin, max(min(bbox.iymax + margin, shape[0]), iymin)),
+        slice(ixmin, max(min(bbox.ixmax + margin, shape[1]), ixmin)),
+    )
+
+    # shifting by whole pixels is exact, so the aperture masks are unchanged
+    params = {name: getattr(pixel_aperture, name) for name in pixel_aperture._params}
+    params["positions"] = pixel_aperture.positions - np.array([ixmin, iymin])
+    return region, pixel_aperture.__class__(**params)
+
+
+def measure_image_photometry(path, sky_apertures, filter):
+    """
+    Opens an image and performs aperture photometry of several apertures
+    on it, see :func:`do_multi_aperture_photometry`.
+    """
+    with open_fits(path) as image:
+        return do_multi_aperture_photometry(image, sky_apertures, filter)
+
+
+def _measure_image_photometry_job(job):
+    return measure_image_photometry(*job)
+
+
+def map_image_photometry(jobs, processes=1, measure=_measure_image_photometry_job):
+    """
+    Measures the photometry of several images, optionally spread over a
+    pool of worker processes.
+    Parameters
+    ----------
+    :jobs : list of tuple
+        (path, sky_apertures, filter) of each image.
+    :processes : int
+        Maximum number of worker processes, the images are measured
+        serially in this process if 1.
+    :measure : callable
+        Module level function measuring one job, by default
+        :func:`measure_image_photometry` of its arguments.
+    Returns
+    -------
+    :photometry : list of list of dict
+        Photometry of each job's apertures, in the same order as the jobs.
+    """
+    processes = min(processes, len(jobs))
+    if processes > 1:
+        try:
+            # forked workers must not share the parent's database connections
+            connections.close_all()
+            pool = Pool(processes)
+        except (AssertionError, OSError) as err:
+            print(f"photometry pool unavailable, measuring serially: {err}")
+        else:
+            try:
+                return pool.map(measure, jobs)
+            finally:
+                pool.close()
+                pool.join()
+
+    return [measure(job) for job in jobs]
+
+
+def _no_photometry():
+    return {
+        "flux": None,
+        "flux_error": None,
+        "magnitude": None,
+        "magnitude_error": None,
+    }
+
+
+def _photometry_arrays(
+    image, background, filter, region, local_background_aperture=None
+):
+    """
+    Background subtracted data and error arrays for aperture photometry in
+    a region of an image. If an aperture (in the pixel coordinates of the
+    region) is given a local background around it is also subtracted.
+    """
+    background_subtracted_data = image[0].data[region] - background.background[region]
+
+    if local_background_aperture is not None:
+        aper_pix = local_background_aperture
         lbg = LocalBackground(aper_pix.a, aper_pix.a * 2)
         local_background = lbg(
             background_subtracted_data, aper_pix.positions[0], aper_pix.positions[1]
@@ -232,17 +453,33 @@ def do_aperture_photometry(image, sky_aperture, filter):
     if filter.image_pixel_units == "counts/sec":
         error = calc_total_error(
             background_subtracted_data,
-            background.background_rms,
+            background.background_rms[region],
             float(image[0].header["EXPTIME"]),
         )
 
     else:
         error = calc_total_error(
-            background_subtracted_data, background.background_rms, 1.0
+            background_subtracted_data, background.background_rms[region], 1.0
         )
 
+    return background_subtracted_data, error
+
+
+def _measure_aperture(
+    image,
+    background_subtracted_data,
+    error,
+    background,
+    sky_aperture,
+    pixel_aperture,
+    filter,
+):
+    """
+    Calibrated photometry of one aperture on background subtracted data,
+    with pixel_aperture in the pixel coordinates of the data.
+    """
     phot_table = aperture_photometry(
-        background_subtracted_data, sky_aperture, wcs=wcs, error=error
+        background_subtracted_data, pixel_aperture, error=error
     )
     uncalibrated_flux = phot_table["aperture_sum"].value[0]
     if "2MASS" not in filter.name:
@@ -262,21 +499,14 @@ def do_aperture_photometry(image, sky_aperture, filter):
         )
 
     # check for correlated errors
-    aprad, err_adjust = filter.correlation_model()
+    aprad, err_adjust = filter_registry.correlation_model(filter)
     if aprad is not None:
-        image_aperture = sky_aperture.to_pixel(wcs)
-
         err_adjust_interp = np.interp(
-            (image_aperture.a + image_aperture.b) / 2.0, aprad, err_adjust
+            (pixel_aperture.a + pixel_aperture.b) / 2.0, aprad, err_adjust
         )
         uncalibrated_flux_err *= err_adjust_interp
 
-    if filter.magnitude_zero_point_keyword is not None:
-        zpt = image[0].header[filter.magnitude_zero_point_keyword]
-    elif filter.image_pixel_units == "counts/sec":
-        zpt = filter.magnitude_zero_point
-    else:
-        zpt = filter.magnitude_zero_point + 2.5 * np.log10(image[0].header["EXPTIME"])
+    zpt = get_zero_point(image[0].header, filter)
 
     flux = flux_to_mJy_flux(uncalibrated_flux, zpt)
     flux_error = fluxerr_to_mJy_fluxerr(uncalibrated_flux_err, zpt)
@@ -296,10 +526,81 @@ def do_aperture_photometry(image, sky_aperture, filter):
     }
 
 
+def get_zero_point(header, filter):
+    """
+    Magnitude zero point of an image
+    Parameters
+    ----------
+    :header : :class:`~astropy.io.fits.Header`
+        Header of the image.
+    :filter : :class:`~host.models.Filter`
+        Filter the image was taken in.
+    Returns
+    -------
+    :zero_point : float
+    """
+    if filter.magnitude_zero_point_keyword is not None:
+        return header[filter.magnitude_zero_point_keyword]
+    elif filter.image_pixel_units == "counts/sec":
+        return filter.magnitude_zero_point
+    else:
+        return filter.magnitude_zero_point + 2.5 * np.log10(header["EXPTIME"])
+
+
+def cutout_metadata(image, filter):
+    """
+    Summarises the header and WCS of a cutout image so they can be indexed
+    in the database.
+    Parameters
+    ----------
+    :image : :class:`~astropy.io.fits.HDUList`
+        Cutout image.
+    :filter : :class:`~host.models.Filter`
+        Filter the image was taken in.
+    Returns
+    -------
+    :metadata : dict
+        Values of the :class:`~host.models.Cutout` metadata fields.
+    """
+    header = image[0].header
+    image_data = image[0].data
+    wcs = WCS(header)
+
+    return {
+        "wcs_header": wcs.to_header(relax=True).tostring(),
+        "image_height": int(image_data.shape[0]),
+        "image_width": int(image_data.shape[1]),
+    }
+
+
+def index_cutout_metadata(cutout, image=None):
+    """
+    Sets the metadata fields of a cutout from its image. The cutout is not
+    saved.
+    Parameters
+    ----------
+    :cutout : :class:`~host.models.Cutout`
+    :image : :class:`~astropy.io.fits.HDUList` or None
+        Image of the cutout, opened from the cutout file if not given.
+    Returns
+    -------
+    :cutout : :class:`~host.models.Cutout`
+    """
+    if image is None:
+        with open_cutout(cutout) as image:
+            metadata = cutout_metadata(image, cutout.filter)
+    else:
+        metadata = cutout_metadata(image, cutout.filter)
+
+    for field, value in metadata.items():
+        setattr(cutout, field, value)
+    return cutout
+
+
 def get_dust_maps(position):
-    """Gets milkyway reddening value"""
+    """Gets milkyway reddening value, for one or an array of positions"""
 
-    ebv = SFDQuery()(position)
+    ebv = dust_map.ebv(position)
     # see Schlafly & Finkbeiner 2011 for the 0.86 correction term
     return 0.86 * ebv
 
@@ -307,7 +608,7 @@ def get_dust_maps(position):
 def get_local_aperture_size(redshift):
     """find the size of a 2 kpc radius in arcsec"""
 
-    dadist = cosmo.angular_diameter_distance(redshift).value
+    dadist = flat_lcdm.angular_diameter_distance(redshift)
     apr_arcsec = 2 / (
         dadist * 1000 * (np.pi / 180.0 / 3600.0)
     )  # 2 kpc aperture radius is this many arcsec
@@ -319,7 +620,7 @@ def check_local_radius(redshift, image_fwhm_arcsec):
     """Checks whether filter image FWHM is larger than
     the aperture size"""
 
-    dadist = cosmo.angular_diameter_distance(redshift).value
+    dadist = flat_lcdm.angular_diameter_distance(redshift)
     apr_arcsec = 2 / (
         dadist * 1000 * (np.pi / 180.0 / 3600.0)
     )  # 2 kpc aperture radius is this many arcsec
@@ -327,44 +628,167 @@ def check_local_radius(redshift, image_fwhm_arcsec):
     return "true" if apr_arcsec > image_fwhm_arcsec else "false"
 
 
-def check_global_contamination(global_aperture_phot, aperture_primary):
-    """Checks whether aperture is contaminated by multiple objects"""
+# detection settings of the segmentation used to look for contaminants
+CONTAMINATION_THRESHOLD_SIGMA = 5
+CONTAMINATION_NPIXELS = 15
+
+ContaminationSegmentation = namedtuple(
+    "ContaminationSegmentation",
+    ["segment_data", "labels", "xcentroid", "ycentroid", "wcs"],
+)
+
+
+def segmentation_path(fits_path):
+    """Storage path of the persisted segmentation of a cutout image"""
+    return f"{os.path.splitext(fits_path)[0]}_segmentation.npz"
+
+
+def build_contamination_segmentation(image, background=None):
+    """
+    Segments an image to look for contaminating sources
+    Parameters
+    ----------
+    :image : :class:`~astropy.io.fits.HDUList`
+    :background : :class:`BackgroundModel` or None
+        Estimate of the background in the image, estimated if None.
+    Returns
+    -------
+    :segmentation : :class:`ContaminationSegmentation`
+        Segment labels of the image with the labels, centroids and world
+        coordinate system needed to match them, None if no sources are
+        detected.
+    """
+    if background is None:
+        background = estimate_background(image)
+    catalog = SegmentationCache(image, background).catalog(
+        threshhold_sigma=CONTAMINATION_THRESHOLD_SIGMA,
+        npixels=CONTAMINATION_NPIXELS,
+    )
+    if catalog is None:
+        return None
+    return ContaminationSegmentation(
+        catalog._segment_img.data.astype(np.int32),
+        np.asarray(catalog.label),
+        np.asarray(catalog.xcentroid),
+        np.asarray(catalog.ycentroid),
+        WCS(image[0].header),
+    )
+
+
+def contamination_segmentation(cutout):
+    """
+    The segmentation of a cutout used to look for contaminants. It is built
+    once, persisted next to the cutout and loaded from there afterwards.
+    Parameters
+    ----------
+    :cutout : :class:`~host.models.Cutout`
+    Returns
+    -------
+    :segmentation : :class:`ContaminationSegmentation`
+        None if no sources are detected in the cutout.
+    """
+    storage = get_storage()
+    path = segmentation_path(cutout.fits.name)
+    if storage.exists(path):
+        with np.load(storage.local_path(path)) as data:
+            if not data["detected"]:
+                return None
+            return ContaminationSegmentation(
+                data["segment_data"],
+                data["labels"],
+                data["xcentroid"],
+                data["ycentroid"],
+                WCS(str(data["wcs_header"])),
+            )
+
+    with open_cutout(cutout) as image:
+        segmentation = build_contamination_segmentation(image)
+
+    buffer = BytesIO()
+    if segmentation is None:
+        np.savez_compressed(buffer, detected=False)
+    else:
+        np.savez_compressed(
+            buffer,
+            detected=True,
+            segment_data=segmentation.segment_data,
+            labels=segmentation.labels,
+            xcentroid=segmentation.xcentroid,
+            ycentroid=segmentation.ycentroid,
+            wcs_header=segmentation.wcs.to_header_string(relax=True),
+        )
+    storage.save(path, buffer.getvalue())
+    return segmentation
+
+
+def check_global_contamination(
+    global_aperture_phot, aperture_primary, segmentations=None
+):
+    """
+    Checks whether aperture is contaminated by multiple objects
+    Parameters
+    ----------
+    :global_aperture_phot : :class:`~host.models.AperturePhotometry`
+    :aperture_primary : :class:`~host.models.Aperture`
+        The global aperture constructed for the transient.
+    :segmentations : dict or None
+        Segmentations already loaded, keyed by cutout primary key, which is
+        updated with the ones this loads.
+    Returns
+    -------
+    :is_contam : bool
+    """
     warnings.simplefilter("ignore")
+    if segmentations is None:
+        segmentations = {}
     is_contam = False
     aperture = global_aperture_phot.aperture
     # check both the image used to generate aperture
     # and the image used to measure photometry
-    for cutout_name in [
-        global_aperture_phot.aperture.cutout.fits.name,
-        aperture_primary.cutout.fits.name,
+    for cutout in [
+        global_aperture_phot.aperture.cutout,
+        aperture_primary.cutout,
     ]:
+        cutout_name = cutout.fits.name
         # UV photons are too sparse, segmentation map
         # builder cannot easily handle these
         if "/GALEX/" in cutout_name:
             continue
 
-        # copy the steps to build segmentation map
-        image = fits.open(cutout_name)
-        wcs = WCS(image[0].header)
-        background = estimate_background(image)
-        catalog = build_source_catalog(
-            image, background, threshhold_sigma=5, npixels=15
-        )
-
-        # catalog is None is no sources are detected in the image
-        # so we don't have to worry about contamination in that case
-        if catalog is None:
+        # no need to open the image if the aperture misses it entirely
+        if cutout.has_metadata and not aperture_overlaps_image(
+            aperture.sky_aperture, cutout.wcs, cutout.shape
+        ):
             continue
 
-        source_data = match_source(aperture.sky_coord, catalog, wcs)
+        if cutout.pk not in segmentations:
+            segmentations[cutout.pk] = contamination_segmentation(cutout)
+        segmentation = segmentations[cutout.pk]
 
-        mask_image = (
-            aperture.sky_aperture.to_pixel(wcs)
-            .to_mask()
-            .to_image(np.shape(image[0].data))
-        )
-        obj_ids = catalog._segment_img.data[np.where(mask_image == True)]  # noqa: E712
-        source_obj = source_data._labels
+        # segmentation is None is no sources are detected in the image
+        # so we don't have to worry about contamination in that case
+        if segmentation is None:
+            continue
+        wcs = segmentation.wcs
+
+        # the source closest to the aperture centre is the host
+        host_x_pixel, host_y_pixel = wcs.world_to_pixel(aperture.sky_coord)
+        source_obj = segmentation.labels[
+            np.argmin(
+                np.hypot(
+                    host_x_pixel - segmentation.xcentroid,
+                    host_y_pixel - segmentation.ycentroid,
+                )
+            )
+        ]
+
+        # only the segmentation under the aperture's bounding box is needed,
+        # pixels off the image are filled with the background label
+        aperture_mask = aperture.sky_aperture.to_pixel(wcs).to_mask()
+        segment_data = aperture_mask.cutout(segmentation.segment_data, fill_value=0)
+        if segment_data is None:
+            continue
+        obj_ids = segment_data[aperture_mask.data == 1]
 
         # let's look for contaminants
         unq_obj_ids = np.unique(obj_ids)
@@ -374,22 +798,48 @@ def check_global_contamination(global_aperture_phot, aperture_primary):
     return is_contam
 
 
+def aperture_overlaps_image(sky_aperture, wcs, shape):
+    """
+    Checks whether any part of a sky aperture falls on an image
+    Parameters
+    ----------
+    :sky_aperture : :class:`~photutils.aperture.SkyEllipticalAperture`
+    :wcs : :class:`~astropy.wcs.WCS`
+        World coordinate system of the image.
+    :shape : tuple
+        Shape of the image data.
+    Returns
+    -------
+    :overlaps : bool
+    """
+    bbox = sky_aperture.to_pixel(wcs).bbox
+    return (
+        bbox.ixmax > 0
+        and bbox.iymax > 0
+        and bbox.ixmin < shape[1]
+        and bbox.iymin < shape[0]
+    )
+
+
+APERTURE_FILTER_PREFERENCE = [
+    "PanSTARRS_g",
+    "PanSTARRS_r",
+    "PanSTARRS_i",
+    "SDSS_r",
+    "SDSS_i",
+    "SDSS_g",
+    "DES_r",
+    "DES_i",
+    "DES_g",
+    "2MASS_H",
+]
+
+
 def select_cutout_aperture(cutouts, choice=0):
     """
     Select cutout for aperture
     """
-    filter_names = [
-        "PanSTARRS_g",
-        "PanSTARRS_r",
-        "PanSTARRS_i",
-        "SDSS_r",
-        "SDSS_i",
-        "SDSS_g",
-        "DES_r",
-        "DES_i",
-        "DES_g",
-        "2MASS_H",
-    ]
+    filter_names = APERTURE_FILTER_PREFERENCE
 
     # choice = 0
     # edited to allow initial offset
@@ -402,6 +852,88 @@ def select_cutout_aperture(cutouts, choice=0):
     return cutouts.filter(filter__name=filter_choice)
 
 
+def aperture_cutout_candidates(cutouts, max_choice=8):
+    """
+    The cutouts select_cutout_aperture picks for choices 0 to max_choice,
+    in order of preference and without repeats
+    Parameters
+    ----------
+    :cutouts : :class:`~django.db.models.QuerySet`
+        Cutouts of a transient.
+    :max_choice : int
+        Last choice to pick a cutout for.
+    Returns
+    -------
+    :candidates : list of :class:`~host.models.Cutout`
+    """
+    available = {}
+    for cutout in cutouts.filter(~Q(fits="")).select_related("filter"):
+        available.setdefault(cutout.filter.name, cutout)
+
+    candidates = []
+    for choice in range(max_choice + 1):
+        # a missing choice falls through to the next available filter
+        for filter_name in APERTURE_FILTER_PREFERENCE[choice:]:
+            if filter_name in available:
+                if available[filter_name] not in candidates:
+                    candidates.append(available[filter_name])
+                break
+    return candidates
+
+
+def construct_preferred_aperture(candidates, position, max_workers=1):
+    """
+    Constructs the host aperture on the first candidate cutout, in order of
+    preference, that it can be constructed on.
+
+    With more than one worker the candidates are tried speculatively in a
+    thread pool. The results are still taken in order of preference, so the
+    aperture is the same as trying them one at a time, and once one is
+    found the candidates that have not started are cancelled.
+    Parameters
+    ----------
+    :candidates : list of :class:`~host.models.Cutout`
+        Cutouts in order of preference.
+    :position : :class:`~astropy.coordinates.SkyCoord`
+        On Sky position of the host.
+    :max_workers : int
+        Number of candidates tried at the same time.
+    Returns
+    -------
+    :cutout : :class:`~host.models.Cutout`
+        The cutout the aperture was constructed on, None if there is none.
+    :sky_aperture : :class:`~photutils.aperture.SkyEllipticalAperture`
+        The aperture, None if there is none.
+    """
+    done = threading.Event()
+
+    def construct(cutout):
+        if done.is_set():
+            return None
+        with open_cutout(cutout) as image:
+            return construct_aperture(image, position)
+
+    if max_workers <= 1 or len(candidates) <= 1:
+        for cutout in candidates:
+            aperture = construct(cutout)
+            if aperture is not None:
+                return cutout, aperture
+        return None, None
+
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(candidates)))
+    try:
+        futures = [executor.submit(construct, cutout) for cutout in candidates]
+        for cutout, future in zip(candidates, futures):
+            aperture = future.result()
+            if aperture is not None:
+                return cutout, aperture
+        return None, None
+    finally:
+        # running constructions cannot be interrupted, they finish unheeded
+        done.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
 def select_aperture(transient):
     cutouts = Cutout.objects.filter(transient=transient).filter(~Q(fits=""))
     if len(cutouts):
@@ -455,53 +987,230 @@ def select_aperture(transient):
 #    return host_position
 
 
-def estimate_background(image, filter_name=None):
+BackgroundModel = namedtuple(
+    "BackgroundModel",
+    ["background", "background_rms", "background_median", "background_rms_median"],
+)
+
+
+class BackgroundCache:
+    """
+    Memo of background models keyed by a digest of the image data and the
+    background estimator, so the background of a cutout is computed once
+    however many steps need it. If cache_dir is given models are also
+    persisted there and shared between tasks.
+    Parameters
+    ----------
+    :max_entries : int
+        Number of models kept in memory.
+    :cache_dir : str or None
+        Directory to persist models to.
+    """
+
+    def __init__(self, max_entries=32, cache_dir=None):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.models = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def key(self, image_data, estimator):
+        image_data = np.ascontiguousarray(image_data)
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(str((image_data.shape, image_data.dtype.str)).encode())
+        digest.update(image_data.data)
+        return f"{estimator}_{digest.hexdigest()}"
+
+    def get(self, image_data, estimator, compute):
+        """
+        Background model of the image data, calling compute() to estimate
+        it if it is not cached.
+        """
+        key = self.key(image_data, estimator)
+        with self._lock:
+            model = self.models.get(key)
+            if model is not None:
+                self.hits += 1
+                self.models.move_to_end(key)
+                return model
+            self.misses += 1
+
+        model = self._load(key)
+        if model is None:
+            model = compute()
+            self._save(key, model)
+
+        for array in (model.background, model.background_rms):
+            array.flags.writeable = False
+        with self._lock:
+            self.models[key] = model
+            if len(self.models) > self.max_entries:
+                self.models.popitem(last=False)
+        return model
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def _load(self, key):
+        if not self.cache_dir or not os.path.exists(self._path(key)):
+            return None
+        with np.load(self._path(key)) as data:
+            return BackgroundModel(
+                data["background"],
+                data["background_rms"],
+                float(data["background_median"]),
+                float(data["background_rms_median"]),
+            )
+
+    def _save(self, key, model):
+        if not self.cache_dir:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{self._path(key)}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, **model._asdict())
+        os.replace(tmp_path, self._path(key))
+
+    def clear(self):
+        with self._lock:
+            self.models.clear()
+
+
+background_cache = BackgroundCache(cache_dir=settings.BACKGROUND_CACHE_ROOT or None)
+
+
+def estimate_background(image, filter_name=None, cache=background_cache):
     """
     Estimates the background of an image
     Parameters
     ----------
     :image : :class:`~astropy.io.fits.HDUList`
         Image to have the background estimated of.
+    :filter_name : str or None
+        Name of the filter of the image, which sets the background estimator.
+    :cache : :class:`BackgroundCache` or None
+        Cache of background models, no caching if None.
     Returns
     -------
-    :background : :class:`~photutils.background.Background2D`
+    :background : :class:`BackgroundModel`
         Background estimate of the image
     """
     image_data = image[0].data
-    box_size = int(0.1 * np.sqrt(image_data.size))
 
     # GALEX needs mean, not median - median just always comes up with zero
     if filter_name is not None and "GALEX" in filter_name:
+        estimator = "mean"
+    else:
+        estimator = "sextractor"
+
+    def compute():
+        return _background_model(image_data, estimator)
+
+    if cache is None:
+        return compute()
+    return cache.get(image_data, estimator, compute)
+
+
+def _background_model(image_data, estimator):
+    """Estimates the background of image data with Background2D"""
+    box_size = int(0.1 * np.sqrt(image_data.size))
+
+    if estimator == "mean":
         bkg = MeanBackground(SigmaClip(sigma=3.0))
     else:
         bkg = SExtractorBackground(sigma_clip=None)
 
     try:
-        return Background2D(image_data, box_size=box_size, bkg_estimator=bkg)
+        background = Background2D(image_data, box_size=box_size, bkg_estimator=bkg)
     except ValueError:
-        return Background2D(
+        background = Background2D(
             image_data, box_size=box_size, exclude_percentile=50, bkg_estimator=bkg
         )
+    return BackgroundModel(
+        background.background,
+        background.background_rms,
+        float(background.background_median),
+        float(background.background_rms_median),
+    )
 
 
-def construct_aperture(image, position):
+def construct_aperture(image, position, binning=None):
     """
     Construct an elliptical aperture at the position in the image
+
+    If binning is more than one the host is first found on the image binned
+    by that factor, and the aperture is then constructed at full resolution
+    in a window around it. The aperture is only accepted if the host and
+    the pixels its Kron aperture is measured from are inside the window,
+    so it matches the one constructed on the whole image, and otherwise
+    the whole image is used.
     Parameters
     ----------
     :image : :class:`~astropy.io.fits.HDUList`
+    :position : :class:`~astropy.coordinates.SkyCoord`
+        On Sky position of the host.
+    :binning : int or None
+        Binning factor of the first detection pass, the
+        APERTURE_DETECTION_BINNING setting if None.
     Returns
     -------
+    :sky_aperture : :class:`~photutils.aperture.SkyEllipticalAperture`
+        Aperture of the host, None if it was not found.
     """
+    if binning is None:
+        binning = settings.APERTURE_DETECTION_BINNING
     wcs = WCS(image[0].header)
     background = estimate_background(image)
+    image_shape = np.shape(image[0].data)
+
+    if binning > 1:
+        region = binned_host_region(image, background, position, wcs, binning)
+        if region is not None:
+            region_wcs = wcs.slice(region)
+            source_data = match_host_source(
+                SegmentationCache(image, background, region=region),
+                position,
+                region_wcs,
+            )
+            if source_data is not None and _source_inside_region(
+                source_data, region, image_shape
+            ):
+                return elliptical_sky_aperture(source_data, region_wcs)
+
+    source_data = match_host_source(SegmentationCache(image, background), position, wcs)
+    if source_data is None:
+        return None
+    return elliptical_sky_aperture(source_data, wcs)
+
+
+def match_host_source(segmentation_cache, position, wcs, npixels=10):
+    """
+    Finds the host in a segmented image, trying increasing detection
+    thresholds and then a sub-threshold one until a source is found within
+    5 arcsec of the host position.
+    Parameters
+    ----------
+    :segmentation_cache : :class:`SegmentationCache`
+    :position : :class:`~astropy.coordinates.SkyCoord`
+        On Sky position of the host.
+    :wcs : :class:`~astropy.wcs.WCS`
+        World coordinate system of the segmented data.
+    :npixels : int default=10
+        Minimum number of connected pixels of a source.
+    Returns
+    -------
+    :source : :class:`~photutils.segmentation.SourceCatalog`
+        Catalog containing the host, None if it was not found.
+    """
 
     # found an edge case where deblending isn't working how I'd like it to
     # so if it's not finding the host, play with the default threshold
     def get_source_data(threshhold_sigma):
-        catalog = build_source_catalog(
-            image, background, threshhold_sigma=threshhold_sigma
+        catalog = segmentation_cache.catalog(
+            threshhold_sigma=threshhold_sigma, npixels=npixels
         )
+        if catalog is None:
+            return None, 100
         source_data = match_source(position, catalog, wcs)
 
         source_ra, source_dec = wcs.wcs_pix2world(
@@ -524,12 +1233,178 @@ def construct_aperture(image, position):
     # make sure we know this failed
     if source_separation_arcsec > 5:
         return None
+    return source_data
 
-    return elliptical_sky_aperture(source_data, wcs)
+
+def binned_host_region(image, background, position, wcs, binning):
+    """
+    Finds the host on the binned image and returns a window of the full
+    resolution image around it
+    Parameters
+    ----------
+    :image : :class:`~astropy.io.fits.HDUList`
+    :background : :class:`BackgroundModel`
+        Estimate of the background in the image.
+    :position : :class:`~astropy.coordinates.SkyCoord`
+        On Sky position of the host.
+    :wcs : :class:`~astropy.wcs.WCS`
+        World coordinate system of the image.
+    :binning : int
+        Binning factor in each axis.
+    Returns
+    -------
+    :region : tuple of slice
+        Slices of the image containing the host with a margin as wide as
+        the host and covering everything within 5 arcsec of the position,
+        None if the host was not found on the binned image.
+    """
+    image_shape = np.shape(image[0].data)
+    if min(image_shape) < 4 * binning:
+        return None
+
+    # the binned pixel (i, j) covers full resolution pixels
+    # binning * i - 0.5 to binning * (i + 1) - 0.5
+    binned_wcs = wcs.deepcopy()
+    binned_wcs.wcs.crpix = (wcs.wcs.crpix - 0.5) / binning + 0.5
+    if binned_wcs.wcs.has_cd():
+        binned_wcs.wcs.cd = wcs.wcs.cd * binning
+    else:
+        binned_wcs.wcs.cdelt = wcs.wcs.cdelt * binning
+
+    source_data = match_host_source(
+        SegmentationCache(image, background, binning=binning),
+        position,
+        binned_wcs,
+        npixels=max(10 // binning**2, 1),
+    )
+    if source_data is None:
+        return None
+
+    bbox = source_data.bbox
+    host_x, host_y = wcs.world_to_pixel(position)
+    search_radius = 5 / (3600 * np.mean(proj_plane_pixel_scales(wcs)))
+    margin = binning * max(bbox.ixmax - bbox.ixmin, bbox.iymax - bbox.iymin)
+    xmin = min(bbox.ixmin * binning, host_x - search_radius) - margin
+    xmax = max(bbox.ixmax * binning, host_x + search_radius) + margin
+    ymin = min(bbox.iymin * binning, host_y - search_radius) - margin
+    ymax = max(bbox.iymax * binning, host_y + search_radius) + margin
+    return (
+        slice(max(int(np.floor(ymin)), 0), min(int(np.ceil(ymax)), image_shape[0])),
+        slice(max(int(np.floor(xmin)), 0), min(int(np.ceil(xmax)), image_shape[1])),
+    )
+
+
+def _source_inside_region(source_data, region, shape):
+    """
+    Checks that the segment of a source detected in a region of an image,
+    and the ellipses its Kron aperture is measured in, do not reach an edge
+    of the region that is not also an edge of the image
+    """
+    kron_aperture = source_data.kron_aperture
+    if kron_aperture is None:
+        return False
+    sigma_ellipse = EllipticalAperture(
+        (source_data.xcentroid, source_data.ycentroid),
+        6 * source_data.semimajor_sigma.value,
+        6 * source_data.semiminor_sigma.value,
+        theta=source_data.orientation.to(u.rad).value,
+    )
+
+    height = region[0].stop - region[0].start
+    width = region[1].stop - region[1].start
+    for bbox in [source_data.bbox, kron_aperture.bbox, sigma_ellipse.bbox]:
+        if (
+            (bbox.ixmin <= 0 and region[1].start > 0)
+            or (bbox.iymin <= 0 and region[0].start > 0)
+            or (bbox.ixmax >= width and region[1].stop < shape[1])
+            or (bbox.iymax >= height and region[0].stop < shape[0])
+        ):
+            return False
+    return True
+
+
+# resolution of the redshift query cache, cells are about 0.2 arcsec across
+REDSHIFT_CACHE_NSIDE = 2**20
+
+# match radius of the NED and SDSS redshift queries
+REDSHIFT_QUERY_RADIUS = 1.0 * u.arcsec
+
+
+def cached_redshift_query(service, query, position, radius=REDSHIFT_QUERY_RADIUS):
+    """
+    Runs a redshift query through the persistent cache. Results are keyed by
+    service, HEALPix cell of the position and radius, and are reused until
+    they are older than the cache TTL; queries that found no redshift are
+    cached with a shorter TTL. Cache hits never reach the external service or
+    its rate limiter, failed queries are not cached.
+    Parameters
+    ----------
+    :service : str
+        Name of the external service, e.g. "NED".
+    :query : callable
+        Live query, called with position and radius, returning a dict with a
+        "redshift" key.
+    :position : :class:`~astropy.coordinates.SkyCoord`
+        Position to find the redshift at.
+    :radius : :class:`~astropy.units.Quantity`
+        Match radius of the query.
+    Returns
+    -------
+    :galaxy_data : dict
+        The "redshift" found, None if there is none.
+    """
+    icrs = position.icrs
+    cell = int(
+        hp.ang2pix(
+            REDSHIFT_CACHE_NSIDE,
+            icrs.ra.degree,
+            icrs.dec.degree,
+            nest=True,
+            lonlat=True,
+        )
+    )
+    radius_arcsec = float(radius.to(u.arcsec).value)
+    now = datetime.now(timezone.utc)
+
+    entry = RedshiftQueryCache.objects.filter(
+        service=service, cell=cell, radius_arcsec=radius_arcsec
+    ).first()
+    if entry is not None:
+        if entry.redshift is None:
+            ttl = timedelta(days=settings.REDSHIFT_CACHE_NEGATIVE_TTL_DAYS)
+        else:
+            ttl = timedelta(days=settings.REDSHIFT_CACHE_TTL_DAYS)
+        if now - entry.queried_at < ttl:
+            return {"redshift": entry.redshift}
+
+    galaxy_data = query(position, radius=radius)
+    redshift = galaxy_data["redshift"]
+    if redshift is not None and math.isnan(redshift):
+        redshift = None
+    RedshiftQueryCache.objects.update_or_create(
+        service=service,
+        cell=cell,
+        radius_arcsec=radius_arcsec,
+        defaults={
+            "redshift": None if redshift is None else float(redshift),
+            "queried_at": now,
+        },
+    )
+    return galaxy_data
 
 
 def query_ned(position):
     """Get a Galaxy's redshift from NED if it is available."""
+    return cached_redshift_query("NED", _query_ned, position)
+
+
+def query_sdss(position):
+    """Get a Galaxy's redshift from SDSS if it is available"""
+    return cached_redshift_query("SDSS", _query_sdss, position)
+
+
+def _query_ned(position, radius=REDSHIFT_QUERY_RADIUS):
+    """Queries NED for a Galaxy's redshift, sharing its rate limit."""
 
     qs = ExternalRequest.objects.filter(name="NED")
     if not len(qs):
@@ -537,7 +1412,7 @@ def query_ned(position):
             name="NED", last_query=datetime.now(timezone.utc)
         )
         try:
-            result_table = Ned.query_region(position, radius=1.0 * u.arcsec)
+            result_table = Ned.query_region(position, radius=radius)
         except ExpatError:
             raise RuntimeError("too many requests to NED")
     else:
@@ -549,13 +1424,15 @@ def query_ned(position):
             current_time - last_query < timedelta(seconds=NED_TIME_SLEEP)
             and count < NED_TIME_SLEEP * 100
         ):
-            print(f"NED rate limit avoidance ({last_query}: sleeping iteration #{count})")
+            print(
+                f"NED rate limit avoidance ({last_query}: sleeping iteration #{count})"
+            )
             time.sleep(NED_TIME_SLEEP)
             current_time = datetime.now(timezone.utc)
             count += 1
         else:
             try:
-                result_table = Ned.query_region(position, radius=1.0 * u.arcsec)
+                result_table = Ned.query_region(position, radius=radius)
             except ExpatError:
                 raise RuntimeError("too many requests to NED")
             er = ExternalRequest.objects.get(name="NED")
@@ -578,9 +1455,9 @@ def query_ned(position):
     return galaxy_data
 
 
-def query_sdss(position):
-    """Get a Galaxy's redshift from SDSS if it is available"""
-    result_table = SDSS.query_region(position, spectro=True, radius=1.0 * u.arcsec)
+def _query_sdss(position, radius=REDSHIFT_QUERY_RADIUS):
+    """Queries SDSS for a Galaxy's spectroscopic redshift."""
+    result_table = SDSS.query_region(position, spectro=True, radius=radius)
 
     if result_table is not None and "z" in result_table.keys():
         redshift = result_table["z"].value
@@ -0,0 +1,127 @@
+"""
+Storage lifecycle for transient products.
+
+Once a transient has finished processing its full-resolution cutouts, SED
+chains and GHOST output are almost never read again. After a grace period
+they are demoted to the compressed cold storage tier, keeping on hot storage
+only the files the results page reads: the cutout it displays, the SED
+posterior and the best-fit model. Demoted files are rehydrated on demand by
+:mod:`host.storage` when they are read.
+"""
+import datetime
+import os
+
+from django.conf import settings
+from django.db.models import F
+from django.db.models import Max
+from django.db.models import Q
+from django.utils import timezone
+
+from .host_utils import segmentation_path
+from .host_utils import select_cutout_aperture
+from .models import Cutout
+from .models import SEDFittingResult
+from .models import Transient
+from .storage import COMPRESSED_SUFFIX
+from .storage import get_storage
+
+FINISHED_PROCESSING_STATUSES = ["completed", "blocked"]
+
+
+def transients_to_demote(demote_after_days=settings.STORAGE_DEMOTE_AFTER_DAYS):
+    """
+    Transients that finished processing at least demote_after_days ago and
+    have not been demoted since.
+    """
+    cutoff = timezone.now() - datetime.timedelta(days=demote_after_days)
+    return (
+        Transient.objects.filter(processing_status__in=FINISHED_PROCESSING_STATUSES)
+        .annotate(last_processed=Max("taskregister__last_modified"))
+        .filter(last_processed__lt=cutoff)
+        .filter(
+            Q(artifacts_demoted_at__isnull=True)
+            | Q(artifacts_demoted_at__lt=F("last_processed"))
+        )
+    )
+
+
+def transient_hot_files(transient):
+    """Files the results page of a transient reads, which stay on hot storage."""
+    hot_files = set()
+
+    cutouts = Cutout.objects.filter(transient=transient).filter(~Q(fits=""))
+    try:
+        displayed_cutout = select_cutout_aperture(cutouts, choice=0)
+        if len(displayed_cutout):
+            hot_files.add(displayed_cutout[0].fits.name)
+    except IndexError:
+        pass
+
+    for sed_result in SEDFittingResult.objects.filter(transient=transient):
+        if sed_result.posterior.name:
+            hot_files.add(sed_result.posterior.name)
+            hot_files.add(sed_result.posterior.name.replace(".h5", "_modeldata.npz"))
+        if sed_result.model_file.name:
+            hot_files.add(sed_result.model_file.name)
+
+    return hot_files
+
+
+def transient_cold_files(transient):
+    """Files of a transient that can be demoted to cold storage."""
+    files = []
+    for cutout in Cutout.objects.filter(transient=transient).filter(~Q(fits="")):
+        files += [cutout.fits.name, segmentation_path(cutout.fits.name)]
+    for sed_result in SEDFittingResult.objects.filter(transient=transient):
+        files += [
+            sed_result.chains_file.name,
+            sed_result.percentiles_file.name,
+        ]
+
+    hot_files = transient_hot_files(transient)
+    return [file for file in files if file and file not in hot_files]
+
+
+def demote_transient_artifacts(transient):
+    """
+    Demotes the cold files of a transient and records when it was done.
+    Returns
+    -------
+    :bytes_demoted : int
+        Size of the files moved off hot storage.
+    """
+    storage = get_storage()
+    bytes_demoted = 0
+    for file in transient_cold_files(transient):
+        try:
+            bytes_demoted += storage.demote(file)
+        except OSError as err:
+            print(f"could not demote {file}: {err}")
+
+    transient.artifacts_demoted_at = timezone.now()
+    transient.save(update_fields=["artifacts_demoted_at"])
+    return bytes_demoted
+
+
+def demote_ghost_output(
+    output_dir=settings.GHOST_OUTPUT_ROOT,
+    demote_after_days=settings.STORAGE_DEMOTE_AFTER_DAYS,
+):
+    """
+    Demotes GHOST output files that have not been modified for
+    demote_after_days. GHOST output is never read back by blast.
+    """
+    storage = get_storage()
+    cutoff = (timezone.now() - datetime.timedelta(days=demote_after_days)).timestamp()
+    bytes_demoted = 0
+    for dir_path, _, file_names in os.walk(output_dir):
+        for file_name in file_names:
+            path = os.path.join(dir_path, file_name)
+            if path.endswith(COMPRESSED_SUFFIX) or os.path.getmtime(path) >= cutoff:
+                continue
+            file_bytes_demoted = storage.demote(path)
+            # the S3 backend leaves the worker's own copy behind
+            if file_bytes_demoted and os.path.exists(path):
+                os.remove(path)
+            bytes_demoted += file_bytes_demoted
+    return bytes_demoted
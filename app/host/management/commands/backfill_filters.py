@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from host.backfill import backfill_filters
+
+
+class Command(BaseCommand):
+    help = (
+        "Download and measure only the missing (transient, filter) pairs for "
+        "newly added filters, invalidating the dependent SED fits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("filters", nargs="+", help="names of the new filters")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=50,
+            help="number of transients downloaded together",
+        )
+        parser.add_argument(
+            "--max-transients",
+            type=int,
+            default=None,
+            help="maximum number of transients to backfill in this run",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0,
+            help="seconds to pause between batches",
+        )
+        parser.add_argument(
+            "--requeue-sed",
+            action="store_true",
+            help="send the invalidated SED fits to celery",
+        )
+
+    def handle(self, *args, **options):
+        summary = backfill_filters(
+            options["filters"],
+            batch_size=options["batch_size"],
+            max_transients=options["max_transients"],
+            sleep_seconds=options["sleep"],
+            requeue_sed=options["requeue_sed"],
+        )
+        self.stdout.write(
+            f"Backfilled {summary['transients']} transients, "
+            f"invalidated {summary['invalidated_sed_fits']} SED fits"
+        )
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from host.host_utils import index_cutout_metadata
+from host.models import Cutout
+from host.storage import get_storage
+
+
+class Command(BaseCommand):
+    help = (
+        "Index the header and WCS of cutouts downloaded "
+        "before metadata was recorded at download time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reindex",
+            action="store_true",
+            help="recompute the metadata of cutouts that already have it",
+        )
+
+    def handle(self, *args, **options):
+        cutouts = Cutout.objects.filter(~Q(fits="")).filter(fits__isnull=False)
+        if not options["reindex"]:
+            cutouts = cutouts.filter(wcs_header__isnull=True)
+
+        storage = get_storage()
+        indexed, failed = 0, 0
+        for cutout in cutouts.select_related("filter").iterator():
+            if not storage.exists(cutout.fits.name):
+                failed += 1
+                continue
+            try:
+                index_cutout_metadata(cutout)
+            except Exception as e:
+                self.stderr.write(f"could not index {cutout.name}: {e}")
+                failed += 1
+                continue
+            cutout.save()
+            indexed += 1
+
+        self.stdout.write(f"Indexed {indexed} cutouts, {failed} failed")
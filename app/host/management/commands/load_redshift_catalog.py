@@ -0,0 +1,62 @@
+from astropy.table import Table
+from django.core.management.base import BaseCommand
+from host.redshift_catalog import load_redshift_catalog
+
+
+class Command(BaseCommand):
+    help = (
+        "Load a bulk redshift catalog extract (any table format astropy reads) "
+        "into the local redshift index used to find host redshifts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="catalog extract to load")
+        parser.add_argument(
+            "--catalog",
+            required=True,
+            help="name to store the rows under, e.g. SDSS",
+        )
+        parser.add_argument(
+            "--format",
+            default=None,
+            help="astropy table format of the file, guessed if not given",
+        )
+        parser.add_argument("--ra-column", default="ra")
+        parser.add_argument("--dec-column", default="dec")
+        parser.add_argument("--redshift-column", default="z")
+        parser.add_argument("--redshift-err-column", default=None)
+        parser.add_argument(
+            "--photometric",
+            action="store_true",
+            help="the redshifts are photometric rather than spectroscopic",
+        )
+        parser.add_argument(
+            "--replace",
+            action="store_true",
+            help="delete the rows already loaded for this catalog first",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="rows inserted and committed at a time",
+        )
+
+    def handle(self, *args, **options):
+        table = Table.read(options["path"], format=options["format"])
+        loaded = load_redshift_catalog(
+            table,
+            options["catalog"],
+            ra_column=options["ra_column"],
+            dec_column=options["dec_column"],
+            redshift_column=options["redshift_column"],
+            redshift_err_column=options["redshift_err_column"],
+            photometric=options["photometric"],
+            replace=options["replace"],
+            batch_size=options["batch_size"],
+            progress=lambda loaded: self.stdout.write(f"{loaded} rows loaded"),
+        )
+        self.stdout.write(
+            f"Loaded {loaded} of {len(table)} rows into the {options['catalog']} "
+            "redshift catalog"
+        )
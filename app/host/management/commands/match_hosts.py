@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from host.backfill import match_hosts
+
+
+class Command(BaseCommand):
+    help = (
+        "Match the hosts of the transients waiting for a host match in "
+        "batches, with one GHOST association per batch."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "transients",
+            nargs="*",
+            help="names of the transients to match, all waiting ones if not given",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=50,
+            help="number of transients associated together",
+        )
+        parser.add_argument(
+            "--max-transients",
+            type=int,
+            default=None,
+            help="maximum number of transients to match in this run",
+        )
+
+    def handle(self, *args, **options):
+        summary = match_hosts(
+            batch_size=options["batch_size"],
+            max_transients=options["max_transients"],
+            transient_names=options["transients"] or None,
+        )
+        self.stdout.write(
+            f"Matched {summary['transients']} transients, "
+            f"{summary['hosts']} with a host"
+        )
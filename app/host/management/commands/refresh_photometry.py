@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from host.backfill import refresh_photometry
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-measure the aperture photometry of the whole catalog from the "
+        "existing cutouts and apertures, without going through celery."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "transients",
+            nargs="*",
+            help="names of the transients to refresh, all of them if not given",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=50,
+            help="number of transients measured together",
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=settings.PHOTOMETRY_PROCESSES,
+            help="worker processes to measure the images with",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            default=None,
+            help="file to record progress in and resume from",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="ignore an existing checkpoint and start from the beginning",
+        )
+        parser.add_argument(
+            "--max-transients",
+            type=int,
+            default=None,
+            help="maximum number of transients to refresh in this run",
+        )
+        parser.add_argument(
+            "--invalidate-sed",
+            action="store_true",
+            help="set the SED fits of refreshed transients back to not processed",
+        )
+
+    def handle(self, *args, **options):
+        summary = refresh_photometry(
+            chunk_size=options["chunk_size"],
+            processes=options["processes"],
+            checkpoint_path=options["checkpoint"],
+            restart=options["restart"],
+            max_transients=options["max_transients"],
+            transient_names=options["transients"] or None,
+            invalidate_sed=options["invalidate_sed"],
+        )
+        self.stdout.write(
+            f"Refreshed {summary['transients']} transients, "
+            f"measured {summary['images']} images, "
+            f"skipped {summary['failed_images']} failed images, "
+            f"invalidated {summary['invalidated_sed_fits']} SED fits"
+        )
@@ -0,0 +1,56 @@
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("host", "0023_alter_transient_name"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cutout",
+            name="wcs_header",
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="cutout",
+            name="image_width",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="cutout",
+            name="image_height",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="cutout",
+            name="pixel_scale_arcsec",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="cutout",
+            name="exposure_time",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="cutout",
+            name="zero_point",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="cutout",
+            name="nan_fraction",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="cutout",
+            name="background_median",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="cutout",
+            name="background_rms",
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
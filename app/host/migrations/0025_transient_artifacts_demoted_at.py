@@ -0,0 +1,16 @@
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("host", "0024_cutout_metadata"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="transient",
+            name="artifacts_demoted_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
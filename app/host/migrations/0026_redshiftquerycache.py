@@ -0,0 +1,38 @@
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("host", "0025_transient_artifacts_demoted_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RedshiftQueryCache",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("service", models.CharField(max_length=20)),
+                ("cell", models.BigIntegerField()),
+                ("radius_arcsec", models.FloatField()),
+                ("redshift", models.FloatField(blank=True, null=True)),
+                ("queried_at", models.DateTimeField()),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("service", "cell", "radius_arcsec"),
+                        name="unique_redshift_query",
+                    )
+                ],
+            },
+        ),
+    ]
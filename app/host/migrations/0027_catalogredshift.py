@@ -0,0 +1,32 @@
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("host", "0026_redshiftquerycache"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CatalogRedshift",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("catalog", models.CharField(max_length=20)),
+                ("ra_deg", models.FloatField()),
+                ("dec_deg", models.FloatField()),
+                ("cell", models.BigIntegerField(db_index=True)),
+                ("redshift", models.FloatField()),
+                ("redshift_err", models.FloatField(blank=True, null=True)),
+                ("photometric", models.BooleanField(default=False)),
+            ],
+        ),
+    ]
@@ -0,0 +1,26 @@
+import django.db.models.deletion
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("host", "0027_catalogredshift"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="transient",
+            name="host",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                to="host.host",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="host",
+            index=models.Index(fields=["dec_deg"], name="host_dec_deg_idx"),
+        ),
+    ]
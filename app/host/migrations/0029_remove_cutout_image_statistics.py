@@ -0,0 +1,34 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("host", "0028_transient_host_set_null"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="cutout",
+            name="pixel_scale_arcsec",
+        ),
+        migrations.RemoveField(
+            model_name="cutout",
+            name="exposure_time",
+        ),
+        migrations.RemoveField(
+            model_name="cutout",
+            name="zero_point",
+        ),
+        migrations.RemoveField(
+            model_name="cutout",
+            name="nan_fraction",
+        ),
+        migrations.RemoveField(
+            model_name="cutout",
+            name="background_median",
+        ),
+        migrations.RemoveField(
+            model_name="cutout",
+            name="background_rms",
+        ),
+    ]
@@ -7,6 +7,8 @@ import os
 import pandas as pd
 from astropy import units as u
 from astropy.coordinates import SkyCoord
+from astropy.io.fits import Header
+from astropy.wcs import WCS
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.db import models
@@ -86,6 +88,9 @@ class Host(SkyObject):
     milkyway_dust_reddening = models.FloatField(null=True, blank=True)
     objects = HostManager()
 
+    class Meta:
+        indexes = [models.Index(fields=["dec_deg"], name="host_dec_deg_idx")]
+
 
 class Transient(SkyObject):
     """
@@ -106,13 +111,15 @@ class Transient(SkyObject):
         public_timestamp (django.db.model.DateTimeField): Transient name server
             public timestamp for the transient. Field can be null or blank. On
             Delete is set to cascade.
+        artifacts_demoted_at (django.db.model.DateTimeField): When the
+            transient's rarely read files were last moved to cold storage.
     """
 
     name = models.CharField(max_length=20, unique=True)
     tns_id = models.IntegerField()
     tns_prefix = models.CharField(max_length=20)
     public_timestamp = models.DateTimeField(null=True, blank=True)
-    host = models.ForeignKey(Host, on_delete=models.CASCADE, null=True, blank=True)
+    host = models.ForeignKey(Host, on_delete=models.SET_NULL, null=True, blank=True)
     objects = TransientManager()
     tasks_initialized = models.CharField(max_length=20, default="False")
     redshift = models.FloatField(null=True, blank=True)
@@ -122,6 +129,7 @@ class Transient(SkyObject):
     processing_status = models.CharField(max_length=20, default="processing")
     added_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.CASCADE)
     progress = models.IntegerField(default=0)
+    artifacts_demoted_at = models.DateTimeField(null=True, blank=True)
 
     @property
     def best_redshift(self):
@@ -173,6 +181,43 @@ class ExternalRequest(models.Model):
     objects = ExternalRequestManager()
 
 
+class CatalogRedshift(models.Model):
+    """
+    Galaxy redshift from a bulk catalog extract loaded into the local
+    database, indexed by the HEALPix cell of its position
+    """
+
+    catalog = models.CharField(max_length=20)
+    ra_deg = models.FloatField()
+    dec_deg = models.FloatField()
+    cell = models.BigIntegerField(db_index=True)
+    redshift = models.FloatField()
+    redshift_err = models.FloatField(null=True, blank=True)
+    photometric = models.BooleanField(default=False)
+
+
+class RedshiftQueryCache(models.Model):
+    """
+    Result of a redshift query to an external service, keyed by the HEALPix
+    cell of the queried position and the match radius. A null redshift
+    records that the service found none.
+    """
+
+    service = models.CharField(max_length=20)
+    cell = models.BigIntegerField()
+    radius_arcsec = models.FloatField()
+    redshift = models.FloatField(null=True, blank=True)
+    queried_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["service", "cell", "radius_arcsec"],
+                name="unique_redshift_query",
+            )
+        ]
+
+
 class Status(models.Model):
     """
     Status of a given processing task
@@ -403,10 +448,47 @@ class Cutout(models.Model):
     fits = models.FileField(upload_to=fits_file_path, null=True, blank=True)
     message = models.CharField(max_length=50, null=True, blank=True)
 
+    # metadata indexed at download time so that the image
+    # does not have to be opened just to read its header
+    wcs_header = models.TextField(null=True, blank=True)
+    image_width = models.IntegerField(null=True, blank=True)
+    image_height = models.IntegerField(null=True, blank=True)
+
     # used if some downloads fail
     # warning = models.BooleanField(default=False)
     objects = CutoutManager()
 
+    @property
+    def has_metadata(self):
+        """True if the image metadata has been indexed."""
+        return self.wcs_header is not None and self.image_width is not None
+
+    @property
+    def shape(self):
+        """Shape of the image data, (rows, columns)."""
+        return (self.image_height, self.image_width)
+
+    @property
+    def wcs(self):
+        """World coordinate system of the image from the indexed header."""
+        return WCS(Header.fromstring(self.wcs_header))
+
+    def contains_aperture(self, sky_aperture):
+        """
+        Checks whether a sky aperture lies fully inside the image, using the
+        indexed metadata. If there is no metadata the image is assumed to
+        contain the aperture.
+        """
+        if not self.has_metadata:
+            return True
+        bbox = sky_aperture.to_pixel(self.wcs).bbox
+        return not (
+            bbox.ixmin < 0
+            or bbox.iymin < 0
+            or bbox.ixmax > self.image_width
+            or bbox.iymax > self.image_height
+        )
+
 
 class Aperture(SkyObject):
     """
@@ -0,0 +1,162 @@
+"""
+Photometric redshifts of Pan-STARRS galaxies from the GHOST photo-z network.
+
+``calc_photoz`` builds the network and loads its weights on every call. Here
+the network is loaded once per process, the first time it is needed, and
+batches of galaxies are evaluated in a single prediction, with the point
+estimates and uncertainties computed from the posteriors as array operations.
+The model can be used on any table of Pan-STARRS forced mean photometry, not
+only on GHOST matches. It is built from helpers of the pinned astro_ghost,
+whose signatures are checked before first use, so a different astro_ghost
+fails loudly instead of silently leaving hosts without photo-z.
+"""
+import inspect
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+from astro_ghost import photoz_helper
+from django.conf import settings
+
+# helpers of astro_ghost the persistent model is built from, with the
+# keyword arguments they are called with
+PHOTOZ_HELPERS = {
+    "load_lupton_model": ["model_path", "dust_path"],
+    "preprocess": ["PATH"],
+    "get_common_constraints_columns": [],
+    "serial_objID_search": ["columns"],
+}
+
+
+class PhotozHelperMismatch(RuntimeError):
+    """The installed astro_ghost does not have the photo-z helpers used here."""
+
+
+def check_photoz_helpers():
+    """
+    Checks that the installed astro_ghost has the photo-z helpers, taking
+    the keyword arguments they are called with.
+    Raises
+    ------
+    :PhotozHelperMismatch:
+        If a helper is missing or has a different signature.
+    """
+    for name, keywords in PHOTOZ_HELPERS.items():
+        helper = getattr(photoz_helper, name, None)
+        if helper is None:
+            raise PhotozHelperMismatch(f"astro_ghost has no photoz_helper.{name}")
+        parameters = inspect.signature(helper).parameters
+        missing = [keyword for keyword in keywords if keyword not in parameters]
+        if missing:
+            raise PhotozHelperMismatch(
+                f"photoz_helper.{name} of astro_ghost does not take {missing}"
+            )
+
+
+def posterior_moments(posteriors, range_z):
+    """
+    Means and standard deviations of redshift posteriors.
+    Parameters
+    ----------
+    :posteriors : :class:`~numpy.ndarray`
+        Posterior of each galaxy on the redshift grid, shape (n, len(range_z)).
+    :range_z : :class:`~numpy.ndarray`
+        Redshift grid.
+    Returns
+    -------
+    :posteriors : :class:`~numpy.ndarray`
+        Normalised posteriors.
+    :point_estimates : :class:`~numpy.ndarray`
+    :errors : :class:`~numpy.ndarray`
+    """
+    posteriors = posteriors / np.sum(posteriors, axis=1, keepdims=True)
+    point_estimates = posteriors @ range_z
+    variance = posteriors @ range_z**2 - point_estimates**2
+    return posteriors, point_estimates, np.sqrt(np.clip(variance, 0, None))
+
+
+class PhotozModel:
+    """
+    The GHOST photo-z network, loaded the first time it is used.
+    Parameters
+    ----------
+    :model_path : str
+        File of the network weights.
+    :dust_path : str
+        Directory of the SFD dust maps the inputs are corrected with.
+    """
+
+    def __init__(
+        self, model_path=settings.GHOST_PHOTOZ_PATH, dust_path=settings.GHOST_DUST_PATH
+    ):
+        self.model_path = model_path
+        self.dust_path = dust_path
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._model is None:
+                check_photoz_helpers()
+                self._model = photoz_helper.load_lupton_model(
+                    model_path=self.model_path, dust_path=self.dust_path
+                )
+        return self._model
+
+    def predict(self, photometry):
+        """
+        Photometric redshifts of a batch of galaxies.
+        Parameters
+        ----------
+        :photometry : :class:`~pandas.DataFrame`
+            Pan-STARRS forced mean photometry with raMean and decMean, one
+            row per galaxy.
+        Returns
+        -------
+        :posteriors : :class:`~numpy.ndarray`
+            Posterior of each galaxy on a redshift grid from 0 to 1.
+        :point_estimates : :class:`~numpy.ndarray`
+        :errors : :class:`~numpy.ndarray`
+        """
+        network, range_z = self._model or self._load()
+        X = photoz_helper.preprocess(
+            photometry, PATH=os.path.join(self.dust_path, "sfddata-master")
+        )
+        posteriors = network.predict(X, verbose=0)
+        return posterior_moments(posteriors, range_z)
+
+    def photoz(self, hosts):
+        """
+        Adds photo_z and photo_z_err to GHOST hosts, as calc_photoz does.
+        Parameters
+        ----------
+        :hosts : :class:`~pandas.DataFrame`
+            Hosts with Pan-STARRS objID, north of dec -30.
+        Returns
+        -------
+        :hosts : :class:`~pandas.DataFrame`
+        Raises
+        ------
+        :PhotozHelperMismatch:
+            If the installed astro_ghost does not have the helpers used here.
+        """
+        check_photoz_helpers()
+        constraints, columns = photoz_helper.get_common_constraints_columns()
+        photometry = pd.concat(
+            photoz_helper.serial_objID_search(
+                hosts["objID"].values.tolist(), columns=columns, **constraints
+            )
+        )
+        if len(photometry) == 0:
+            return hosts
+
+        _, point_estimates, errors = self.predict(photometry)
+        object_ids = photometry["objID"].values.astype(np.int64)
+        host_ids = hosts["objID"].astype(np.int64)
+        hosts["photo_z"] = host_ids.map(dict(zip(object_ids, point_estimates)))
+        hosts["photo_z_err"] = host_ids.map(dict(zip(object_ids, errors)))
+        return hosts
+
+
+photoz_model = PhotozModel()
@@ -1,13 +1,10 @@
 import math
-import os
 from math import pi
 
 import numpy as np
 import pandas as pd
 import prospect.io.read_results as reader
 from astropy.coordinates import SkyCoord
-from astropy.cosmology import WMAP9 as cosmo
-from astropy.io import fits
 from astropy.visualization import AsinhStretch
 from astropy.visualization import PercentileInterval
 from astropy.wcs import WCS
@@ -21,9 +18,12 @@ from bokeh.palettes import Category20
 from bokeh.plotting import ColumnDataSource
 from bokeh.plotting import figure
 from bokeh.transform import cumsum
-from host.models import Filter
+from host.cosmology import wmap9
+from host.filter_registry import filter_registry
+from host.fits_access import open_cutout
 from host.photometric_calibration import maggies_to_mJy
 from host.prospector import build_obs
+from host.storage import get_storage
 
 # import extinction
 # from bokeh.models import Circle
@@ -134,8 +134,8 @@ def plot_cutout_image(
     title = cutout.filter if cutout is not None else "No cutout selected"
 
     if cutout is not None:
-        with fits.open(cutout.fits.name) as fits_file:
-            image_data = fits_file[0].data
+        with open_cutout(cutout) as fits_file:
+            image_data = np.array(fits_file[0].data)
             wcs = WCS(fits_file[0].header)
 
         fig = figure(
@@ -303,20 +303,23 @@ def plot_sed(transient=None, sed_results_file=None, type=""):
 
     # second check on SED file
     # long-term shouldn't be necessary, just a result of debugging
-    if sed_results_file is not None and os.path.exists(
+    storage = get_storage()
+    if sed_results_file is not None and storage.exists(
         sed_results_file.replace(".h5", "_modeldata.npz")
     ):
-        result, obs, _ = reader.results_from(sed_results_file, dangerous=False)
+        result, obs, _ = reader.results_from(
+            storage.local_path(sed_results_file), dangerous=False
+        )
         model_data = np.load(
-            sed_results_file.replace(".h5", "_modeldata.npz"), allow_pickle=True
+            storage.local_path(sed_results_file.replace(".h5", "_modeldata.npz")),
+            allow_pickle=True,
         )
 
         # best = result["bestfit"]
         if transient.best_redshift < 0.015:
             a = result["obs"]["redshift"] - 0.015 + 1
-            mag_off = (
-                cosmo.distmod(result["obs"]["redshift"]).value
-                - cosmo.distmod(result["obs"]["redshift"] - 0.015).value
+            mag_off = wmap9.distmod(result["obs"]["redshift"]) - wmap9.distmod(
+                result["obs"]["redshift"] - 0.015
             )
             print(f"mag off: {mag_off}")
             fig.line(
@@ -358,11 +361,8 @@ def plot_sed(transient=None, sed_results_file=None, type=""):
         #  pre-SBI++ version: fig.line(a * best["restframe_wavelengths"], maggies_to_mJy(best["spectrum"]))
         if obs["filters"] is not None:
             try:
-                pwave = [
-                    Filter.objects.get(name=f).transmission_curve().wave_effective
-                    for f in obs["filters"]
-                ]
-            except:
+                pwave = [filter_registry.wave_effective(f.name) for f in obs["filters"]]
+            except Exception:
                 pwave = [f.wave_effective for f in obs["filters"]]
 
             if transient.best_redshift < 0.015:
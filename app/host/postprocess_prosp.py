@@ -17,10 +17,10 @@ import sys
 
 import numpy as np
 import prospect.io.read_results as reader
-from astropy.cosmology import WMAP9 as cosmo
 from astropy.io import fits
 from astropy.table import Table
 from dynesty.utils import resample_equal
+from host.cosmology import wmap9
 from prospect.models.transforms import logsfr_ratios_to_masses
 from prospect.plotting.corner import quantile
 
@@ -69,7 +69,7 @@ def getPercentiles(
 
 def z_to_agebins(zred=None, agebins=None, nbins_sfh=7, amin=7.1295, **extras):
     """new agebins defined in Wang+2023:uncover_sps_catalog"""
-    tuniv = cosmo.age(zred).value * 1e9
+    tuniv = wmap9.age(zred) * 1e9
     tbinmax = tuniv * 0.9
     if zred <= 3.0:
         agelims = (
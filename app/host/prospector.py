@@ -8,10 +8,8 @@ import extinction
 import h5py
 import numpy as np
 import prospect.io.read_results as reader
-from astropy.cosmology import WMAP9 as cosmo
 from django.conf import settings
 from django.db.models import Q
-from django.db.utils import ProgrammingError
 from host import postprocess_prosp as pp
 from prospect.fitting import fit_model as fit_model_prospect
 from prospect.fitting import lnprobfn
@@ -30,17 +28,13 @@ from prospect.utils.obsutils import fix_obs
 from scipy.special import gamma
 from scipy.special import gammainc
 
+from .cosmology import wmap9
+from .filter_registry import filter_registry
 from .host_utils import get_dust_maps
 from .models import AperturePhotometry
-from .models import Filter
 from .models import hdf5_file_path
 from .photometric_calibration import mJy_to_maggies  ##jansky_to_maggies
-
-try:
-    all_filters = [filt for filt in Filter.objects.all().select_related()]
-    trans_curves = [f.transmission_curve() for f in all_filters]
-except ProgrammingError:
-    pass
+from .storage import get_storage
 
 
 # add redshift scaling to agebins, such that
@@ -48,7 +42,7 @@ except ProgrammingError:
 def zred_to_agebins(zred=None, **extras):
     amin = 7.1295
     nbins_sfh = 7
-    tuniv = cosmo.age(zred)[0].value * 1e9
+    tuniv = wmap9.age(zred)[0] * 1e9
     tbinmax = tuniv * 0.9
     if zred <= 3.0:
         agelims = (
@@ -101,11 +95,17 @@ def build_obs(transient, aperture_type, use_mag_offset=True):
             transient=transient, aperture__type__exact=aperture_type
         )
         .filter(Q(is_validated="true") | Q(is_validated="contamination warning"))
-        .prefetch_related()
+        .select_related("filter")
     )
-    filter_names = photometry.values_list("filter__name", flat=True)
+    photometry_by_filter = {}
+    for datapoint in photometry:
+        if datapoint.filter.name in photometry_by_filter:
+            raise AperturePhotometry.MultipleObjectsReturned(
+                f"More than one {aperture_type} photometry in {datapoint.filter.name}"
+            )
+        photometry_by_filter[datapoint.filter.name] = datapoint
 
-    if not photometry.exists():
+    if not photometry_by_filter:
         raise ValueError(f"No host photometry of type {aperture_type}")
 
     if transient.host is None:
@@ -113,21 +113,18 @@ def build_obs(transient, aperture_type, use_mag_offset=True):
 
     z = transient.best_redshift
     if z is not None and z < 0.015 and use_mag_offset:
-        mag_offset = cosmo.distmod(z + 0.015).value - cosmo.distmod(z).value
+        mag_offset = wmap9.distmod(z + 0.015) - wmap9.distmod(z)
         z += 0.015
     else:
         mag_offset = 0
 
     filters, flux_maggies, flux_maggies_error = [], [], []
 
-    for filter, trans_curve in zip(all_filters, trans_curves):
-        try:
-            if filter.name in filter_names:
-                datapoint = photometry.get(filter=filter)
-            else:
-                continue
-        except AperturePhotometry.MultipleObjectsReturned:
-            raise
+    for filter in filter_registry.filters():
+        datapoint = photometry_by_filter.get(filter.name)
+        if datapoint is None:
+            continue
+        trans_curve = filter_registry.transmission_curve(filter)
 
         if datapoint.flux is None:
             continue
@@ -263,7 +260,7 @@ def build_model_nonparam(obs=None, **extras):
     def zred_to_agebins(zred=None, **extras):
         amin = 7.1295
         nbins_sfh = 7
-        tuniv = cosmo.age(zred)[0].value * 1e9
+        tuniv = wmap9.age(zred)[0] * 1e9
         tbinmax = tuniv * 0.9
         if zred <= 3.0:
             agelims = (
@@ -530,7 +527,7 @@ def build_model_nonparam_bkp(obs=None, **extras):
     def zred_to_agebins(zred=None, **extras):
         amin = 7.1295
         nbins_sfh = 7
-        tuniv = cosmo.age(zred)[0].value * 1e9
+        tuniv = wmap9.age(zred)[0] * 1e9
         tbinmax = tuniv * 0.9
         if zred <= 3.0:
             agelims = (
@@ -944,4 +941,15 @@ def prospector_result_to_blast(
         phot_84=phot_84,
     )
 
+    # store the products so the web server and other workers can read them
+    storage = get_storage()
+    for file_name in [
+        prosp_results["posterior"],
+        prosp_results["chains_file"],
+        prosp_results["percentiles_file"],
+        prosp_results["model_file"],
+    ]:
+        if os.path.exists(file_name):
+            storage.upload(file_name)
+
     return prosp_results
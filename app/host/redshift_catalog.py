@@ -0,0 +1,174 @@
+"""
+Local index of galaxy redshifts loaded from bulk catalog extracts.
+
+Rows are stored in the CatalogRedshift table with the HEALPix cell (nested
+ordering) of their position, so a cone search only reads the rows of the few
+cells the cone overlaps and then matches them exactly. This answers host
+redshift lookups without calling NED or SDSS.
+"""
+import itertools
+
+import astropy.units as u
+import healpy as hp
+import numpy as np
+from astropy.coordinates import SkyCoord
+from django.db import transaction
+
+from .models import CatalogRedshift
+
+# resolution of the index, cells are about 13 arcsec across
+REDSHIFT_CATALOG_NSIDE = 2**14
+
+
+def catalog_cells(ra_deg, dec_deg):
+    """HEALPix cells of the index at positions in degrees."""
+    return hp.ang2pix(REDSHIFT_CATALOG_NSIDE, ra_deg, dec_deg, nest=True, lonlat=True)
+
+
+def load_redshift_catalog(
+    table,
+    catalog,
+    ra_column="ra",
+    dec_column="dec",
+    redshift_column="z",
+    redshift_err_column=None,
+    photometric=False,
+    replace=False,
+    batch_size=5000,
+    progress=None,
+):
+    """
+    Loads a catalog extract into the local index. Rows are inserted and
+    committed in batches, so a large extract is not held in memory or in one
+    transaction. If loading stops part way, the rows of the batches already
+    committed stay, and the load can be repeated with replace.
+    Parameters
+    ----------
+    :table : :class:`~astropy.table.Table`
+        The extract, with positions in degrees.
+    :catalog : str
+        Name the rows are stored under, e.g. "SDSS".
+    :ra_column, dec_column, redshift_column : str
+        Columns of the position and redshift.
+    :redshift_err_column : str or None
+        Column of the redshift uncertainty, if there is one.
+    :photometric : bool
+        Whether the redshifts are photometric.
+    :replace : bool
+        Delete the rows already stored under catalog first.
+    :batch_size : int
+        Rows inserted and committed per batch.
+    :progress : callable or None
+        Called with the number of rows loaded so far after each batch.
+    Returns
+    -------
+    :loaded : int
+        Number of rows loaded. Rows without a finite position and redshift
+        are skipped.
+    """
+    ra = np.asarray(table[ra_column], dtype=float)
+    dec = np.asarray(table[dec_column], dtype=float)
+    redshift = np.ma.filled(np.ma.asarray(table[redshift_column], dtype=float), np.nan)
+    if redshift_err_column is not None:
+        redshift_err = np.ma.filled(
+            np.ma.asarray(table[redshift_err_column], dtype=float), np.nan
+        )
+    else:
+        redshift_err = np.full(len(ra), np.nan)
+
+    good = np.isfinite(ra) & np.isfinite(dec) & np.isfinite(redshift)
+    good &= np.abs(dec) <= 90
+    ra, dec, redshift, redshift_err = (
+        ra[good],
+        dec[good],
+        redshift[good],
+        redshift_err[good],
+    )
+    cells = catalog_cells(ra, dec)
+
+    if replace:
+        CatalogRedshift.objects.filter(catalog=catalog).delete()
+
+    rows = (
+        CatalogRedshift(
+            catalog=catalog,
+            ra_deg=float(ra[i]),
+            dec_deg=float(dec[i]),
+            cell=int(cells[i]),
+            redshift=float(redshift[i]),
+            redshift_err=(
+                float(redshift_err[i]) if np.isfinite(redshift_err[i]) else None
+            ),
+            photometric=photometric,
+        )
+        for i in range(len(ra))
+    )
+    loaded = 0
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            break
+        with transaction.atomic():
+            CatalogRedshift.objects.bulk_create(batch)
+        loaded += len(batch)
+        if progress is not None:
+            progress(loaded)
+    return loaded
+
+
+def cone_search(position, radius=1.0 * u.arcsec, photometric=None):
+    """
+    Catalog redshifts within radius of a position, nearest first.
+    Parameters
+    ----------
+    :position : :class:`~astropy.coordinates.SkyCoord`
+    :radius : :class:`~astropy.units.Quantity`
+    :photometric : bool or None
+        Only photometric (True) or spectroscopic (False) redshifts, both if
+        None.
+    Returns
+    -------
+    :matches : list[tuple[float, CatalogRedshift]]
+        Separation in arcsec and row of each match.
+    """
+    icrs = position.icrs
+    vector = hp.ang2vec(icrs.ra.degree, icrs.dec.degree, lonlat=True)
+    cells = hp.query_disc(
+        REDSHIFT_CATALOG_NSIDE,
+        vector,
+        radius.to(u.rad).value,
+        inclusive=True,
+        nest=True,
+    )
+    rows = CatalogRedshift.objects.filter(cell__in=[int(cell) for cell in cells])
+    if photometric is not None:
+        rows = rows.filter(photometric=photometric)
+    rows = list(rows)
+    if not rows:
+        return []
+
+    separation = icrs.separation(
+        SkyCoord(
+            [row.ra_deg for row in rows], [row.dec_deg for row in rows], unit="deg"
+        )
+    ).arcsec
+    order = np.argsort(separation, kind="stable")
+    limit = radius.to(u.arcsec).value
+    return [(separation[i], rows[i]) for i in order if separation[i] <= limit]
+
+
+def local_redshifts(position, radius=1.0 * u.arcsec):
+    """
+    Redshifts of the nearest catalog galaxy within radius of a position.
+    Returns
+    -------
+    :galaxy_data : dict
+        The spectroscopic "redshift" and the "photometric_redshift", None
+        where the index has none.
+    """
+    galaxy_data = {"redshift": None, "photometric_redshift": None}
+    for _, row in cone_search(position, radius=radius):
+        key = "photometric_redshift" if row.photometric else "redshift"
+        if galaxy_data[key] is None:
+            galaxy_data[key] = row.redshift
+    return galaxy_data
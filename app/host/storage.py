@@ -0,0 +1,373 @@
+"""
+Storage backends for the files blast produces: cutouts, SED fitting products
+and GHOST output.
+
+Files are always addressed by the path they would have on a shared
+filesystem (e.g. ``{CUTOUT_ROOT}/2010H/WISE/WISE_W1.fits``), which is also
+the name stored in the database. The local backend reads and writes these
+paths directly. The S3 backend stores them as object keys in a bucket and
+keeps a worker-local read-through cache, so libraries that need a filename
+(astropy, h5py, numpy) can still be given one. Each cached file records the
+version (ETag) of the object it was read from and is only reused while the
+object still has that version, so a file another worker has overwritten is
+read again. Every worker prunes its own cache of files it has not used for
+STORAGE_CACHE_MAX_AGE_DAYS, at most once every CACHE_PRUNE_INTERVAL_SECONDS.
+
+Files that are rarely read can be demoted to a compressed cold tier, stored
+next to the original as ``{path}.gz``. Reading a demoted file decompresses
+it into the worker-local cache and leaves the stored copy cold.
+"""
+import gzip
+import os
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+
+COMPRESSED_SUFFIX = ".gz"
+# the version of a cached file is stored next to it
+VERSION_SUFFIX = ".version"
+CACHE_PRUNE_INTERVAL_SECONDS = 3600
+
+
+def _is_missing(err):
+    """True if a storage client error means the object does not exist."""
+    response = getattr(err, "response", None) or {}
+    code = str(response.get("Error", {}).get("Code", ""))
+    return code in ("404", "NoSuchKey", "NotFound")
+
+
+def _write_atomic(path, content):
+    """Write bytes to path so readers never see a partial file."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class Storage:
+    """
+    Base class for storage backends. Backends implement _exists, _version,
+    _read, _write, _delete and _local_path for files in the hot tier.
+
+    Parameters
+    ----------
+    :cache_root : str
+        Directory of the worker-local cache.
+    :cache_max_age_seconds : float or None
+        Cached files not used for this long are pruned, never if None.
+    """
+
+    def __init__(self, cache_root, cache_max_age_seconds=None):
+        self.cache_root = cache_root
+        self.cache_max_age_seconds = cache_max_age_seconds
+        self._pruned_at = None
+
+    def cache_path(self, path):
+        return os.path.join(self.cache_root, path.lstrip("/"))
+
+    def _cached(self, path, version):
+        """
+        Path of the cached copy of a file if it is of the given version,
+        None otherwise. A reused copy is touched, so it counts as recently
+        used when the cache is pruned.
+        """
+        cache_path = self.cache_path(path)
+        try:
+            with open(cache_path + VERSION_SUFFIX) as f:
+                cached_version = f.read()
+            if cached_version != version:
+                return None
+            os.utime(cache_path)
+            os.utime(cache_path + VERSION_SUFFIX)
+        except FileNotFoundError:
+            return None
+        return cache_path
+
+    def _cache(self, path, content, version):
+        """Stores a version of a file in the worker-local cache."""
+        self._maybe_prune_cache()
+        self._uncache(path)
+        cache_path = self.cache_path(path)
+        _write_atomic(cache_path, content)
+        _write_atomic(cache_path + VERSION_SUFFIX, version.encode())
+        return cache_path
+
+    def _uncache(self, path):
+        """Removes a file from the worker-local cache."""
+        for cache_path in [
+            self.cache_path(path),
+            self.cache_path(path) + VERSION_SUFFIX,
+        ]:
+            if os.path.exists(cache_path):
+                os.remove(cache_path)
+
+    def exists(self, path):
+        return self._exists(path) or self._exists(path + COMPRESSED_SUFFIX)
+
+    def is_demoted(self, path):
+        """True if the file is only stored in the compressed cold tier."""
+        return not self._exists(path) and self._exists(path + COMPRESSED_SUFFIX)
+
+    def local_path(self, path):
+        """Path of a readable local copy of the file."""
+        try:
+            return self._local_path(path)
+        except FileNotFoundError:
+            return self.rehydrate(path)
+
+    def open(self, path, mode="rb"):
+        if "r" not in mode or "+" in mode:
+            raise ValueError("storage files can only be opened for reading")
+        return open(self.local_path(path), mode)
+
+    def save(self, path, content):
+        """Store bytes at path in the hot tier."""
+        self._write(path, content)
+        self._delete(path + COMPRESSED_SUFFIX)
+        return path
+
+    def upload(self, path, remove_local=False):
+        """Store a file that has been written locally at path."""
+        with open(path, "rb") as f:
+            content = f.read()
+        self.save(path, content)
+        if remove_local:
+            os.remove(path)
+        return path
+
+    def delete(self, path):
+        self._delete(path)
+        self._delete(path + COMPRESSED_SUFFIX)
+        self._uncache(path)
+
+    def demote(self, path):
+        """
+        Moves a file from the hot tier to the compressed cold tier.
+        Returns
+        -------
+        :bytes_saved : int
+            Reduction in hot storage, zero if the file was not in the hot tier.
+        """
+        if not self._exists(path):
+            return 0
+        content = self._read(path)
+        self._write(
+            path + COMPRESSED_SUFFIX,
+            gzip.compress(content, compresslevel=6),
+            cold=True,
+        )
+        self._delete(path)
+        self._uncache(path)
+        return len(content)
+
+    def rehydrate(self, path):
+        """
+        Decompresses a demoted file into the worker-local cache, leaving the
+        stored copy in the cold tier.
+        """
+        version = self._version(path + COMPRESSED_SUFFIX)
+        cache_path = self._cached(path, version)
+        if cache_path is None:
+            content = self._read(path + COMPRESSED_SUFFIX)
+            cache_path = self._cache(path, gzip.decompress(content), version)
+        return cache_path
+
+    def prune_cache(self, max_age_seconds=None):
+        """
+        Removes cached files that have not been used for max_age_seconds,
+        by default cache_max_age_seconds.
+        """
+        if max_age_seconds is None:
+            max_age_seconds = self.cache_max_age_seconds
+        if max_age_seconds is None:
+            return
+        self._pruned_at = time.monotonic()
+        cutoff = time.time() - max_age_seconds
+        for dir_path, _, file_names in os.walk(self.cache_root):
+            for file_name in file_names:
+                path = os.path.join(dir_path, file_name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                except FileNotFoundError:
+                    # pruned by another process sharing the cache
+                    pass
+
+    def _maybe_prune_cache(self):
+        """Prunes the cache if it has not been for CACHE_PRUNE_INTERVAL_SECONDS."""
+        if (
+            self._pruned_at is None
+            or time.monotonic() - self._pruned_at > CACHE_PRUNE_INTERVAL_SECONDS
+        ):
+            self.prune_cache()
+
+    def clear_cache(self):
+        """Remove every file from the worker-local cache."""
+        shutil.rmtree(self.cache_root, ignore_errors=True)
+
+
+class LocalStorage(Storage):
+    """Files live at their own paths on a (shared) POSIX filesystem."""
+
+    def _exists(self, path):
+        return os.path.exists(path)
+
+    def _version(self, path):
+        stat = os.stat(path)
+        return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+    def _local_path(self, path):
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        return path
+
+    def _read(self, path):
+        with open(path, "rb") as f:
+            return f.read()
+
+    def _write(self, path, content, cold=False):
+        _write_atomic(path, content)
+
+    def _delete(self, path):
+        if os.path.exists(path):
+            os.remove(path)
+
+    def upload(self, path, remove_local=False):
+        """The file is already in place, only a stale cold copy is removed."""
+        self._delete(path + COMPRESSED_SUFFIX)
+        return path
+
+
+class S3Storage(Storage):
+    """
+    Files are objects in an S3-compatible bucket (AWS, MinIO, Ceph, ...) keyed
+    by their path, with a worker-local read-through cache.
+
+    Parameters
+    ----------
+    :bucket : str
+        Name of the bucket.
+    :cache_root : str
+        Directory of the worker-local cache.
+    :cache_max_age_seconds : float or None
+        Cached files not used for this long are pruned, never if None.
+    :client : object or None
+        boto3 S3 client, or anything with the same get_object, put_object,
+        head_object and delete_object methods. Created from the settings if
+        not given.
+    :cold_storage_class : str or None
+        S3 storage class of demoted objects, e.g. "STANDARD_IA". The bucket
+        default is used if not given.
+    """
+
+    def __init__(
+        self,
+        bucket,
+        cache_root,
+        cache_max_age_seconds=None,
+        client=None,
+        cold_storage_class=None,
+    ):
+        super().__init__(cache_root, cache_max_age_seconds=cache_max_age_seconds)
+        self.bucket = bucket
+        self.cold_storage_class = cold_storage_class
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            import boto3
+
+            self._client = boto3.client(
+                "s3",
+                endpoint_url=settings.S3_ENDPOINT_URL or None,
+                aws_access_key_id=settings.S3_ACCESS_KEY_ID or None,
+                aws_secret_access_key=settings.S3_SECRET_ACCESS_KEY or None,
+                region_name=settings.S3_REGION_NAME or None,
+            )
+        return self._client
+
+    def key(self, path):
+        return path.lstrip("/")
+
+    def _exists(self, path):
+        try:
+            self._version(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _version(self, path):
+        try:
+            response = self.client.head_object(Bucket=self.bucket, Key=self.key(path))
+        except Exception as err:
+            if _is_missing(err):
+                raise FileNotFoundError(path) from err
+            raise
+        return response["ETag"]
+
+    def _local_path(self, path):
+        version = self._version(path)
+        cache_path = self._cached(path, version)
+        if cache_path is None:
+            cache_path = self._cache(path, self._read(path), version)
+        return cache_path
+
+    def _read(self, path):
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self.key(path))
+        except Exception as err:
+            if _is_missing(err):
+                raise FileNotFoundError(path) from err
+            raise
+        return response["Body"].read()
+
+    def _write(self, path, content, cold=False):
+        kwargs = {"Bucket": self.bucket, "Key": self.key(path), "Body": content}
+        if cold and self.cold_storage_class:
+            kwargs["StorageClass"] = self.cold_storage_class
+        response = self.client.put_object(**kwargs)
+        if not cold:
+            self._cache(path, content, response["ETag"])
+
+    def _delete(self, path):
+        try:
+            self.client.delete_object(Bucket=self.bucket, Key=self.key(path))
+        except Exception as err:
+            if not _is_missing(err):
+                raise
+
+
+_storage = None
+
+
+def get_storage():
+    """
+    The storage backend selected by the STORAGE_BACKEND setting, created
+    once per process.
+    """
+    global _storage
+    if _storage is None:
+        if settings.STORAGE_BACKEND == "s3":
+            _storage = S3Storage(
+                settings.S3_BUCKET_NAME,
+                cache_root=settings.STORAGE_CACHE_ROOT,
+                cache_max_age_seconds=settings.STORAGE_CACHE_MAX_AGE_DAYS * 86400,
+                cold_storage_class=settings.S3_COLD_STORAGE_CLASS or None,
+            )
+        elif settings.STORAGE_BACKEND == "local":
+            _storage = LocalStorage(
+                cache_root=settings.STORAGE_CACHE_ROOT,
+                cache_max_age_seconds=settings.STORAGE_CACHE_MAX_AGE_DAYS * 86400,
+            )
+        else:
+            raise ValueError(f"Unknown storage backend {settings.STORAGE_BACKEND}")
+    return _storage
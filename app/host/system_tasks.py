@@ -1,6 +1,4 @@
 import datetime
-import glob
-import shutil
 
 from celery import shared_task
 from dateutil import parser
@@ -12,11 +10,16 @@ from host.base_tasks import SystemTaskRunner
 from host.base_tasks import task_soft_time_limit
 from host.base_tasks import task_time_limit
 from host.workflow import transient_workflow
+from host.workflow import workflows_with_batch_download
 
+from .lifecycle import demote_ghost_output
+from .lifecycle import demote_transient_artifacts
+from .lifecycle import transients_to_demote
 from .models import Status
 from .models import TaskRegister
 from .models import TaskRegisterSnapshot
 from .models import Transient
+from .storage import get_storage
 from .transient_name_server import get_daily_tns_staging_csv
 from .transient_name_server import get_tns_credentials
 from .transient_name_server import get_transients_from_tns
@@ -73,6 +76,7 @@ class TNSDataIngestion(SystemTaskRunner):
                     "photometric_class",
                     "milkyway_dust_reddening",
                     "processing_status",
+                    "artifacts_demoted_at",
                 ]
                 for k in keys_to_del:
                     del new_transient_dict[k]
@@ -108,11 +112,19 @@ class InitializeTransientTasks(SystemTaskRunner):
         uninitialized_transients = Transient.objects.filter(
             tasks_initialized__exact="False"
         )
+        transient_names = []
         for transient in uninitialized_transients:
             initialise_all_tasks_status(transient)
             transient.tasks_initialized = "True"
             transient.save()
-            transient_workflow.delay(transient.name)
+            transient_names.append(transient.name)
+
+        # a burst of new transients shares its survey tile downloads
+        if len(transient_names) > 1:
+            workflows_with_batch_download(transient_names).delay()
+        else:
+            for transient_name in transient_names:
+                transient_workflow.delay(transient_name)
 
     @property
     def task_name(self):
@@ -154,30 +166,28 @@ class IngestMissedTNSTransients(SystemTaskRunner):
         return False
 
 
-class DeleteGHOSTFiles(SystemTaskRunner):
+class DemoteStaleArtifacts(SystemTaskRunner):
     def run_process(self):
         """
-        Removes GHOST files
+        Moves the rarely read files of transients that finished processing a
+        while ago to compressed cold storage.
         """
-        dir_list = glob.glob("transients_*/")
-
-        for dir in dir_list:
-            try:
-                shutil.rmtree(dir)
-            except OSError as e:
-                print("Error: %s : %s" % (dir, e.strerror))
+        bytes_demoted = 0
+        transients = transients_to_demote()
+        for transient in transients:
+            bytes_demoted += demote_transient_artifacts(transient)
+        bytes_demoted += demote_ghost_output()
 
-        dir_list = glob.glob("quiverMaps/")
-
-        for dir in dir_list:
-            try:
-                shutil.rmtree(dir)
-            except OSError as e:
-                print("Error: %s : %s" % (dir, e.strerror))
+        get_storage().prune_cache()
+        print(f"Demoted {bytes_demoted / 1e6:.1f} MB to cold storage")
 
     @property
     def task_name(self):
-        return "Delete GHOST files"
+        return "Demote stale artifacts"
+
+    @property
+    def task_frequency_seconds(self):
+        return 86400
 
 
 class SnapshotTaskRegister(SystemTaskRunner):
@@ -305,8 +315,8 @@ def log_transient_processing_status():
     time_limit=task_time_limit,
     soft_time_limit=task_soft_time_limit,
 )
-def delete_ghost_files():
-    DeleteGHOSTFiles().run_process()
+def demote_stale_artifacts():
+    DemoteStaleArtifacts().run_process()
 
 
 @shared_task(
@@ -4,14 +4,15 @@ from __future__ import unicode_literals
 from celery import shared_task
 from host.base_tasks import task_soft_time_limit
 from host.base_tasks import task_time_limit
-from host.workflow import transient_workflow
-from .models import Transient
-from host.system_tasks import DeleteGHOSTFiles
+from host.system_tasks import DemoteStaleArtifacts
 from host.system_tasks import IngestMissedTNSTransients
 from host.system_tasks import InitializeTransientTasks
 from host.system_tasks import LogTransientProgress
 from host.system_tasks import SnapshotTaskRegister
 from host.system_tasks import TNSDataIngestion
+from host.workflow import transient_workflow
+
+from .models import Transient
 from .transient_name_server import get_transients_from_tns_by_name
 
 
@@ -20,10 +21,15 @@ periodic_tasks = [
     InitializeTransientTasks(),
     SnapshotTaskRegister(),
     LogTransientProgress(),
-    DeleteGHOSTFiles(),
+    DemoteStaleArtifacts(),
     IngestMissedTNSTransients(),
 ]
 
+# periodic tasks that no longer exist, removed from the beat schedule
+retired_periodic_tasks = [
+    "Delete GHOST files",
+]
+
 
 @shared_task(
     name="Import transients from TNS",
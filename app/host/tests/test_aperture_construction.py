@@ -1,10 +1,19 @@
+import astropy.units as u
 import numpy as np
+from astropy.coordinates import SkyCoord
 from astropy.io import fits
+from astropy.wcs import WCS
 from django.test import TestCase
+from photutils.segmentation import detect_sources
 
+from ..host_utils import aperture_cutout_candidates
 from ..host_utils import build_source_catalog
+from ..host_utils import construct_aperture
+from ..host_utils import construct_preferred_aperture
 from ..host_utils import estimate_background
+from ..host_utils import SegmentationCache
 from ..models import Aperture
+from ..models import Cutout
 from ..models import Status
 from ..models import TaskRegister
 from ..models import Transient
@@ -31,6 +40,34 @@ class TestApertureConstruction(TestCase):
 
         assert status_message == "processed"
 
+    def test_preferred_aperture(self):
+        transient = Transient.objects.get(name="2010H")
+        candidates = aperture_cutout_candidates(
+            Cutout.objects.filter(transient=transient)
+        )
+        self.assertEqual(
+            [cutout.filter.name for cutout in candidates],
+            [
+                "PanSTARRS_g",
+                "PanSTARRS_r",
+                "PanSTARRS_i",
+                "SDSS_r",
+                "SDSS_i",
+                "2MASS_H",
+            ],
+        )
+
+        position = transient.host.sky_coord
+        serial_cutout, serial_aperture = construct_preferred_aperture(
+            candidates, position, max_workers=1
+        )
+        threaded_cutout, threaded_aperture = construct_preferred_aperture(
+            candidates, position, max_workers=3
+        )
+        self.assertEqual(threaded_cutout, serial_cutout)
+        self.assertEqual(threaded_aperture.positions, serial_aperture.positions)
+        self.assertEqual(threaded_aperture.a, serial_aperture.a)
+
     def test_aperture_failures(self):
         data = np.zeros((500, 5000), dtype=np.float64)
         hdu = fits.PrimaryHDU(data=data)
@@ -40,3 +77,96 @@ class TestApertureConstruction(TestCase):
         catalog = build_source_catalog(hdulist, background)
 
         assert catalog is None
+
+    def test_segmentation_cache(self):
+        rng = np.random.default_rng(0)
+        data = rng.normal(0.0, 1.0, size=(200, 200))
+        y, x = np.mgrid[:200, :200]
+        for x0, y0, peak in [(50, 50, 50.0), (150, 120, 12.0)]:
+            data += peak * np.exp(-((x - x0) ** 2 + (y - y0) ** 2) / 20.0)
+        hdulist = fits.HDUList(hdus=[fits.PrimaryHDU(data=data)])
+        background = estimate_background(hdulist)
+
+        segmentation_cache = SegmentationCache(hdulist, background)
+        for threshhold_sigma in [5, 10, 15, 20, 25, 2]:
+            segmentation = detect_sources(
+                data - background.background,
+                threshhold_sigma * background.background_rms,
+                npixels=10,
+            )
+            cached_segmentation = segmentation_cache.segmentation(threshhold_sigma)
+            if segmentation is None:
+                assert cached_segmentation is None
+            else:
+                assert np.array_equal(segmentation.data, cached_segmentation.data)
+
+        catalog = segmentation_cache.catalog(5)
+        assert catalog is segmentation_cache.catalog(5)
+
+    def test_segmentation_cache_empty(self):
+        """
+        Thresholds above one that detects nothing detect nothing either
+        """
+        rng = np.random.default_rng(1)
+        hdulist = fits.HDUList(
+            hdus=[fits.PrimaryHDU(data=rng.normal(0.0, 1.0, size=(100, 100)))]
+        )
+        background = estimate_background(hdulist)
+
+        segmentation_cache = SegmentationCache(hdulist, background)
+        assert segmentation_cache.segmentation(25) is None
+        assert segmentation_cache.segmentation(30) is None
+        assert segmentation_cache.catalog(30) is None
+
+    def test_binned_construction(self):
+        """
+        Apertures constructed with a binned first pass agree with the full
+        resolution ones on a synthetic reference set
+        """
+        wcs = WCS(naxis=2)
+        wcs.wcs.ctype = ["RA---TAN", "DEC--TAN"]
+        wcs.wcs.crval = [150.0, 2.0]
+        wcs.wcs.crpix = [300.5, 250.5]
+        wcs.wcs.cdelt = [-1 / 3600, 1 / 3600]
+
+        # (x, y, peak, sigma_major, sigma_minor, angle) of each galaxy
+        reference_set = [
+            [(300, 250, 40.0, 12.0, 6.0, 0.3), (420, 330, 30.0, 8.0, 8.0, 0.0)],
+            [(150, 400, 25.0, 20.0, 9.0, 1.2), (170, 360, 15.0, 4.0, 3.0, 0.0)],
+            [(520, 60, 60.0, 6.0, 4.0, -0.7), (100, 100, 80.0, 3.0, 3.0, 0.0)],
+        ]
+        y, x = np.mgrid[:500, :600]
+        for seed, galaxies in enumerate(reference_set):
+            rng = np.random.default_rng(seed)
+            data = rng.normal(0.0, 1.0, size=(500, 600))
+            for x0, y0, peak, sigma_a, sigma_b, angle in galaxies:
+                dx = (x - x0) * np.cos(angle) + (y - y0) * np.sin(angle)
+                dy = -(x - x0) * np.sin(angle) + (y - y0) * np.cos(angle)
+                data += peak * np.exp(
+                    -0.5 * ((dx / sigma_a) ** 2 + (dy / sigma_b) ** 2)
+                )
+            image = fits.HDUList(
+                hdus=[fits.PrimaryHDU(data=data, header=wcs.to_header())]
+            )
+            host_ra, host_dec = wcs.wcs_pix2world(
+                galaxies[0][0] + 1.5, galaxies[0][1] - 1.0, 0
+            )
+            position = SkyCoord(host_ra, host_dec, unit="deg")
+
+            reference = construct_aperture(image, position, binning=1)
+            for binning in [2, 4]:
+                aperture = construct_aperture(image, position, binning=binning)
+                self.assertLess(
+                    aperture.positions.separation(reference.positions).arcsec, 0.1
+                )
+                for axis in ["a", "b"]:
+                    self.assertAlmostEqual(
+                        getattr(aperture, axis).to(u.arcsec).value,
+                        getattr(reference, axis).to(u.arcsec).value,
+                        delta=0.02 * getattr(reference, axis).to(u.arcsec).value,
+                    )
+                self.assertAlmostEqual(
+                    aperture.theta.to(u.deg).value,
+                    reference.theta.to(u.deg).value,
+                    delta=1.0,
+                )
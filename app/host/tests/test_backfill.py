@@ -0,0 +1,121 @@
+import os
+import tempfile
+
+from django.test import TestCase
+
+from ..backfill import invalidate_sed_fits
+from ..backfill import match_hosts
+from ..backfill import read_checkpoint
+from ..backfill import refresh_photometry
+from ..backfill import transients_missing_filters
+from ..models import AperturePhotometry
+from ..models import Cutout
+from ..models import Filter
+from ..models import Status
+from ..models import TaskRegister
+from ..models import Transient
+
+
+class TestFilterBackfill(TestCase):
+    fixtures = [
+        "../fixtures/initial/setup_survey_data.yaml",
+        "../fixtures/initial/setup_filter_data.yaml",
+        "../fixtures/initial/setup_catalog_data.yaml",
+        "../fixtures/initial/setup_status.yaml",
+        "../fixtures/initial/setup_tasks.yaml",
+        "../fixtures/initial/setup_acknowledgements.yaml",
+        "../fixtures/test/test_2010H.yaml",
+    ]
+
+    def test_transients_missing_filters(self):
+        new_filter = Filter.objects.get(name="SDSS_g")
+        existing_filter = Filter.objects.get(name="PanSTARRS_g")
+
+        missing = transients_missing_filters([new_filter])
+        self.assertEqual([t.name for t in missing], ["2010H"])
+
+        missing = transients_missing_filters([existing_filter])
+        self.assertEqual(len(missing), 0)
+
+    def test_invalidate_only_dependent_sed_fits(self):
+        transient = Transient.objects.get(name="2010H")
+
+        invalidated = invalidate_sed_fits(transient, ["global"])
+
+        self.assertEqual(invalidated, ["Global host SED inference"])
+        register = TaskRegister.objects.filter(transient=transient)
+        self.assertEqual(
+            register.get(task__name="Global host SED inference").status.message,
+            "not processed",
+        )
+        self.assertEqual(
+            register.get(task__name="Local host SED inference").status.message,
+            "processed",
+        )
+        self.assertEqual(
+            register.get(task__name="Global aperture photometry").status.message,
+            "processed",
+        )
+
+    def test_match_hosts_in_batches(self):
+        register = TaskRegister.objects.filter(transient__name="2010H")
+        register.filter(task__name="Host match").update(
+            status=Status.objects.get(message__exact="not processed")
+        )
+        register.filter(task__name="Transient MWEBV").update(
+            status=Status.objects.get(message__exact="processed")
+        )
+        Transient.objects.filter(name="2010H").update(host=None)
+
+        summary = match_hosts(verbose=False)
+
+        self.assertEqual(summary, {"transients": 1, "hosts": 1})
+        self.assertEqual(
+            register.get(task__name="Host match").status.message, "processed"
+        )
+        self.assertIsNotNone(Transient.objects.get(name="2010H").host)
+
+        # nothing is left waiting for a host
+        self.assertEqual(match_hosts(verbose=False)["transients"], 0)
+
+
+class TestPhotometryRefresh(TestCase):
+    fixtures = [
+        "../fixtures/initial/setup_survey_data.yaml",
+        "../fixtures/initial/setup_filter_data.yaml",
+        "../fixtures/initial/setup_catalog_data.yaml",
+        "../fixtures/initial/setup_status.yaml",
+        "../fixtures/initial/setup_tasks.yaml",
+        "../fixtures/initial/setup_acknowledgements.yaml",
+        "../fixtures/test/test_2010H_onefilter.yaml",
+    ]
+
+    def test_refresh_is_resumable(self):
+        photometry = AperturePhotometry.objects.filter(transient__name="2010H")
+        photometry.update(is_validated="true")
+        rows_before = set(photometry.values_list("pk", "aperture", "filter"))
+
+        with tempfile.TemporaryDirectory() as checkpoint_dir:
+            checkpoint_path = os.path.join(checkpoint_dir, "checkpoint.json")
+            summary = refresh_photometry(checkpoint_path=checkpoint_path, verbose=False)
+            self.assertEqual(summary["transients"], 1)
+            self.assertEqual(read_checkpoint(checkpoint_path), summary)
+
+            # a resumed run has nothing left to do
+            resumed = refresh_photometry(checkpoint_path=checkpoint_path, verbose=False)
+            self.assertEqual(resumed, summary)
+
+        self.assertEqual(
+            set(photometry.values_list("pk", "aperture", "filter")), rows_before
+        )
+        self.assertFalse(photometry.exclude(is_validated="true").exists())
+
+    def test_refresh_skips_missing_images(self):
+        cutout = Cutout.objects.filter(transient__name="2010H").exclude(fits="")[0]
+        cutout.fits.name = "cutout_cdn/2010H/missing/missing.fits"
+        cutout.save()
+
+        summary = refresh_photometry(verbose=False)
+
+        self.assertEqual(summary["transients"], 1)
+        self.assertEqual(summary["failed_images"], 1)
@@ -0,0 +1,50 @@
+import numpy as np
+from django.test import SimpleTestCase
+
+from ..cosmology import flat_lcdm
+from ..cosmology import TABLE_RELATIVE_TOLERANCE
+from ..cosmology import TABLE_Z_MAX
+from ..cosmology import wmap9
+
+
+class TestCosmologyTables(SimpleTestCase):
+    def test_tables_match_astropy(self):
+        rng = np.random.default_rng(0)
+        redshifts = np.concatenate(
+            [
+                [1e-5, 1e-3, 0.015, 0.1, 1.0, 3.0, TABLE_Z_MAX],
+                10 ** rng.uniform(-4, np.log10(TABLE_Z_MAX), size=500),
+            ]
+        )
+
+        for table in [flat_lcdm, wmap9]:
+            cosmology = table.cosmology
+            for quantity in [
+                "age",
+                "lookback_time",
+                "angular_diameter_distance",
+                "luminosity_distance",
+            ]:
+                exact = getattr(cosmology, quantity)(redshifts).value
+                interpolated = getattr(table, quantity)(redshifts)
+                relative_error = np.max(np.abs(interpolated / exact - 1))
+                self.assertLess(relative_error, TABLE_RELATIVE_TOLERANCE, quantity)
+
+            self.assertTrue(
+                np.allclose(
+                    table.distmod(redshifts),
+                    cosmology.distmod(redshifts).value,
+                    rtol=0,
+                    atol=1e-5,
+                )
+            )
+
+    def test_scalars_and_range(self):
+        self.assertIsInstance(wmap9.age(0.1), float)
+        self.assertEqual(np.shape(wmap9.age(np.array([0.1]))), (1,))
+
+        # outside the table astropy is used directly
+        z = TABLE_Z_MAX + 5
+        self.assertAlmostEqual(
+            flat_lcdm.age(z), flat_lcdm.cosmology.age(z).value, places=12
+        )
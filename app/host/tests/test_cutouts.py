@@ -1,10 +1,20 @@
 import os
 
+import astropy.units as u
+import numpy as np
 from astropy.coordinates import SkyCoord
 from astropy.io import fits
+from astropy.wcs import WCS
 from django.test import TestCase
+from photutils.aperture import SkyCircularAperture
 
 from ..cutouts import cutout
+from ..cutouts import cutout_from_frame
+from ..cutouts import FrameCache
+from ..cutouts import survey_tile_key
+from ..cutouts import unscale_panstarrs
+from ..host_utils import cutout_metadata
+from ..models import Cutout
 from ..models import Filter
 
 sn = ["2010ag", "2010ai", "2010y", "2010H", ""]
@@ -38,3 +48,113 @@ class CutoutDownloadTest(TestCase):
                 fits.writeto(path_to_fits, cutout_data[0].data, overwrite=True)
 
         self.assertTrue(1 == 1)
+
+
+class FrameCacheTest(TestCase):
+    fixtures = [
+        "../fixtures/initial/setup_survey_data.yaml",
+        "../fixtures/initial/setup_filter_data.yaml",
+    ]
+
+    def test_frames_downloaded_once(self):
+        downloads = []
+
+        def loader(url):
+            downloads.append(url)
+            return fits.HDUList([fits.PrimaryHDU(data=np.zeros((10, 10)))])
+
+        frame_cache = FrameCache(max_frames=2)
+        for url in ["a", "b", "a", "c", "a"]:
+            frame_cache.open(url, loader=loader)
+
+        self.assertEqual(downloads, ["a", "b", "c"])
+        self.assertEqual(frame_cache.hits, 2)
+        self.assertEqual(frame_cache.misses, 3)
+
+    def test_cutout_does_not_modify_frame(self):
+        header = fits.Header()
+        header["CTYPE1"], header["CTYPE2"] = "RA---TAN", "DEC--TAN"
+        header["CRVAL1"], header["CRVAL2"] = 10.0, 10.0
+        header["CRPIX1"], header["CRPIX2"] = 50.0, 50.0
+        header["CDELT1"], header["CDELT2"] = -1 / 3600.0, 1 / 3600.0
+        data = np.arange(100 * 100, dtype=np.float64).reshape(100, 100)
+        frame = fits.HDUList([fits.PrimaryHDU(data=data.copy(), header=header)])
+
+        position = SkyCoord(ra=10.0, dec=10.0, unit="deg")
+        image = cutout_from_frame(frame, position, 20)
+
+        self.assertEqual(image[0].data.shape, (20, 20))
+        self.assertTrue(np.array_equal(frame[0].data, data))
+
+    def test_unscale_panstarrs_cutout(self):
+        header = fits.Header()
+        header["CTYPE1"], header["CTYPE2"] = "RA---TAN", "DEC--TAN"
+        header["CRVAL1"], header["CRVAL2"] = 10.0, 10.0
+        header["CRPIX1"], header["CRPIX2"] = 50.0, 50.0
+        header["CDELT1"], header["CDELT2"] = -1 / 3600.0, 1 / 3600.0
+        header["BSOFTEN"], header["BOFFSET"] = 2.0, 1.0
+        data = np.ones((100, 100), dtype=np.float32)
+        frame = fits.HDUList([fits.PrimaryHDU(data=data, header=header)])
+
+        position = SkyCoord(ra=10.0, dec=10.0, unit="deg")
+        image = unscale_panstarrs(cutout_from_frame(frame, position, 20))
+
+        # the frame keeps its type, only the cutout is converted
+        self.assertEqual(frame[0].data.dtype, np.float32)
+        self.assertEqual(image[0].data.dtype, np.float64)
+        expected = 1.0 + 2.0 * 2.0 * np.sinh(np.log(10) / 2.5)
+        self.assertTrue(np.allclose(image[0].data, expected))
+        self.assertNotIn("BSOFTEN", image[0].header)
+
+    def test_survey_tile_key(self):
+        wise = Filter.objects.get(name="WISE_W1")
+        position = SkyCoord(ra=150.0, dec=2.0, unit="deg")
+        nearby = SkyCoord(ra=150.01, dec=2.01, unit="deg")
+        far = SkyCoord(ra=160.0, dec=2.0, unit="deg")
+
+        self.assertEqual(survey_tile_key(position, wise), survey_tile_key(nearby, wise))
+        self.assertNotEqual(survey_tile_key(position, wise), survey_tile_key(far, wise))
+
+
+class CutoutMetadataTest(TestCase):
+    fixtures = [
+        "../fixtures/initial/setup_survey_data.yaml",
+        "../fixtures/initial/setup_filter_data.yaml",
+    ]
+
+    def setUp(self):
+        header = fits.Header()
+        header["CTYPE1"], header["CTYPE2"] = "RA---TAN", "DEC--TAN"
+        header["CRVAL1"], header["CRVAL2"] = 10.0, 10.0
+        header["CRPIX1"], header["CRPIX2"] = 50.0, 50.0
+        header["CDELT1"], header["CDELT2"] = -1 / 3600.0, 1 / 3600.0
+        header["EXPTIME"] = 100.0
+        rng = np.random.default_rng(0)
+        data = rng.normal(10.0, 1.0, size=(100, 100))
+        data[:10, :] = np.nan
+        self.image = fits.HDUList([fits.PrimaryHDU(data=data, header=header)])
+        self.filter = Filter.objects.get(name="PanSTARRS_g")
+
+    def test_cutout_metadata(self):
+        metadata = cutout_metadata(self.image, self.filter)
+
+        self.assertEqual(metadata["image_width"], 100)
+        self.assertEqual(metadata["image_height"], 100)
+        self.assertAlmostEqual(
+            WCS(fits.Header.fromstring(metadata["wcs_header"])).wcs.crval[0], 10.0
+        )
+
+    def test_contains_aperture(self):
+        cutout = Cutout(name="test", filter=self.filter)
+        center = SkyCoord(ra=10.0, dec=10.0, unit="deg")
+        edge = SkyCoord(ra=10.0, dec=10.0 + 48 / 3600.0, unit="deg")
+        aperture = SkyCircularAperture(center, r=5 * u.arcsec)
+        edge_aperture = SkyCircularAperture(edge, r=5 * u.arcsec)
+
+        # without metadata the image has to be opened to find out
+        self.assertTrue(cutout.contains_aperture(edge_aperture))
+
+        for field, value in cutout_metadata(self.image, self.filter).items():
+            setattr(cutout, field, value)
+        self.assertTrue(cutout.contains_aperture(aperture))
+        self.assertFalse(cutout.contains_aperture(edge_aperture))
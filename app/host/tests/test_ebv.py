@@ -1,6 +1,8 @@
 import numpy as np
+from astropy.coordinates import SkyCoord
 from django.test import TestCase
 
+from ..dust import DustMap
 from ..models import TaskRegister
 from ..models import Transient
 from ..transient_tasks import MWEBV_Host
@@ -42,3 +44,23 @@ class EBVTest(TestCase):
         transient.host.dec_deg = -99
         status_message = mwebv_host_cls._run_process(transient)
         assert status_message == "no host MWEBV"
+
+    def test_batched_dust_map(self):
+        dust_map = DustMap()
+        transient = Transient.objects.get(name="2010H")
+        positions = SkyCoord(
+            [transient.ra_deg, transient.host.ra_deg, transient.ra_deg],
+            [transient.dec_deg, transient.host.dec_deg, transient.dec_deg],
+            unit="deg",
+        )
+
+        ebv = dust_map.ebv(positions)
+        assert ebv.shape == (3,)
+        assert ebv[0] == ebv[2]
+        assert np.isclose(0.86 * ebv[0], 0.0264890836, 1e-5)
+        assert len(dust_map.memo) == 2
+
+        # scalar lookups are answered from the memo
+        dust_map._query = lambda position: 1 / 0
+        assert dust_map.ebv(transient.sky_coord) == ebv[0]
+        assert dust_map.ebv(positions[1]) == ebv[1]
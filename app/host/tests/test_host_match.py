@@ -1,10 +1,41 @@
+import os
+import tempfile
+from datetime import timedelta
+
+import astropy.units as u
+import numpy as np
+import pandas as pd
+from astro_ghost import photoz_helper
+from astropy.coordinates import SkyCoord
+from astropy.io import fits
+from astropy.table import Table
+from django.test import override_settings
+from django.test import SimpleTestCase
 from django.test import TestCase
 
+from ..ghost import ghost_context
+from ..ghost import ghost_transient_name
+from ..host_reuse import canonical_host
+from ..host_reuse import copy_result_file
+from ..host_reuse import host_donor
+from ..host_utils import cached_redshift_query
 from ..models import Aperture
+from ..models import Cutout
+from ..models import Host
+from ..models import RedshiftQueryCache
 from ..models import Status
 from ..models import TaskRegister
 from ..models import Transient
+from ..photoz import check_photoz_helpers
+from ..photoz import photoz_model
+from ..photoz import posterior_moments
+from ..redshift_catalog import cone_search
+from ..redshift_catalog import load_redshift_catalog
+from ..storage import get_storage
 from ..transient_tasks import Ghost
+from ..transient_tasks import GlobalApertureConstruction
+from ..transient_tasks import HostInformation
+from ..transient_tasks import MWEBV_Host
 
 
 class TestHostMatch(TestCase):
@@ -26,3 +57,236 @@ class TestHostMatch(TestCase):
         status_message = host_cls._run_process(transient)
 
         assert status_message == "processed"
+
+    def test_batch_association(self):
+        transient = Transient.objects.get(name="2010H")
+        assert ghost_context.associate_hosts([]) == {}
+
+        cwd = os.getcwd()
+        hosts = ghost_context.associate_hosts([transient])
+        assert list(hosts) == ["2010H"]
+        assert hosts["2010H"] is not None
+
+        # GHOST's scratch stays in its workspace
+        assert os.getcwd() == cwd
+        assert not os.path.exists(os.path.join(cwd, "quiverMaps"))
+
+        transient.name = "2023 123"
+        assert ghost_transient_name(transient) == "sn2023123"
+
+
+class TestRedshiftQueryCache(TestCase):
+    def test_cached_redshift_query(self):
+        calls = []
+
+        def query(position, radius):
+            calls.append(position)
+            return {"redshift": 0.05 if position.dec.degree > 0 else None}
+
+        position = SkyCoord(150.0, 2.0, unit="deg")
+        nearby = SkyCoord(150.0, 2.0 + 0.01 / 3600, unit="deg")
+        empty = SkyCoord(150.0, -2.0, unit="deg")
+
+        assert cached_redshift_query("NED", query, position)["redshift"] == 0.05
+        assert cached_redshift_query("NED", query, nearby)["redshift"] == 0.05
+        assert len(calls) == 1
+
+        # the cache is per service
+        cached_redshift_query("SDSS", query, position)
+        assert len(calls) == 2
+
+        # no redshift is cached too
+        assert cached_redshift_query("NED", query, empty)["redshift"] is None
+        assert cached_redshift_query("NED", query, empty)["redshift"] is None
+        assert len(calls) == 3
+
+        # negative results expire first
+        RedshiftQueryCache.objects.update(
+            queried_at=RedshiftQueryCache.objects.first().queried_at
+            - timedelta(days=30)
+        )
+        cached_redshift_query("NED", query, position)
+        cached_redshift_query("NED", query, empty)
+        assert len(calls) == 4
+
+
+class TestRedshiftCatalog(TestCase):
+    fixtures = [
+        "../fixtures/initial/setup_survey_data.yaml",
+        "../fixtures/initial/setup_filter_data.yaml",
+        "../fixtures/initial/setup_catalog_data.yaml",
+        "../fixtures/initial/setup_status.yaml",
+        "../fixtures/initial/setup_tasks.yaml",
+        "../fixtures/initial/setup_acknowledgements.yaml",
+        "../fixtures/test/test_2010H.yaml",
+    ]
+
+    def test_local_redshift_catalog(self):
+        transient = Transient.objects.get(name="2010H")
+        host = transient.host
+        offset = 0.5 / 3600
+        spectroscopic = Table(
+            {
+                "ra": [host.ra_deg, host.ra_deg + offset, 10.0, float("nan")],
+                "dec": [host.dec_deg, host.dec_deg, 10.0, 0.0],
+                "z": [0.0155, 0.2, 0.3, 0.4],
+            }
+        )
+        photometric = Table({"ra": [host.ra_deg], "dec": [host.dec_deg], "z": [0.02]})
+
+        batches = []
+        assert (
+            load_redshift_catalog(
+                spectroscopic, "TEST", batch_size=2, progress=batches.append
+            )
+            == 3
+        )
+        assert batches == [2, 3]
+        assert load_redshift_catalog(photometric, "TESTPZ", photometric=True) == 1
+
+        matches = cone_search(host.sky_coord, radius=1.0 * u.arcsec)
+        assert [row.redshift for _, row in matches if not row.photometric] == [
+            0.0155,
+            0.2,
+        ]
+        nearest = cone_search(host.sky_coord, radius=0.1 * u.arcsec, photometric=False)
+        assert [row.redshift for _, row in nearest] == [0.0155]
+
+        # a host in the local catalog never reaches the live services
+        host.redshift = None
+        host.save()
+        with override_settings(REDSHIFT_LIVE_FALLBACK=False):
+            status_message = HostInformation("2010H")._run_process(transient)
+        host.refresh_from_db()
+        assert status_message == "processed"
+        assert host.redshift == 0.0155
+        assert host.photometric_redshift == 0.02
+
+
+class TestPhotoz(SimpleTestCase):
+    def test_posterior_moments(self):
+        range_z = np.linspace(0.0, 1.0, 361)[:360]
+        posteriors = np.zeros((2, 360))
+        posteriors[0, 36] = 2.0
+        posteriors[1, [36, 72]] = 1.0
+
+        posteriors, point_estimates, errors = posterior_moments(posteriors, range_z)
+        assert np.allclose(posteriors.sum(axis=1), 1)
+        assert np.allclose(point_estimates, [0.1, 0.15])
+        assert np.allclose(errors, [0.0, 0.05])
+
+    def test_photoz_helpers(self):
+        # the pinned astro_ghost has the helpers the model is built from
+        check_photoz_helpers()
+
+    def test_photoz_matches_helper(self):
+        """
+        Test the persistent model agrees with astro_ghost's own photo-z,
+        evaluated through the real helpers
+        """
+        _, columns = photoz_helper.get_common_constraints_columns()
+        # a galaxy of magnitude 18 in every band and flux measurement
+        photometry = pd.DataFrame(
+            {column: [3631 * 10 ** (-0.4 * 18)] * 2 for column in columns}
+        )
+        photometry["objID"] = [1, 2]
+        photometry["raMean"] = [150.0, 210.0]
+        photometry["decMean"] = [20.0, 40.0]
+
+        _, point_estimates, errors = photoz_model.predict(photometry.copy())
+        _, expected_point_estimates, _ = photoz_helper.get_photoz(
+            photometry.copy(),
+            dust_path=photoz_model.dust_path,
+            model_path=photoz_model.model_path,
+        )
+        assert np.allclose(point_estimates, expected_point_estimates, atol=1e-5)
+        assert np.all(errors > 0)
+
+
+class TestHostReuse(TestCase):
+    fixtures = [
+        "../fixtures/initial/setup_survey_data.yaml",
+        "../fixtures/initial/setup_filter_data.yaml",
+        "../fixtures/initial/setup_catalog_data.yaml",
+        "../fixtures/initial/setup_status.yaml",
+        "../fixtures/initial/setup_tasks.yaml",
+        "../fixtures/initial/setup_acknowledgements.yaml",
+        "../fixtures/test/test_2010H.yaml",
+    ]
+
+    def test_canonical_host(self):
+        existing = Host.objects.get(name="IC 494")
+        nearby = Host(
+            ra_deg=existing.ra_deg,
+            dec_deg=existing.dec_deg + 0.5 / 3600,
+            name="2010H",
+            photometric_redshift=0.02,
+        )
+        host = canonical_host(nearby)
+        assert host.pk == existing.pk
+        assert Host.objects.get(pk=existing.pk).photometric_redshift == 0.02
+        assert Host.objects.get(pk=existing.pk).name == "IC 494"
+
+        distant = Host(
+            ra_deg=existing.ra_deg, dec_deg=existing.dec_deg + 5 / 3600, name="other"
+        )
+        assert canonical_host(distant).pk != existing.pk
+        assert Host.objects.count() == 2
+
+        # deleting a shared host leaves its transients in place
+        Host.objects.filter(pk=existing.pk).delete()
+        assert Transient.objects.get(name="2010H").host is None
+
+    def test_host_donor(self):
+        transient = Transient.objects.get(name="2010H")
+        sibling = Transient.objects.create(
+            name="2010Hb",
+            tns_id=4,
+            tns_prefix="SN",
+            ra_deg=transient.ra_deg,
+            dec_deg=transient.dec_deg,
+            host=transient.host,
+        )
+        assert host_donor(sibling, "Host MWEBV") is None
+
+        MWEBV_Host("2010H")._run_process(transient)
+        TaskRegister.objects.filter(
+            transient=transient, task__name="Host MWEBV"
+        ).update(status=Status.objects.get(message="processed"))
+        assert host_donor(sibling, "Host MWEBV") == transient
+        with override_settings(HOST_PRODUCT_REUSE=False):
+            assert host_donor(sibling, "Host MWEBV") is None
+
+        # the sibling reuses the host reddening even where it could not look it up
+        sibling.host.dec_deg = -99
+        assert MWEBV_Host("2010Hb")._run_process(sibling) == "processed"
+
+    def test_copy_result_file(self):
+        donor = Transient.objects.get(name="2010H")
+        transient = Transient(name="2010Hb")
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, "2010H", "2010H_global_chain.npz")
+            get_storage().save(path, b"chains")
+            new_path = copy_result_file(path, donor, transient)
+            assert new_path == os.path.join(root, "2010Hb", "2010Hb_global_chain.npz")
+            with get_storage().open(new_path) as f:
+                assert f.read() == b"chains"
+            assert get_storage().exists(path)
+
+    def test_reuse_aperture_off_cutout(self):
+        transient = Transient.objects.get(name="2010H")
+        cutouts = Cutout.objects.filter(transient=transient)
+        runner = GlobalApertureConstruction("2010H")
+        assert runner._reuse_aperture(transient, cutouts, transient)
+
+        # the donor's aperture does not fit on 20 arcsec images
+        header = fits.Header()
+        header["CTYPE1"], header["CTYPE2"] = "RA---TAN", "DEC--TAN"
+        header["CRVAL1"], header["CRVAL2"] = (
+            transient.host.ra_deg,
+            transient.host.dec_deg,
+        )
+        header["CRPIX1"], header["CRPIX2"] = 10.0, 10.0
+        header["CDELT1"], header["CDELT2"] = -1 / 3600.0, 1 / 3600.0
+        cutouts.update(wcs_header=header.tostring(), image_width=20, image_height=20)
+        assert not runner._reuse_aperture(transient, cutouts, transient)
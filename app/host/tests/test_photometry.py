@@ -1,8 +1,32 @@
+import tempfile
+from datetime import timedelta
+
+import astropy.units as u
+import numpy as np
+from astropy.coordinates import SkyCoord
+from astropy.io import fits
+from django.test import SimpleTestCase
 from django.test import TestCase
+from django.utils import timezone
+from photutils.aperture import aperture_photometry
+from photutils.aperture import EllipticalAperture
+from photutils.aperture import SkyCircularAperture
+from photutils.background import LocalBackground
 
+from ..base_tasks import task_time_limit
+from ..host_utils import BackgroundCache
+from ..host_utils import contamination_segmentation
+from ..host_utils import estimate_background
+from ..host_utils import map_image_photometry
+from ..host_utils import region_of_interest
+from ..host_utils import segmentation_path
 from ..models import AperturePhotometry
+from ..models import Cutout
+from ..models import Filter
+from ..models import Status
 from ..models import TaskRegister
 from ..models import Transient
+from ..storage import get_storage
 from ..transient_tasks import GlobalAperturePhotometry
 from ..transient_tasks import LocalAperturePhotometry
 from ..transient_tasks import ValidateGlobalPhotometry
@@ -51,6 +75,29 @@ class TestValidatePhotometry(TestCase):
 
         assert len(not_validated_global_aperture_photometry) == 0
 
+    def test_contamination_segmentation_persisted(self):
+        cutout = Cutout.objects.get(name="2010H_PanSTARRS_g")
+        storage = get_storage()
+        path = segmentation_path(cutout.fits.name)
+        storage.delete(path)
+        try:
+            segmentation = contamination_segmentation(cutout)
+            self.assertTrue(storage.exists(path))
+
+            persisted = contamination_segmentation(cutout)
+            self.assertTrue(
+                np.array_equal(persisted.segment_data, segmentation.segment_data)
+            )
+            self.assertTrue(np.array_equal(persisted.labels, segmentation.labels))
+            self.assertTrue(
+                np.allclose(
+                    persisted.wcs.world_to_pixel(cutout.transient.sky_coord),
+                    segmentation.wcs.world_to_pixel(cutout.transient.sky_coord),
+                )
+            )
+        finally:
+            storage.delete(path)
+
     def test_global_aperture_photometry(self):
         transient = Transient.objects.get(name="2010H")
         apphot_cls = GlobalAperturePhotometry()
@@ -70,3 +117,213 @@ class TestValidatePhotometry(TestCase):
         status_message = apphot_cls._run_process(transient)
 
         assert status_message == "failed"
+
+
+class TestJointPhotometry(TestCase):
+    fixtures = [
+        "../fixtures/initial/setup_survey_data.yaml",
+        "../fixtures/initial/setup_filter_data.yaml",
+        "../fixtures/initial/setup_catalog_data.yaml",
+        "../fixtures/initial/setup_status.yaml",
+        "../fixtures/initial/setup_tasks.yaml",
+        "../fixtures/initial/setup_acknowledgements.yaml",
+        "../fixtures/test/test_2010H_onefilter.yaml",
+    ]
+
+    def setUp(self):
+        self.task_names = ["Local aperture photometry", "Global aperture photometry"]
+        TaskRegister.objects.filter(
+            transient__name="2010H", task__name__in=self.task_names
+        ).update(status=Status.objects.get(message="not processed"))
+        AperturePhotometry.objects.filter(transient__name="2010H").delete()
+
+    def test_one_pass_measures_both_stages(self):
+        LocalAperturePhotometry("2010H").run_process()
+
+        for task_name in self.task_names:
+            register_item = TaskRegister.objects.get(
+                transient__name="2010H", task__name=task_name
+            )
+            assert register_item.status.message == "processed"
+
+        for aperture_type in ["local", "global"]:
+            assert AperturePhotometry.objects.filter(
+                transient__name="2010H", aperture__type=aperture_type
+            ).exists()
+
+        # the other stage finds its work done
+        GlobalAperturePhotometry("2010H").run_process()
+        assert (
+            AperturePhotometry.objects.filter(
+                transient__name="2010H", aperture__type="global"
+            ).count()
+            == 1
+        )
+
+    def test_partner_reuses_host_photometry(self):
+        reused = []
+
+        class DonorGlobalPhotometry(GlobalAperturePhotometry):
+            def _reuse(self, transient):
+                reused.append(transient.name)
+                return True
+
+        class JointLocalPhotometry(LocalAperturePhotometry):
+            partner_class = DonorGlobalPhotometry
+
+        JointLocalPhotometry("2010H").run_process()
+
+        # the claimed global stage copies its photometry instead of measuring
+        assert reused == ["2010H"]
+        register_item = TaskRegister.objects.get(
+            transient__name="2010H", task__name="Global aperture photometry"
+        )
+        assert register_item.status.message == "processed"
+        assert not AperturePhotometry.objects.filter(
+            transient__name="2010H", aperture__type="global"
+        ).exists()
+
+    def test_stage_claimed_by_joint_pass(self):
+        TaskRegister.objects.filter(
+            transient__name="2010H", task__name="Global aperture photometry"
+        ).update(
+            status=Status.objects.get(message="processing"),
+            last_modified=timezone.now(),
+        )
+
+        # the task is retried instead of waiting for the joint pass
+        assert GlobalAperturePhotometry("2010H").run_process() == "processing"
+
+        # the last retry measures the stage itself
+        GlobalAperturePhotometry("2010H").run_process(take_over=True)
+        register_item = TaskRegister.objects.get(
+            transient__name="2010H", task__name="Global aperture photometry"
+        )
+        assert register_item.status.message == "processed"
+
+    def test_stale_claim_taken_over(self):
+        # the worker that claimed the task died longer ago than tasks may run
+        TaskRegister.objects.filter(
+            transient__name="2010H", task__name="Global aperture photometry"
+        ).update(
+            status=Status.objects.get(message="processing"),
+            last_modified=timezone.now() - timedelta(seconds=task_time_limit + 1),
+        )
+
+        assert GlobalAperturePhotometry("2010H").run_process() is None
+        register_item = TaskRegister.objects.get(
+            transient__name="2010H", task__name="Global aperture photometry"
+        )
+        assert register_item.status.message == "processed"
+
+
+class TestBackgroundCache(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        data = rng.normal(10.0, 1.0, size=(200, 200))
+        self.image = fits.HDUList([fits.PrimaryHDU(data=data)])
+
+    def test_background_computed_once(self):
+        cache = BackgroundCache()
+        background = estimate_background(self.image, cache=cache)
+        cached_background = estimate_background(self.image, cache=cache)
+        uncached_background = estimate_background(self.image, cache=None)
+
+        self.assertIs(background, cached_background)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertTrue(
+            np.array_equal(background.background, uncached_background.background)
+        )
+
+        # a different estimator is a different model
+        estimate_background(self.image, "GALEX_NUV", cache=cache)
+        self.assertEqual(cache.misses, 2)
+
+    def test_background_persisted(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            background = estimate_background(
+                self.image, cache=BackgroundCache(cache_dir=cache_dir)
+            )
+            cache = BackgroundCache(cache_dir=cache_dir)
+            persisted_background = cache.get(
+                self.image[0].data, "sextractor", compute=None
+            )
+
+        self.assertTrue(
+            np.array_equal(
+                background.background_rms, persisted_background.background_rms
+            )
+        )
+        self.assertEqual(
+            background.background_median, persisted_background.background_median
+        )
+
+
+class TestPhotometryPool(SimpleTestCase):
+    def test_pool_matches_serial(self):
+        header = fits.Header()
+        header["CTYPE1"], header["CTYPE2"] = "RA---TAN", "DEC--TAN"
+        header["CRVAL1"], header["CRVAL2"] = 10.0, 10.0
+        header["CRPIX1"], header["CRPIX2"] = 100.0, 100.0
+        header["CDELT1"], header["CDELT2"] = -0.25 / 3600.0, 0.25 / 3600.0
+        header["EXPTIME"] = 100.0
+        filter = Filter(
+            name="PanSTARRS_g",
+            pixel_size_arcsec=0.25,
+            magnitude_zero_point=25.0,
+            image_pixel_units="counts",
+        )
+        center = SkyCoord(ra=10.0, dec=10.0, unit="deg")
+        offset = SkyCoord(ra=10.0, dec=10.005, unit="deg")
+        apertures = [
+            SkyCircularAperture(center, r=3 * u.arcsec),
+            SkyCircularAperture(offset, r=2 * u.arcsec),
+        ]
+
+        rng = np.random.default_rng(0)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            jobs = []
+            for i in range(3):
+                path = f"{tmp_dir}/{i}.fits"
+                data = rng.normal(100.0, 5.0, size=(200, 200))
+                data[95:105, 95:105] += 50.0 * (i + 1)
+                fits.writeto(path, data, header)
+                jobs.append((path, apertures, filter))
+
+            serial = map_image_photometry(jobs, processes=1)
+            pooled = map_image_photometry(jobs, processes=2)
+
+        assert serial == pooled
+        assert [photometry[0]["flux"] for photometry in serial] == sorted(
+            photometry[0]["flux"] for photometry in serial
+        )
+
+
+class TestRegionOfInterest(SimpleTestCase):
+    def test_region_matches_full_image(self):
+        rng = np.random.default_rng(3)
+        data = rng.normal(100.0, 10.0, size=(300, 400))
+        error = np.sqrt(np.abs(data))
+
+        # one aperture well inside the image and one near its edge
+        for position in [(201.37, 148.62), (12.25, 290.5)]:
+            aperture = EllipticalAperture(position, a=9.3, b=5.1, theta=0.7)
+            margin = int(np.ceil(2 * aperture.a)) + 1
+            region, region_aperture = region_of_interest(
+                aperture, data.shape, margin=margin
+            )
+            self.assertLess(data[region].size, data.size)
+
+            full = aperture_photometry(data, aperture, error=error)
+            roi = aperture_photometry(
+                data[region], region_aperture, error=error[region]
+            )
+            self.assertEqual(full["aperture_sum"][0], roi["aperture_sum"][0])
+            self.assertEqual(full["aperture_sum_err"][0], roi["aperture_sum_err"][0])
+
+            # the local background annulus is inside the region too
+            lbg = LocalBackground(aperture.a, aperture.a * 2)
+            self.assertEqual(
+                lbg(data, *aperture.positions),
+                lbg(data[region], *region_aperture.positions),
+            )
@@ -3,6 +3,8 @@ from django.test import TestCase
 from ..base_tasks import initialise_all_tasks_status
 from ..base_tasks import TransientTaskRunner
 from ..base_tasks import update_status
+from ..models import Aperture
+from ..models import AperturePhotometry
 from ..models import Cutout
 from ..models import Filter
 from ..models import Status
@@ -273,6 +275,95 @@ class TaskRunnerTest(TestCase):
         self.assertTrue(cutout_changed.filter.name == "WISE_W1")
 
 
+class BulkUpsertTest(TestCase):
+    fixtures = [
+        "../fixtures/initial/setup_survey_data.yaml",
+        "../fixtures/initial/setup_filter_data.yaml",
+        "../fixtures/initial/setup_catalog_data.yaml",
+        "../fixtures/initial/setup_status.yaml",
+        "../fixtures/initial/setup_tasks.yaml",
+        "../fixtures/initial/setup_acknowledgements.yaml",
+        "../fixtures/test/setup_test_transient.yaml",
+        "../fixtures/test/test_cutout.yaml",
+        "../fixtures/test/test_2010H.yaml",
+    ]
+
+    def setUp(self):
+        self.runner = ImageDownload("2022testone")
+
+    def test_bulk_upsert(self):
+        transient = Transient.objects.get(name__exact="2022testone")
+        existing_cutout = Cutout.objects.get(name__exact="testone_WISE_W4")
+
+        objects_data = [
+            {
+                "transient": transient,
+                "filter": Filter.objects.get(name__exact=filter_name),
+                "fits": "test",
+                "name": f"test_{filter_name}",
+            }
+            for filter_name in ["WISE_W1", "WISE_W4"]
+        ]
+        cutouts = self.runner._bulk_upsert(
+            Cutout, ["transient", "filter"], objects_data
+        )
+
+        self.assertEqual(
+            [cutout.name for cutout in cutouts], ["test_WISE_W1", "test_WISE_W4"]
+        )
+        self.assertEqual(cutouts[1].pk, existing_cutout.pk)
+        self.assertTrue(cutouts[0].pk is not None)
+        self.assertEqual(Cutout.objects.filter(transient=transient).count(), 2)
+        self.assertFalse(Cutout.objects.filter(name="testone_WISE_W4").exists())
+
+    def test_bulk_upsert_photometry(self):
+        transient = Transient.objects.get(name__exact="2010H")
+        aperture = Aperture.objects.get(name__exact="2010H_local")
+        existing_photometry = AperturePhotometry.objects.get(
+            aperture=aperture, filter__name="WISE_W1"
+        )
+        self.assertFalse(
+            AperturePhotometry.objects.filter(
+                aperture=aperture, filter__name="GALEX_FUV"
+            ).exists()
+        )
+        count = AperturePhotometry.objects.filter(transient=transient).count()
+
+        photometry = self.runner._bulk_upsert(
+            AperturePhotometry,
+            ["aperture", "transient", "filter"],
+            [
+                {
+                    "aperture": aperture,
+                    "transient": transient,
+                    "filter": Filter.objects.get(name__exact="WISE_W1"),
+                    "flux": 70.0,
+                    "flux_error": 0.5,
+                },
+                {
+                    "aperture": aperture,
+                    "transient": transient,
+                    "filter": Filter.objects.get(name__exact="GALEX_FUV"),
+                    "flux": 10.0,
+                    "flux_error": 1.0,
+                },
+            ],
+        )
+
+        # the row of the same aperture, transient and filter is updated in place
+        self.assertEqual(photometry[0].pk, existing_photometry.pk)
+        updated_photometry = AperturePhotometry.objects.get(pk=existing_photometry.pk)
+        self.assertEqual(updated_photometry.flux, 70.0)
+        self.assertIsNone(updated_photometry.magnitude)
+
+        # a filter without photometry gets a new row
+        self.assertNotEqual(photometry[1].pk, existing_photometry.pk)
+        self.assertEqual(photometry[1].filter.name, "GALEX_FUV")
+        self.assertEqual(
+            AperturePhotometry.objects.filter(transient=transient).count(), count + 1
+        )
+
+
 class GHOSTRunnerTest(TestCase):
     fixtures = [
         "../fixtures/initial/setup_tasks.yaml",
@@ -10,11 +10,13 @@ from astropy.coordinates import SkyCoord
 from astroquery.sdss import SDSS
 from django.conf import settings
 from django.db.models import Q
+from django.test import override_settings
 from django.test import TestCase
 from numpy.testing import assert_array_equal
 from sedpy.observate import Filter as SedpyFilter
 from sedpy.observate import load_filters
 
+from ..filter_registry import filter_registry
 from ..models import AperturePhotometry
 from ..models import Filter
 from ..models import Host
@@ -49,6 +51,49 @@ class FilterTest(TestCase):
             # assert_array_equal(sedpy_filter.wavelength, raw_wavelength)
             # assert_array_equal(sedpy_filter.transmission, raw_transmission)
 
+    def test_filter_registry(self):
+        """
+        Test the filter registry caches filter data until a filter changes
+        """
+        filter_registry.invalidate()
+        filter = Filter.objects.get(name="PanSTARRS_g")
+
+        self.assertEqual(
+            [f.name for f in filter_registry.filters()],
+            [f.name for f in Filter.objects.all().order_by("pk")],
+        )
+        self.assertEqual(filter_registry.get("PanSTARRS_g").pk, filter.pk)
+        with self.assertRaises(Filter.DoesNotExist):
+            filter_registry.get("not a filter")
+
+        curve = filter_registry.transmission_curve("PanSTARRS_g")
+        self.assertIs(filter_registry.transmission_curve(filter), curve)
+        self.assertEqual(
+            filter_registry.wave_effective(filter),
+            filter.transmission_curve().wave_effective,
+        )
+
+        version = filter_registry.version
+        filter.save()
+        self.assertEqual(filter_registry.version, version + 1)
+        self.assertIsNot(filter_registry.transmission_curve(filter), curve)
+
+    def test_filter_registry_shared_changes(self):
+        """
+        Test the filter registry picks up filter changes made without
+        signals, as by another process
+        """
+        filter_registry.invalidate()
+        with override_settings(FILTER_REGISTRY_CHECK_SECONDS=0):
+            filter_registry.check()
+            vosa_id = filter_registry.get("PanSTARRS_g").vosa_id
+            Filter.objects.filter(name="PanSTARRS_g").update(vosa_id="changed")
+
+            # lookups do not query, the change is found by the next check
+            self.assertEqual(filter_registry.get("PanSTARRS_g").vosa_id, vosa_id)
+            filter_registry.check()
+            self.assertEqual(filter_registry.get("PanSTARRS_g").vosa_id, "changed")
+
 
 class PropsectorBuildObsTest(TestCase):
     fixtures = [
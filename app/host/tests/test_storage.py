@@ -0,0 +1,238 @@
+import hashlib
+import os
+import tempfile
+import time
+
+import boto3
+from django.test import TestCase
+from moto import mock_aws
+
+from ..storage import LocalStorage
+from ..storage import S3Storage
+
+
+class MissingObjectError(Exception):
+    def __init__(self):
+        super().__init__("NoSuchKey")
+        self.response = {"Error": {"Code": "NoSuchKey"}}
+
+
+class Body:
+    def __init__(self, content):
+        self.content = content
+
+    def read(self):
+        return self.content
+
+
+class FakeS3Client:
+    """In-memory stand-in for a MinIO / S3 bucket."""
+
+    def __init__(self):
+        self.objects = {}
+        self.gets = 0
+
+    def put_object(self, Bucket, Key, Body):
+        self.objects[(Bucket, Key)] = bytes(Body)
+        return {"ETag": self.etag(Bucket, Key)}
+
+    def etag(self, Bucket, Key):
+        return f'"{hashlib.md5(self.objects[(Bucket, Key)]).hexdigest()}"'
+
+    def get_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise MissingObjectError()
+        self.gets += 1
+        return {"Body": Body(self.objects[(Bucket, Key)])}
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise MissingObjectError()
+        return {
+            "ContentLength": len(self.objects[(Bucket, Key)]),
+            "ETag": self.etag(Bucket, Key),
+        }
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop((Bucket, Key), None)
+
+
+class S3StorageTest(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.client = FakeS3Client()
+        self.storage = S3Storage(
+            "blast", cache_root=f"{self.tmp_dir.name}/cache", client=self.client
+        )
+        self.path = "/data/cutout_cdn/2010H/WISE/WISE_W1.fits"
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_save_and_read(self):
+        self.storage.save(self.path, b"image")
+
+        self.assertIn(("blast", self.path.lstrip("/")), self.client.objects)
+        self.assertTrue(self.storage.exists(self.path))
+        with self.storage.open(self.path) as f:
+            self.assertEqual(f.read(), b"image")
+
+    def test_read_through_cache(self):
+        self.client.put_object(Bucket="blast", Key=self.path.lstrip("/"), Body=b"x")
+
+        for _ in range(3):
+            with open(self.storage.local_path(self.path), "rb") as f:
+                self.assertEqual(f.read(), b"x")
+        self.assertEqual(self.client.gets, 1)
+
+        self.storage.clear_cache()
+        self.storage.local_path(self.path)
+        self.assertEqual(self.client.gets, 2)
+
+    def test_missing_file(self):
+        self.assertFalse(self.storage.exists(self.path))
+        with self.assertRaises(FileNotFoundError):
+            self.storage.local_path(self.path)
+
+    def test_cache_follows_overwrites(self):
+        other_worker = S3Storage(
+            "blast", cache_root=f"{self.tmp_dir.name}/other_cache", client=self.client
+        )
+        self.storage.save(self.path, b"image")
+        with open(other_worker.local_path(self.path), "rb") as f:
+            self.assertEqual(f.read(), b"image")
+
+        # the cached copy is not reused once the object is overwritten
+        self.storage.save(self.path, b"new image")
+        with open(other_worker.local_path(self.path), "rb") as f:
+            self.assertEqual(f.read(), b"new image")
+
+        self.storage.delete(self.path)
+        self.assertFalse(other_worker.exists(self.path))
+
+    def test_prune_cache(self):
+        self.storage.cache_max_age_seconds = 3600
+        self.storage.save(self.path, b"image")
+        self.storage.save("/data/recent.fits", b"image")
+        cache_path = self.storage.cache_path(self.path)
+        old = time.time() - 7200
+        for path in [cache_path, cache_path + ".version"]:
+            os.utime(path, (old, old))
+
+        self.storage.prune_cache()
+        self.assertFalse(os.path.exists(cache_path))
+        self.assertTrue(os.path.exists(self.storage.cache_path("/data/recent.fits")))
+
+        # the pruned file is read from the bucket again
+        with self.storage.open(self.path) as f:
+            self.assertEqual(f.read(), b"image")
+
+    def test_upload_and_delete(self):
+        local_file = f"{self.tmp_dir.name}/sed_output/2010H/2010H_global.h5"
+        os.makedirs(os.path.dirname(local_file))
+        with open(local_file, "wb") as f:
+            f.write(b"chain")
+
+        self.storage.upload(local_file, remove_local=True)
+        self.assertFalse(os.path.exists(local_file))
+        with self.storage.open(local_file) as f:
+            self.assertEqual(f.read(), b"chain")
+
+        self.storage.delete(local_file)
+        self.assertFalse(self.storage.exists(local_file))
+
+    def test_demote_and_rehydrate(self):
+        self.storage.save(self.path, b"image" * 100)
+        self.storage.demote(self.path)
+
+        self.assertNotIn(("blast", self.path.lstrip("/")), self.client.objects)
+        self.assertTrue(self.storage.is_demoted(self.path))
+        self.assertTrue(self.storage.exists(self.path))
+        with self.storage.open(self.path) as f:
+            self.assertEqual(f.read(), b"image" * 100)
+
+        # reading does not move the file back to the hot tier
+        self.assertTrue(self.storage.is_demoted(self.path))
+
+
+class S3StorageIntegrationTest(TestCase):
+    """S3Storage against the S3 API of a moto mock bucket through boto3."""
+
+    def setUp(self):
+        self.mock = mock_aws()
+        self.mock.start()
+        self.client = boto3.client("s3", region_name="us-east-1")
+        self.client.create_bucket(Bucket="blast")
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.storage = S3Storage(
+            "blast",
+            cache_root=f"{self.tmp_dir.name}/cache",
+            client=self.client,
+            cold_storage_class="STANDARD_IA",
+        )
+        self.path = "/data/cutout_cdn/2010H/WISE/WISE_W1.fits"
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+        self.mock.stop()
+
+    def test_save_and_read(self):
+        self.storage.save(self.path, b"image")
+
+        response = self.client.get_object(Bucket="blast", Key=self.path.lstrip("/"))
+        self.assertEqual(response["Body"].read(), b"image")
+        self.storage.clear_cache()
+        with self.storage.open(self.path) as f:
+            self.assertEqual(f.read(), b"image")
+
+    def test_missing_file(self):
+        self.assertFalse(self.storage.exists(self.path))
+        with self.assertRaises(FileNotFoundError):
+            self.storage.local_path(self.path)
+
+    def test_demote_and_delete(self):
+        self.storage.save(self.path, b"image" * 100)
+        self.storage.demote(self.path)
+
+        self.assertTrue(self.storage.is_demoted(self.path))
+        self.storage.clear_cache()
+        with self.storage.open(self.path) as f:
+            self.assertEqual(f.read(), b"image" * 100)
+
+        self.storage.delete(self.path)
+        self.assertFalse(self.storage.exists(self.path))
+
+
+class LocalStorageTest(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.storage = LocalStorage(cache_root=f"{self.tmp_dir.name}/cache")
+        self.path = f"{self.tmp_dir.name}/2010H/WISE/WISE_W1.fits"
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_save_and_read(self):
+        self.storage.save(self.path, b"image")
+
+        self.assertTrue(self.storage.exists(self.path))
+        self.assertEqual(self.storage.local_path(self.path), self.path)
+        with self.storage.open(self.path) as f:
+            self.assertEqual(f.read(), b"image")
+
+    def test_demote_and_rehydrate(self):
+        self.storage.save(self.path, b"image" * 100)
+        bytes_demoted = self.storage.demote(self.path)
+
+        self.assertEqual(bytes_demoted, 500)
+        self.assertFalse(os.path.exists(self.path))
+        self.assertTrue(os.path.exists(self.path + ".gz"))
+        with self.storage.open(self.path) as f:
+            self.assertEqual(f.read(), b"image" * 100)
+
+        # saving a new version replaces the cold copy
+        self.storage.save(self.path, b"new image")
+        self.assertFalse(self.storage.is_demoted(self.path))
+        self.assertFalse(os.path.exists(self.path + ".gz"))
+        with self.storage.open(self.path) as f:
+            self.assertEqual(f.read(), b"new image")
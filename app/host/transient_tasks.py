@@ -1,8 +1,10 @@
 import math
+from abc import abstractmethod
+from time import process_time
 
 import numpy as np
-from astropy.io import fits
 from celery import shared_task
+from django.conf import settings
 from django.db.models import Q
 from host.base_tasks import task_soft_time_limit
 from host.base_tasks import task_time_limit
@@ -10,12 +12,22 @@ from host.base_tasks import task_time_limit
 from .base_tasks import TransientTaskRunner
 from .cutouts import download_and_save_cutouts
 from .ghost import run_ghost
+from .host_reuse import adjusted_global_aperture_data
+from .host_reuse import canonical_host
+from .host_reuse import copy_result_file
+from .host_reuse import cutout_filters
+from .host_reuse import global_apertures
+from .host_reuse import host_donor
+from .host_reuse import same_global_apertures
+from .host_reuse import same_sed_inputs
+from .host_utils import aperture_cutout_candidates
 from .host_utils import check_global_contamination
 from .host_utils import check_local_radius
-from .host_utils import construct_aperture
-from .host_utils import do_aperture_photometry
+from .host_utils import construct_preferred_aperture
+from .host_utils import contamination_segmentation
 from .host_utils import get_dust_maps
 from .host_utils import get_local_aperture_size
+from .host_utils import map_image_photometry
 from .host_utils import query_ned
 from .host_utils import query_sdss
 from .host_utils import select_cutout_aperture
@@ -23,14 +35,24 @@ from .models import Aperture
 from .models import AperturePhotometry
 from .models import Cutout
 from .models import SEDFittingResult
+from .models import Status
+from .models import TaskRegister
 from .models import Transient
 from .prospector import build_model
 from .prospector import build_obs
 from .prospector import fit_model
 from .prospector import prospector_result_to_blast
+from .redshift_catalog import local_redshifts
+from .storage import get_storage
 
 """This module contains all of the TransientTaskRunners in blast."""
 
+# how often and for how long a photometry task is retried while the other
+# stage's joint pass measures it, long enough for a claim held by a dead
+# worker to become stale and be taken over
+JOINT_PASS_RETRY_SECONDS = 30
+JOINT_PASS_MAX_RETRIES = task_time_limit // JOINT_PASS_RETRY_SECONDS + 2
+
 
 class Ghost(TransientTaskRunner):
     """
@@ -64,10 +86,21 @@ class Ghost(TransientTaskRunner):
         """
         Run the GHOST matching algorithm.
         """
-        host = run_ghost(transient)
+        return self._save_host(transient, run_ghost(transient))
+
+    def _save_host(self, transient, host):
+        """
+        Saves the host GHOST matched to a transient.
 
+        Args:
+            transient (models.Transient): transient that was matched.
+            host (models.Host): unsaved host from GHOST, None if there was no
+                match.
+        Returns:
+            (str): status message of the host match.
+        """
         if host is not None:
-            host.save()
+            host = canonical_host(host)
             transient.host = host
             transient.save()
 
@@ -166,6 +199,13 @@ class MWEBV_Host(TransientTaskRunner):
         Run the E(B-V) script.
         """
         if transient.host is not None:
+            # another transient of the host has already looked it up
+            if (
+                transient.host.milkyway_dust_reddening is not None
+                and host_donor(transient, self.task_name) is not None
+            ):
+                return "processed"
+
             try:
                 mwebv = get_dust_maps(transient.host.sky_coord)
             except Exception:
@@ -250,20 +290,34 @@ class GlobalApertureConstruction(TransientTaskRunner):
             print(f"""No sky_coord associated with "{transient.name}" host.""")
             return "failed"
         cutouts = Cutout.objects.filter(transient=transient).filter(~Q(fits=""))
-        choice = 0
-        aperture = None
-        while aperture is None and choice <= 8:
-            aperture_cutout = select_cutout_aperture(cutouts, choice=choice)
-            image = fits.open(aperture_cutout[0].fits.name)
-            aperture = construct_aperture(image, transient.host.sky_coord)
-            choice += 1
+
+        donor = host_donor(transient, self.task_name)
+        if (
+            donor is not None
+            and cutout_filters(transient) == cutout_filters(donor)
+            and self._reuse_aperture(transient, cutouts, donor)
+        ):
+            return "processed"
+
+        aperture_cutout, aperture = construct_preferred_aperture(
+            aperture_cutout_candidates(cutouts),
+            transient.host.sky_coord,
+            max_workers=settings.APERTURE_CONSTRUCTION_THREADS,
+        )
         if aperture is None:
             return "failed"
 
-        query = {"name": f"{aperture_cutout[0].name}_global"}
+        # the validation reuses the segmentation of this cutout
+        try:
+            contamination_segmentation(aperture_cutout)
+        except (OSError, ValueError) as err:
+            # unreadable file or poor image data, the validation segments it
+            print(f"could not segment {aperture_cutout.name}: {err}")
+
+        query = {"name": f"{aperture_cutout.name}_global"}
         data = {
-            "name": f"{aperture_cutout[0].name}_global",
-            "cutout": aperture_cutout[0],
+            "name": f"{aperture_cutout.name}_global",
+            "cutout": aperture_cutout,
             "orientation_deg": (180 / np.pi) * aperture.theta.value,
             "ra_deg": aperture.positions.ra.degree,
             "dec_deg": aperture.positions.dec.degree,
@@ -276,10 +330,254 @@ class GlobalApertureConstruction(TransientTaskRunner):
         self._overwrite_or_create_object(Aperture, query, data)
         return "processed"
 
+    def _reuse_aperture(self, transient, cutouts, donor):
+        """
+        Copies the global aperture of another transient of the same host onto
+        the cutout the aperture would be constructed on first.
+
+        Returns:
+            (bool): Whether the aperture was copied. It is not if the cutout
+            does not contain it, in which case it has to be constructed.
+        """
+        candidates = aperture_cutout_candidates(cutouts)
+        donor_apertures = global_apertures(donor)
+        if not candidates or not donor_apertures:
+            return False
+
+        aperture_cutout = candidates[0]
+        donor_aperture = donor_apertures.get(
+            aperture_cutout.filter.name, next(iter(donor_apertures.values()))
+        )
+
+        data = adjusted_global_aperture_data(donor_aperture, aperture_cutout, transient)
+        if not aperture_cutout.contains_aperture(Aperture(**data).sky_aperture):
+            return False
+        self._overwrite_or_create_object(Aperture, {"name": data["name"]}, data)
+        return True
+
+
+class JointAperturePhotometry(TransientTaskRunner):
+    """
+    Base class of the local and global aperture photometry runners.
+
+    Both stages measure every cutout of a transient, so whichever stage runs
+    first also claims the other stage, if its prerequisites are met, and
+    measures the apertures of both in a single pass over the cutouts. The
+    image, background and error arrays are then shared between the stages,
+    while the photometry rows and task statuses written are the same as
+    running them one after the other.
+    """
+
+    partner_class = None
+
+    def _failed_status_message(self):
+        """
+        Failed status if not aperture is found
+        """
+        return "failed"
+
+    def _prepare(self, transient, filters=None):
+        """
+        Sets up what the stage needs before the cutouts are measured.
+
+        Returns:
+            status message (str): status of the stage if it cannot go ahead,
+                None otherwise.
+        """
+        return None
+
+    def _reuse(self, transient):
+        """
+        Copies the photometry of the stage from another transient instead of
+        measuring it, if it can.
+
+        Returns:
+            (bool): Whether the photometry was copied.
+        """
+        return False
+
+    @abstractmethod
+    def _apertures(self, transient, cutouts):
+        """
+        Yields the aperture the stage measures on each cutout, in order.
+        """
+        pass
+
+    @abstractmethod
+    def _photometry_data(self, transient, cutout, aperture, photometry):
+        """
+        Data of the AperturePhotometry row for the photometry measured in an
+        aperture on a cutout, or None if nothing should be saved.
+        """
+        pass
+
+    def run_process(self, task_register_item=None, take_over=False):
+        """
+        Runs task runner process. The task is claimed atomically.
+
+        Args:
+            take_over (bool): take the task over even if the other stage's
+                joint pass has claimed it recently.
+        Returns:
+            (str): "processing" if the task has been claimed by the other
+                stage's joint pass, which has not finished yet, otherwise
+                None.
+        """
+        if task_register_item is not None:
+            return super().run_process(task_register_item)
+
+        transient = Transient.objects.filter(name__exact=self.transient_name).first()
+        if transient is None:
+            return None
+
+        if take_over:
+            task_register_item = self.claim_register_item(
+                transient, stale_after_seconds=0
+            )
+        else:
+            task_register_item = self.claim_register_item(transient)
+        if task_register_item is not None:
+            return super().run_process(task_register_item)
+
+        if TaskRegister.objects.filter(
+            transient=transient,
+            task__name=self.task_name,
+            status__message="processing",
+        ).exists():
+            return "processing"
+        return None
+
+    def _run_process(self, transient, filters=None):
+        """
+        Measure the photometry of this stage, and of the other stage if it
+        can be claimed. If filters are given, only cutouts in those filters
+        are measured and the other stage is left alone.
+        """
+        status_message = self._prepare(transient, filters=filters)
+        if status_message is not None:
+            return status_message
+
+        stages = [self]
+        partner, partner_item = None, None
+        if filters is None and self.partner_class is not None:
+            partner = self.partner_class(transient.name)
+            partner_item = partner.claim_register_item(transient)
+
+        if partner_item is not None:
+            start_time = process_time()
+            try:
+                if partner._reuse(transient):
+                    partner_status = "processed"
+                else:
+                    partner_status = partner._prepare(transient)
+            except Exception as err:
+                print(f"{partner.task_name} failed: {err}")
+                partner_status = partner._failed_status_message()
+
+            if partner_status is None:
+                stages.append(partner)
+            else:
+                partner._finish_claimed(partner_item, partner_status, start_time)
+                partner_item = None
+
+        cutouts = Cutout.objects.filter(transient=transient).filter(~Q(fits=""))
+        if filters is not None:
+            cutouts = cutouts.filter(filter__in=filters)
+        cutouts = list(cutouts)
+
+        try:
+            self._measure(transient, cutouts, stages)
+        except Exception:
+            if partner_item is not None:
+                # hand the other stage back so it can run on its own
+                partner._finish_claimed(partner_item, "not processed", start_time)
+            raise
+
+        if partner_item is not None:
+            partner._finish_claimed(partner_item, "processed", start_time)
+        return "processed"
+
+    def _measure(self, transient, cutouts, stages):
+        """
+        Measures the apertures of all stages on each cutout, opening each
+        cutout once. The cutouts are spread over PHOTOMETRY_PROCESSES
+        processes if that is more than one. The photometry of each stage is
+        written in one bulk upsert.
+        """
+        aperture_iterators = [stage._apertures(transient, cutouts) for stage in stages]
+        measurements, jobs = [], []
+        for cutout, *apertures in zip(cutouts, *aperture_iterators):
+            # the indexed cutout metadata tells us whether an aperture
+            # falls off the image without having to open it
+            indices = [
+                i
+                for i, aperture in enumerate(apertures)
+                if cutout.contains_aperture(aperture.sky_aperture)
+            ]
+            measurements.append((cutout, apertures, indices))
+            if indices:
+                jobs.append(
+                    (
+                        get_storage().local_path(cutout.fits.name),
+                        [apertures[i].sky_aperture for i in indices],
+                        cutout.filter,
+                    )
+                )
 
-class LocalAperturePhotometry(TransientTaskRunner):
+        measured_photometry = iter(
+            map_image_photometry(jobs, processes=settings.PHOTOMETRY_PROCESSES)
+        )
+        photometry_data = {stage: [] for stage in stages}
+        for cutout, apertures, indices in measurements:
+            photometry = [
+                {
+                    "flux": None,
+                    "flux_error": None,
+                    "magnitude": None,
+                    "magnitude_error": None,
+                }
+                for _ in apertures
+            ]
+            if indices:
+                for i, aperture_photometry in zip(indices, next(measured_photometry)):
+                    photometry[i] = aperture_photometry
+
+            for stage, aperture, aperture_photometry in zip(
+                stages, apertures, photometry
+            ):
+                data = stage._photometry_data(
+                    transient, cutout, aperture, aperture_photometry
+                )
+                if data is not None:
+                    photometry_data[stage].append(data)
+
+        for stage in stages:
+            stage._bulk_upsert(
+                AperturePhotometry,
+                ["aperture", "transient", "filter"],
+                photometry_data[stage],
+            )
+
+    def _finish_claimed(self, task_register_item, status_message, start_time):
+        """
+        Sets the final status of a task claimed by the other stage's pass.
+        """
+        self._update_status(
+            task_register_item, Status.objects.get(message__exact=status_message)
+        )
+        task_register_item.last_processing_time_seconds = round(
+            process_time() - start_time, 2
+        )
+        task_register_item.save()
+
+
+class LocalAperturePhotometry(JointAperturePhotometry):
     """Task Runner to perform local aperture photometry around host"""
 
+    @property
+    def partner_class(self):
+        return GlobalAperturePhotometry
+
     def _prerequisites(self):
         """
         Need both the Cutout and Host match to be processed
@@ -296,14 +594,11 @@ class LocalAperturePhotometry(TransientTaskRunner):
         """
         return "Local aperture photometry"
 
-    def _failed_status_message(self):
+    def _prepare(self, transient, filters=None):
         """
-        Failed status if not aperture is found
+        Make the local aperture. If filters are given an existing local
+        aperture is reused.
         """
-        return "failed"
-
-    def _run_process(self, transient):
-        """Code goes here"""
 
         if transient.best_redshift is None or transient.best_redshift < 0:
             return "failed"
@@ -322,46 +617,41 @@ class LocalAperturePhotometry(TransientTaskRunner):
             "type": "local",
         }
 
-        self._overwrite_or_create_object(Aperture, query, data)
-        aperture = Aperture.objects.get(**query)
-        print(aperture)
-        cutouts = Cutout.objects.filter(transient=transient).filter(~Q(fits=""))
-
-        for cutout in cutouts:
-            image = fits.open(cutout.fits.name)
+        # a changed aperture would not match the photometry in other filters
+        if filters is None or not Aperture.objects.filter(**query).exists():
+            self.aperture = self._bulk_upsert(Aperture, ["name"], [data])[0]
+        else:
+            self.aperture = Aperture.objects.get(**query)
+        print(self.aperture)
+        return None
 
-            try:
-                photometry = do_aperture_photometry(
-                    image, aperture.sky_aperture, cutout.filter
-                )
+    def _apertures(self, transient, cutouts):
+        for _ in cutouts:
+            yield self.aperture
 
-                query = {
-                    "aperture": aperture,
-                    "transient": transient,
-                    "filter": cutout.filter,
-                }
-
-                data = {
-                    "aperture": aperture,
-                    "transient": transient,
-                    "filter": cutout.filter,
-                    "flux": photometry["flux"],
-                    "flux_error": photometry["flux_error"],
-                }
+    def _photometry_data(self, transient, cutout, aperture, photometry):
+        data = {
+            "aperture": aperture,
+            "transient": transient,
+            "filter": cutout.filter,
+            "flux": photometry["flux"],
+            "flux_error": photometry["flux_error"],
+        }
 
-                if photometry["flux"] is not None and photometry["flux"] > 0:
-                    data["magnitude"] = photometry["magnitude"]
-                    data["magnitude_error"] = photometry["magnitude_error"]
+        if photometry["flux"] is not None and photometry["flux"] > 0:
+            data["magnitude"] = photometry["magnitude"]
+            data["magnitude_error"] = photometry["magnitude_error"]
 
-                self._overwrite_or_create_object(AperturePhotometry, query, data)
-            except Exception:
-                raise
-        return "processed"
+        return data
 
 
-class GlobalAperturePhotometry(TransientTaskRunner):
+class GlobalAperturePhotometry(JointAperturePhotometry):
     """Task Runner to perform local aperture photometry around host"""
 
+    @property
+    def partner_class(self):
+        return LocalAperturePhotometry
+
     def _prerequisites(self):
         """
         Need both the Cutout and Host match to be processed
@@ -379,94 +669,152 @@ class GlobalAperturePhotometry(TransientTaskRunner):
         """
         return "Global aperture photometry"
 
-    def _failed_status_message(self):
+    def _run_process(self, transient, filters=None):
         """
-        Failed status if not aperture is found
+        Copy the global photometry of another transient of the same host if
+        it was measured in the same apertures on the same filters, otherwise
+        measure it.
         """
-        return "failed"
+        if filters is None and self._reuse(transient):
+            return "processed"
+        return super()._run_process(transient, filters=filters)
 
-    def _run_process(self, transient):
-        """Code goes here"""
+    def _reuse(self, transient):
+        """
+        Copies the global photometry of another transient of the same host,
+        whether this stage runs on its own or is claimed by the local stage's
+        pass.
+
+        Returns:
+            (bool): Whether the photometry was copied.
+        """
+        donor = host_donor(transient, self.task_name)
+        return (
+            donor is not None
+            and cutout_filters(transient) == cutout_filters(donor)
+            and same_global_apertures(transient, donor)
+            and self._reuse_photometry(transient, donor)
+        )
+
+    def _reuse_photometry(self, transient, donor):
+        """
+        Copies the donor's global apertures and photometry to the cutouts of
+        the transient in the same filters.
+
+        Returns:
+            (bool): Whether the photometry was copied. It is not if a cutout
+            does not contain its aperture, in which case it has to be
+            measured.
+        """
+        cutouts = {
+            cutout.filter.name: cutout
+            for cutout in Cutout.objects.filter(transient=transient)
+            .filter(~Q(fits=""))
+            .select_related("filter")
+        }
+        donor_photometry = [
+            photometry
+            for photometry in AperturePhotometry.objects.filter(
+                transient=donor, aperture__type="global"
+            ).select_related("filter", "aperture__cutout__filter")
+            if photometry.filter.name in cutouts
+        ]
+
+        aperture_data = [
+            adjusted_global_aperture_data(
+                photometry.aperture, cutouts[photometry.filter.name], transient
+            )
+            for photometry in donor_photometry
+        ]
+        if not all(
+            data["cutout"].contains_aperture(Aperture(**data).sky_aperture)
+            for data in aperture_data
+        ):
+            return False
+
+        apertures = {
+            aperture.name: aperture
+            for aperture in self._bulk_upsert(Aperture, ["name"], aperture_data)
+        }
+        self._bulk_upsert(
+            AperturePhotometry,
+            ["aperture", "transient", "filter"],
+            [
+                {
+                    "aperture": apertures[
+                        f"{cutouts[photometry.filter.name].name}_global"
+                    ],
+                    "transient": transient,
+                    "filter": photometry.filter,
+                    "flux": photometry.flux,
+                    "flux_error": photometry.flux_error,
+                    "magnitude": photometry.magnitude,
+                    "magnitude_error": photometry.magnitude_error,
+                    "is_validated": photometry.is_validated,
+                }
+                for photometry in donor_photometry
+            ],
+        )
+        return True
+
+    def _prepare(self, transient, filters=None):
+        """
+        Find the global aperture made by the aperture construction.
+        """
 
         cutouts = Cutout.objects.filter(transient=transient).filter(~Q(fits=""))
-        choice = 0
-        aperture = None
+        self.aperture = None
         for choice in range(9):
             cutout_for_aperture = select_cutout_aperture(cutouts, choice=choice)[0]
             aperture = Aperture.objects.filter(
                 cutout__name=cutout_for_aperture.name, type="global"
             )
             if aperture.exists():
-                aperture = aperture[0]
+                self.aperture = aperture[0]
                 break
-        query = {"name": f"{cutout_for_aperture.name}_global"}
-        for cutout in cutouts:
-            image = fits.open(cutout.fits.name)
-
-            # make new aperture
-            # adjust semi-major/minor axes for size
-            if f"{cutout.name}_global" != aperture.name:
-                if not len(
-                    Aperture.objects.filter(cutout__name=f"{cutout.name}_global")
-                ):
-                    semi_major_axis = (
-                        aperture.semi_major_axis_arcsec
-                        - aperture.cutout.filter.image_fwhm_arcsec  # / 2.354
-                        + cutout.filter.image_fwhm_arcsec  # / 2.354
-                    )
-                    semi_minor_axis = (
-                        aperture.semi_minor_axis_arcsec
-                        - aperture.cutout.filter.image_fwhm_arcsec  # / 2.354
-                        + cutout.filter.image_fwhm_arcsec  # / 2.354
-                    )
 
-                    query = {"name": f"{cutout.name}_global"}
-                    data = {
-                        "name": f"{cutout.name}_global",
-                        "cutout": cutout,
-                        "orientation_deg": aperture.orientation_deg,
-                        "ra_deg": aperture.ra_deg,
-                        "dec_deg": aperture.dec_deg,
-                        "semi_major_axis_arcsec": semi_major_axis,
-                        "semi_minor_axis_arcsec": semi_minor_axis,
-                        "transient": transient,
-                        "type": "global",
-                    }
-
-                    self._overwrite_or_create_object(Aperture, query, data)
-                    aperture = Aperture.objects.get(
-                        transient=transient, name=f"{cutout.name}_global"
-                    )
+        if self.aperture is None:
+            return "failed"
+        return None
 
-            try:
-                photometry = do_aperture_photometry(
-                    image, aperture.sky_aperture, cutout.filter
-                )
-                if photometry["flux"] is None:
-                    continue
+    def _apertures(self, transient, cutouts):
+        """
+        The global aperture on the cutout it was constructed on, and on the
+        other cutouts the same aperture with its axes adjusted for the
+        seeing of the image. The adjusted apertures are written together.
+        """
+        aperture = self.aperture
+        apertures_data = [
+            adjusted_global_aperture_data(aperture, cutout, transient)
+            for cutout in cutouts
+            if f"{cutout.name}_global" != aperture.name
+        ]
 
-                query = {
-                    "aperture": aperture,
-                    "transient": transient,
-                    "filter": cutout.filter,
-                }
+        apertures = {
+            adjusted_aperture.name: adjusted_aperture
+            for adjusted_aperture in self._bulk_upsert(
+                Aperture, ["name"], apertures_data
+            )
+        }
+        for cutout in cutouts:
+            yield apertures.get(f"{cutout.name}_global", aperture)
 
-                data = {
-                    "aperture": aperture,
-                    "transient": transient,
-                    "filter": cutout.filter,
-                    "flux": photometry["flux"],
-                    "flux_error": photometry["flux_error"],
-                }
-                if photometry["flux"] > 0:
-                    data["magnitude"] = photometry["magnitude"]
-                    data["magnitude_error"] = photometry["magnitude_error"]
+    def _photometry_data(self, transient, cutout, aperture, photometry):
+        if photometry["flux"] is None:
+            return None
 
-                self._overwrite_or_create_object(AperturePhotometry, query, data)
-            except Exception:
-                raise
+        data = {
+            "aperture": aperture,
+            "transient": transient,
+            "filter": cutout.filter,
+            "flux": photometry["flux"],
+            "flux_error": photometry["flux_error"],
+        }
+        if photometry["flux"] > 0:
+            data["magnitude"] = photometry["magnitude"]
+            data["magnitude_error"] = photometry["magnitude_error"]
 
-        return "processed"
+        return data
 
 
 class ValidateLocalPhotometry(TransientTaskRunner):
@@ -563,9 +911,11 @@ class ValidateGlobalPhotometry(TransientTaskRunner):
         """
         return "phot valid failed"
 
-    def _run_process(self, transient):
+    def _run_process(self, transient, filters=None):
         """
-        Run the global photometry validation
+        Run the global photometry validation. If filters are given, only the
+        photometry in those filters is checked for contamination and the
+        stored validation of the other filters is reused.
         """
 
         cutouts = Cutout.objects.filter(transient=transient).filter(~Q(fits=""))
@@ -576,15 +926,24 @@ class ValidateGlobalPhotometry(TransientTaskRunner):
 
         global_aperture_photometry = AperturePhotometry.objects.filter(
             transient=transient, aperture__type="global"
-        )
+        ).select_related("aperture__cutout", "filter")
 
         if not len(global_aperture_photometry):
             return "global photometry validation failed"
 
         is_contam_list = []
+        segmentations = {}
         # issue_warning = True
         # no_contam_count = 0
         for global_aperture_phot in global_aperture_photometry:
+            if (
+                filters is not None
+                and global_aperture_phot.filter not in filters
+                and global_aperture_phot.is_validated is not None
+            ):
+                is_contam_list += [global_aperture_phot.is_validated != "true"]
+                continue
+
             # check if there are contaminating objects in the
             # cutout image used for aperture construction at
             # the PSF-adjusted radius
@@ -592,7 +951,7 @@ class ValidateGlobalPhotometry(TransientTaskRunner):
             # if there are contaminating objects detected in
             # the cutout image used for the photometry
             is_contam = check_global_contamination(
-                global_aperture_phot, aperture_primary
+                global_aperture_phot, aperture_primary, segmentations=segmentations
             )
 
             # if all of our photometry is contaminated, the best move is just to
@@ -669,16 +1028,29 @@ class HostInformation(TransientTaskRunner):
         if host is None:
             return "no host"
 
-        galaxy_ned_data = query_ned(host.sky_coord)
-        # too many SDSS errors
-        try:
-            galaxy_sdss_data = query_sdss(host.sky_coord)
-        except Exception:
-            galaxy_sdss_data = None
+        # the local catalog index first, the live services only without a match
+        galaxy_local_data = local_redshifts(host.sky_coord)
+        galaxy_ned_data = {"redshift": None}
+        galaxy_sdss_data = None
+        if galaxy_local_data["redshift"] is None and settings.REDSHIFT_LIVE_FALLBACK:
+            galaxy_ned_data = query_ned(host.sky_coord)
+            # too many SDSS errors
+            try:
+                galaxy_sdss_data = query_sdss(host.sky_coord)
+            except Exception:
+                galaxy_sdss_data = None
 
         status_message = "processed"
 
         if (
+            host.photometric_redshift is None
+            and galaxy_local_data["photometric_redshift"] is not None
+        ):
+            host.photometric_redshift = galaxy_local_data["photometric_redshift"]
+
+        if galaxy_local_data["redshift"] is not None:
+            host.redshift = galaxy_local_data["redshift"]
+        elif (
             galaxy_sdss_data is not None
             and galaxy_sdss_data["redshift"] is not None
             and not math.isnan(galaxy_sdss_data["redshift"])
@@ -871,12 +1243,55 @@ class GlobalHostSEDFitting(HostSEDFitting):
     def _run_process(self, transient, mode="fast", save=True):
         """Run the SED-fitting task"""
 
+        donor = host_donor(transient, self.task_name)
+        if save and donor is not None and same_sed_inputs(transient, donor):
+            result = (
+                SEDFittingResult.objects.filter(
+                    transient=donor, aperture__type="global"
+                )
+                .select_related("aperture__cutout__filter")
+                .first()
+            )
+            if result is not None:
+                self._reuse_result(transient, result)
+                return "processed"
+
         status_message = super()._run_process(
             transient, aperture_type="global", mode=mode, save=save
         )
 
         return status_message
 
+    def _reuse_result(self, transient, result):
+        """
+        Copies the global SED fit of another transient of the same host, fit
+        to the same data, with its result files copied to the transient's own
+        paths.
+        """
+        apertures = global_apertures(transient)
+        aperture = apertures.get(
+            result.aperture.cutout.filter.name, next(iter(apertures.values()))
+        )
+        data = {
+            field.name: field.get_prep_value(field.value_from_object(result))
+            for field in SEDFittingResult._meta.concrete_fields
+            if field.name not in ["id", "transient", "aperture"]
+        }
+        for field in ["posterior", "chains_file", "percentiles_file", "model_file"]:
+            if data[field]:
+                data[field] = copy_result_file(data[field], result.transient, transient)
+        data["transient"] = transient
+        data["aperture"] = aperture
+
+        pr = SEDFittingResult.objects.filter(
+            transient=transient, aperture__type="global"
+        )
+        if len(pr):
+            pr.update(**data)
+        else:
+            SEDFittingResult.objects.create(**data)
+
+
 # Transient workflow tasks
 
 
@@ -906,12 +1321,20 @@ def global_aperture_construction(transient_name):
 
 
 @shared_task(
+    bind=True,
     name="Global Aperture Photometry",
     time_limit=task_time_limit,
     soft_time_limit=task_soft_time_limit,
+    max_retries=JOINT_PASS_MAX_RETRIES,
 )
-def global_aperture_photometry(transient_name):
-    GlobalAperturePhotometry(transient_name).run_process()
+def global_aperture_photometry(self, transient_name):
+    # the rest of the workflow waits for the other stage's joint pass
+    runner = GlobalAperturePhotometry(transient_name)
+    if runner.run_process() == "processing":
+        if self.request.retries < self.max_retries:
+            raise self.retry(countdown=JOINT_PASS_RETRY_SECONDS)
+        # the joint pass never finished, measure the stage here
+        runner.run_process(take_over=True)
 
 
 @shared_task(
@@ -942,12 +1365,20 @@ def image_download(transient_name):
 
 
 @shared_task(
+    bind=True,
     name="Local Aperture Photometry",
     time_limit=task_time_limit,
     soft_time_limit=task_soft_time_limit,
+    max_retries=JOINT_PASS_MAX_RETRIES,
 )
-def local_aperture_photometry(transient_name):
-    LocalAperturePhotometry(transient_name).run_process()
+def local_aperture_photometry(self, transient_name):
+    # the rest of the workflow waits for the other stage's joint pass
+    runner = LocalAperturePhotometry(transient_name)
+    if runner.run_process() == "processing":
+        if self.request.retries < self.max_retries:
+            raise self.retry(countdown=JOINT_PASS_RETRY_SECONDS)
+        # the joint pass never finished, measure the stage here
+        runner.run_process(take_over=True)
 
 
 @shared_task(
@@ -27,11 +27,12 @@ from host.plotting_utils import plot_bar_chart
 from host.plotting_utils import plot_cutout_image
 from host.plotting_utils import plot_sed
 from host.plotting_utils import plot_timeseries
+from host.storage import get_storage
 from host.tables import TransientTable
 from host.tasks import import_transient_list
+from host.workflow import transient_workflow
 from revproxy.views import ProxyView
 from silk.profiling.profiler import silk_profile
-from host.workflow import transient_workflow
 
 
 def filter_transient_categories(qs, value, task_register=None):
@@ -372,7 +373,8 @@ def download_chains(request, slug, aperture_type):
     )
 
     filename = sed_result.chains_file.name.split("/")[-1]
-    response = HttpResponse(sed_result.chains_file, content_type="text/plain")
+    with get_storage().open(sed_result.chains_file.name) as f:
+        response = HttpResponse(f.read(), content_type="text/plain")
     response["Content-Disposition"] = f"attachment; filename={filename}"
 
     return response
@@ -384,7 +386,8 @@ def download_modelfit(request, slug, aperture_type):
     )
 
     filename = sed_result.model_file.name.split("/")[-1]
-    response = HttpResponse(sed_result.model_file, content_type="text/plain")
+    with get_storage().open(sed_result.model_file.name) as f:
+        response = HttpResponse(f.read(), content_type="text/plain")
     response["Content-Disposition"] = f"attachment; filename={filename}"
 
     return response
@@ -396,7 +399,8 @@ def download_percentiles(request, slug, aperture_type):
     )
 
     filename = sed_result.percentiles_file.name.split("/")[-1]
-    response = HttpResponse(sed_result.percentiles_file, content_type="text/plain")
+    with get_storage().open(sed_result.percentiles_file.name) as f:
+        response = HttpResponse(f.read(), content_type="text/plain")
     response["Content-Disposition"] = f"attachment; filename={filename}"
 
     return response
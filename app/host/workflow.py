@@ -2,6 +2,10 @@ from celery import chain
 from celery import chord
 from celery import group
 from celery import shared_task
+from host.base_tasks import task_soft_time_limit
+from host.base_tasks import task_time_limit
+from host.base_tasks import update_status
+from host.transient_tasks import final_progress
 from host.transient_tasks import global_aperture_construction
 from host.transient_tasks import global_aperture_photometry
 from host.transient_tasks import global_host_sed_fitting
@@ -12,14 +16,14 @@ from host.transient_tasks import local_aperture_photometry
 from host.transient_tasks import local_host_sed_fitting
 from host.transient_tasks import mwebv_host
 from host.transient_tasks import mwebv_transient
-from host.transient_tasks import final_progress
-from host.base_tasks import task_soft_time_limit
-from host.base_tasks import task_time_limit
 from host.transient_tasks import transient_information
 from host.transient_tasks import validate_global_photometry
 from host.transient_tasks import validate_local_photometry
 
 from .base_tasks import initialise_all_tasks_status
+from .cutouts import download_and_save_cutouts_batch
+from .models import Status
+from .models import TaskRegister
 from .models import Transient
 from .transient_name_server import get_transients_from_tns_by_name
 
@@ -84,3 +88,63 @@ def transient_workflow(transient_name=None):
     workflow.delay()
 
     return transient_name
+
+
+@shared_task(
+    name="Batch Image Download",
+    time_limit=task_time_limit,
+    soft_time_limit=task_soft_time_limit,
+)
+def batch_image_download(transient_names):
+    """
+    Download the cutouts of a burst of transients together, so that each
+    survey tile is fetched once for the whole batch rather than once per
+    transient. The cutout download task of each transient is marked
+    processed if its downloads succeeded, and otherwise handed back as not
+    processed so that its own workflow downloads it again.
+    """
+    register_items = list(
+        TaskRegister.objects.filter(
+            transient__name__in=transient_names,
+            task__name="Cutout download",
+            status__message="not processed",
+        ).select_related("transient")
+    )
+    if not register_items:
+        return []
+
+    processing_status = Status.objects.get(message__exact="processing")
+    for register_item in register_items:
+        update_status(register_item, processing_status)
+
+    failed = {register_item.transient.name for register_item in register_items}
+    try:
+        _, failed = download_and_save_cutouts_batch(
+            [register_item.transient for register_item in register_items]
+        )
+    except Exception as err:
+        # the workflows still run and download one transient at a time
+        print(f"batch image download failed: {err}")
+
+    for register_item in register_items:
+        status_message = (
+            "not processed" if register_item.transient.name in failed else "processed"
+        )
+        update_status(register_item, Status.objects.get(message__exact=status_message))
+
+    return [
+        register_item.transient.name
+        for register_item in register_items
+        if register_item.transient.name not in failed
+    ]
+
+
+def workflows_with_batch_download(transient_names):
+    """
+    The workflows of a burst of new transients, run after their cutouts have
+    been downloaded together.
+    """
+    return chain(
+        batch_image_download.si(transient_names),
+        group(transient_workflow.si(name) for name in transient_names),
+    )